@@ -0,0 +1,137 @@
+"""Barge-in detection on synthetic overlapping audio.
+
+A fake microphone replays a mix of the assistant's voice as picked up from the
+speakers (echo), the user starting to talk in the middle of the reply, and room
+noise. Both voices are synthetic (harmonic tones with syllable envelopes), and
+the clock is simulated, so the run is deterministic and needs no sound card.
+For every speaker-to-microphone coupling and user level it reports whether the
+echo alone triggered a barge-in, the detection latency after the user's onset,
+and whether the returned pre-roll covers the onset. With --no-echo-gate the
+detector runs without the echo reference, for comparison.
+
+    python benchmarks/barge_in_benchmark.py [--no-echo-gate]
+"""
+import argparse
+import array
+import math
+import random
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from voice_dialogue.vad import EchoReference, SpeechDetector, wait_for_speech
+
+RATE = 22050
+CHUNK = 1024
+DURATION = 6.0
+USER_ONSET = 3.0
+# The echo reaches the microphone a little after the audio is handed to the mixer
+ECHO_DELAY = 0.08
+NOISE_LEVEL = 0.002
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeMicrophone:
+    """Stands in for a PyAudio input stream; reading advances the simulated clock."""
+
+    def __init__(self, samples: list, clock: FakeClock, stop: threading.Event) -> None:
+        self.samples = samples
+        self.clock = clock
+        self.stop = stop
+        self.position = 0
+
+    def read(self, chunk: int, exception_on_overflow: bool = True) -> bytes:
+        frame = self.samples[self.position:self.position + chunk]
+        self.position += chunk
+        self.clock.now = self.position / RATE
+        if self.position >= len(self.samples):
+            self.stop.set()
+        frame += [0] * (chunk - len(frame))
+        return array.array("h", frame).tobytes()
+
+
+def voice(duration: float, f0: float, syllable_rate: float, amplitude: float, seed: int) -> list:
+    """Harmonic tone with vibrato, syllable envelope and pauses between words."""
+    rng = random.Random(seed)
+    pauses = set(rng.sample(range(int(duration * syllable_rate)), int(duration * syllable_rate) // 4))
+    out = []
+    phase = 0.0
+    for n in range(int(duration * RATE)):
+        t = n / RATE
+        syllable = int(t * syllable_rate)
+        envelope = 0.0 if syllable in pauses else math.sin(math.pi * (t * syllable_rate % 1.0)) ** 2
+        phase += 2 * math.pi * f0 * (1 + 0.03 * math.sin(2 * math.pi * 5 * t)) / RATE
+        tone = sum(math.sin(k * phase) / k for k in range(1, 6)) / 1.5
+        out.append(amplitude * envelope * tone)
+    return out
+
+
+def to_pcm(samples: list) -> list:
+    return [max(-32768, min(32767, int(sample * 32767))) for sample in samples]
+
+
+def run(assistant: list, user: list, coupling: float, user_gain: float, echo_gate: bool) -> dict:
+    """Play the reply, mix what the microphone hears and run the barge-in listener on it."""
+    clock = FakeClock()
+    echo = EchoReference(clock)
+    echo.add(array.array("h", to_pcm(assistant)).tobytes(), RATE)
+    noise = random.Random(1)
+    delay = int(ECHO_DELAY * RATE)
+    onset = int(USER_ONSET * RATE)
+    mic = []
+    for n in range(len(assistant)):
+        sample = coupling * assistant[n - delay] if n >= delay else 0.0
+        if user_gain and n >= onset:
+            sample += user_gain * user[n - onset]
+        mic.append(sample + noise.gauss(0.0, NOISE_LEVEL))
+
+    stop = threading.Event()
+    microphone = FakeMicrophone(to_pcm(mic), clock, stop)
+    detector = SpeechDetector(CHUNK / RATE, echo if echo_gate else None)
+    frames = wait_for_speech(microphone, detector, CHUNK, stop)
+    if not frames:
+        return {"triggered": None}
+    captured_from = (microphone.position - len(frames) * CHUNK) / RATE
+    return {"triggered": clock.now, "covers_onset": captured_from <= USER_ONSET}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--no-echo-gate", action="store_true", help="run the detector without the echo reference")
+    args = parser.parse_args()
+
+    assistant = voice(DURATION, 120.0, 4.0, 0.05, seed=2)
+    user = voice(DURATION - USER_ONSET, 210.0, 5.0, 0.05, seed=3)
+    print(f"Reply {DURATION:.0f} s, user starts at {USER_ONSET:.1f} s, "
+          f"echo gate {'off' if args.no_echo_gate else 'on'}")
+    print(f"{'coupling':>8} {'user vs echo':>12} {'result':>24} {'pre-roll':>9}")
+    for coupling in (0.3, 1.0, 2.0):
+        for user_db in (None, 0, 6, 12):
+            # User level relative to the echo level at the microphone
+            user_gain = 0.0 if user_db is None else coupling * 10 ** (user_db / 20)
+            result = run(assistant, user, coupling, user_gain, not args.no_echo_gate)
+            triggered = result["triggered"]
+            label = "echo only" if user_db is None else f"{user_db:+d} dB"
+            if triggered is None:
+                outcome = "no trigger"
+                preroll = ""
+            elif user_db is None or triggered < USER_ONSET:
+                outcome = f"FALSE trigger at {triggered:.2f} s"
+                preroll = ""
+            else:
+                outcome = f"detected after {(triggered - USER_ONSET) * 1000:.0f} ms"
+                preroll = "ok" if result["covers_onset"] else "late"
+            print(f"{coupling:>8.1f} {label:>12} {outcome:>24} {preroll:>9}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Throughput of batch transcription against transcribing the notes one at a time.
+
+Transcribes the same list of notes with whisper's transcribe() file by file (how
+transcribe_audio does it) and with BatchTranscriber at several batch sizes, and
+reports seconds of audio transcribed per wall-clock second and the word error
+rate of every run against the one-at-a-time transcripts, which shows that
+batching does not change the results.
+
+The notes default to the input WAVs of the pipeline benchmark (render them with
+its --make-inputs); --repeat lists them several times to get a longer queue.
+
+    python benchmarks/batch_transcription_benchmark.py --model tiny --repeat 4
+    python benchmarks/batch_transcription_benchmark.py notes/ --model large-v3-turbo --batch-sizes 1 8 16
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import torch
+import whisper
+
+from voice_dialogue.batch_transcription import BatchTranscriber, find_audio_files
+
+DEFAULT_INPUTS = Path(__file__).resolve().parent / "fixtures" / "wav"
+
+
+def word_errors(reference: str, hypothesis: str) -> tuple:
+    """(edit distance in words, reference words)."""
+    ref, hyp = reference.lower().split(), hypothesis.lower().split()
+    row = list(range(len(hyp) + 1))
+    for i, word in enumerate(ref, 1):
+        previous, row[0] = row[0], i
+        for j, other in enumerate(hyp, 1):
+            previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, previous + (word != other))
+    return row[-1], len(ref)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="*", type=Path, default=[DEFAULT_INPUTS])
+    parser.add_argument("--model", default="tiny")
+    parser.add_argument("--language", default="en", help="Whisper language code, or \"auto\"")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--decode-workers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    files = find_audio_files(args.inputs) * args.repeat
+    if not files:
+        print(f"No audio files in {', '.join(map(str, args.inputs))}")
+        return 1
+    language = None if args.language == "auto" else args.language
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model = whisper.load_model(args.model, device=device)
+    audio_seconds = sum(len(whisper.load_audio(str(path))) for path in files) / whisper.audio.SAMPLE_RATE
+    print(f"{len(files)} notes, {audio_seconds:.0f} s of audio, Whisper {args.model} on {device.upper()}")
+
+    # Lazy initialization is not timed
+    model.transcribe(str(files[0]), language=language, fp16=device == "cuda")
+    start = time.perf_counter()
+    references = [model.transcribe(str(path), language=language, fp16=device == "cuda")["text"].strip()
+                  for path in files]
+    sequential = audio_seconds / (time.perf_counter() - start)
+    print(f"  {'run':16} {'audio s/s':>10} {'speedup':>8} {'WER':>6}")
+    print(f"  {'one at a time':16} {sequential:10.2f} {1:7.2f}x {0:6.3f}")
+
+    for batch_size in args.batch_sizes:
+        transcriber = BatchTranscriber(model, language, batch_size, args.decode_workers)
+        start = time.perf_counter()
+        records = [record for records in transcriber.transcribe(files) for record in records]
+        throughput = audio_seconds / (time.perf_counter() - start)
+        errors = words = 0
+        for reference, record in zip(references, records):
+            e, w = word_errors(reference, record.get("text", ""))
+            errors, words = errors + e, words + w
+        print(f"  {f'batch of {batch_size}':16} {throughput:10.2f} {throughput / sequential:7.2f}x "
+              f"{errors / max(words, 1):6.3f}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
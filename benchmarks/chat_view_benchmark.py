@@ -0,0 +1,104 @@
+"""Benchmark of chat panel append cost.
+
+Appends N messages to voice_dialogue.chat_view.ChatView and to a QTextEdit
+updated the way the chat panel used to be (HTML fragments plus a scroll per
+call), then streams a reply character by character into each. Runs without a
+display through the offscreen Qt platform.
+
+    python benchmarks/chat_view_benchmark.py [--messages 10000]
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PyQt6.QtGui import QTextCursor
+from PyQt6.QtWidgets import QApplication, QTextEdit
+
+from voice_dialogue.chat_view import ChatView
+
+MESSAGE = "This is a moderately long chat message that wraps over a couple of lines in the panel. " * 2
+REPLY = "Streaming reply text, appended one character at a time while the voice plays. " * 4
+
+
+class LegacyChat:
+    """The previous insertHtml-based chat panel updates."""
+
+    def __init__(self) -> None:
+        self.edit = QTextEdit()
+        self.edit.setReadOnly(True)
+
+    def append_message(self, role: str, text: str) -> None:
+        self.edit.append(f"<p><b style='color: #008080;'>{role}:</b> <span style='color: #ADD8E6;'>{text}</span></p>")
+        self.edit.verticalScrollBar().setValue(self.edit.verticalScrollBar().maximum())
+
+    def begin_message(self, role: str) -> None:
+        self.edit.append("")
+        cursor = self.edit.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertHtml(f"<p><b style='color: #9B59B6;'>{role}:</b> <span style='color: #FFA500;'>")
+        self.edit.setTextCursor(cursor)
+
+    def append_text(self, ch: str) -> None:
+        cursor = self.edit.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertHtml("&nbsp;" if ch == " " else ch)
+        self.edit.setTextCursor(cursor)
+        self.edit.verticalScrollBar().setValue(self.edit.verticalScrollBar().maximum())
+
+    def end_message(self) -> None:
+        cursor = self.edit.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertHtml("</span></p>")
+        self.edit.setTextCursor(cursor)
+
+
+def bench(name: str, chat, widget, app: QApplication, messages: int) -> None:
+    widget.resize(600, 500)
+    widget.show()
+    app.processEvents()
+    step = max(1, messages // 10)
+    start = time.perf_counter()
+    block_start = start
+    for index in range(messages):
+        chat.append_message("user" if index % 2 == 0 else "assistant", MESSAGE)
+        if (index + 1) % step == 0:
+            app.processEvents()
+            now = time.perf_counter()
+            print(f"  {name}: messages {index + 2 - step:>6}-{index + 1:<6} {(now - block_start) / step * 1000:8.3f} ms/append")
+            block_start = now
+    total = time.perf_counter() - start
+
+    chat.begin_message("assistant")
+    start = time.perf_counter()
+    for ch in REPLY:
+        chat.append_text(ch)
+        app.processEvents()
+    stream = time.perf_counter() - start
+    chat.end_message()
+    print(f"  {name}: {messages} appends in {total:.2f} s; "
+          f"streaming at {messages} messages: {stream / len(REPLY) * 1000:.3f} ms/char")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    print("ChatView")
+    view = ChatView({"user": "User:", "assistant": "Assistant:"})
+    bench("ChatView", view, view, app, args.messages)
+    if not args.skip_legacy:
+        print("Legacy insertHtml")
+        legacy = LegacyChat()
+        bench("legacy", legacy, legacy.edit, app, args.messages)
+
+
+if __name__ == "__main__":
+    main()
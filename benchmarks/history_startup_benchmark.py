@@ -0,0 +1,80 @@
+"""Benchmark of chat panel startup with a large saved conversation.
+
+Measures the time until the window can paint and until the newest messages are
+visible when a history of N messages is shown through ChatView.load_history,
+compared with appending every message on the GUI thread before the first paint.
+Runs without a display through the offscreen Qt platform.
+
+    python benchmarks/history_startup_benchmark.py [--messages 10000]
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PyQt6.QtWidgets import QApplication
+
+from voice_dialogue.chat_view import ChatView
+
+MESSAGE = "A saved message from an earlier conversation, long enough to wrap in the panel. " * 2
+LABELS = {"user": "User:", "assistant": "Assistant:"}
+
+
+def build_history(messages: int) -> list:
+    return [["user" if index % 2 == 0 else "assistant", f"{index}: {MESSAGE}"] for index in range(messages)]
+
+
+def bench_lazy(app: QApplication, history: list) -> None:
+    start = time.perf_counter()
+    view = ChatView(LABELS)
+    view.resize(600, 500)
+    view.load_history(lambda: history)
+    view.show()
+    app.processEvents()
+    first_paint = time.perf_counter() - start
+    # The newest page arrives through a queued signal from the loader thread
+    while len(view.messages) < len(history):
+        app.processEvents()
+    app.processEvents()
+    latest = time.perf_counter() - start
+    print(f"  lazy : first paint {first_paint * 1000:8.1f} ms, latest page visible {latest * 1000:8.1f} ms, "
+          f"{view.rendered_count()} of {len(view.messages)} messages rendered")
+
+    start = time.perf_counter()
+    view.render_older_page()
+    app.processEvents()
+    print(f"  lazy : older page on scroll-up {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+
+def bench_eager(app: QApplication, history: list) -> None:
+    start = time.perf_counter()
+    view = ChatView(LABELS, max_rendered=len(history))
+    view.resize(600, 500)
+    for role, text in history:
+        view.append_message(role, text)
+    view.show()
+    app.processEvents()
+    elapsed = time.perf_counter() - start
+    print(f"  eager: first paint {elapsed * 1000:8.1f} ms, {view.rendered_count()} messages rendered")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--skip-eager", action="store_true")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    history = build_history(args.messages)
+    print(f"History of {args.messages} messages")
+    bench_lazy(app, history)
+    if not args.skip_eager:
+        bench_eager(app, history)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Long-term memory index: build, load and query latency, and recall of the cell search.
+
+A synthetic archive of random unit vectors (clustered, like sentence
+embeddings of a conversation) is indexed the way LongTermMemory does it, in
+batches appended to the index files. Reported are the build time, the time to
+load the index from disk (an app start), the p50/p95 search latency exhaustive
+and with the k-means cells, and the recall@k of the cell search against the
+exhaustive one. --embed also measures the query embedding with the real model,
+which is the other half of the latency added to a reply.
+
+    python benchmarks/memory_benchmark.py
+    python benchmarks/memory_benchmark.py --vectors 100000 --embed
+"""
+import argparse
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from voice_dialogue.memory import DEFAULT_EMBEDDING_MODEL, EMBED_BATCH, Embedder, VectorIndex
+
+
+def synthetic_vectors(count: int, dim: int, topics: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, dim)).astype(np.float32)
+    vectors = centers[rng.integers(topics, size=count)] + 0.8 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def percentiles(samples: list) -> str:
+    samples = sorted(samples)
+    return (f"p50 {statistics.median(samples) * 1000:7.2f} ms, "
+            f"p95 {samples[int(len(samples) * 0.95)] * 1000:7.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384, help="384 for the default embedding model")
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--embed", action="store_true", help="also time query embedding with the real model")
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.vectors, args.dim, args.topics)
+    queries = synthetic_vectors(args.queries, args.dim, args.topics, seed=1)
+    directory = Path(tempfile.mkdtemp(prefix="voice_dialogue_memory_"))
+    try:
+        index = VectorIndex(directory, args.dim, "synthetic")
+        start = time.perf_counter()
+        for offset in range(0, args.vectors, EMBED_BATCH):
+            end = min(offset + EMBED_BATCH, args.vectors)
+            index.add(np.arange(offset + 1, end + 1), vectors[offset:end])
+        print(f"{args.vectors} vectors of {args.dim} dims indexed in {time.perf_counter() - start:.2f} s "
+              f"(including k-means training), "
+              f"{sum(f.stat().st_size for f in directory.iterdir()) / (1024 * 1024):.0f} MB on disk")
+
+        start = time.perf_counter()
+        index = VectorIndex(directory, args.dim, "synthetic")
+        print(f"Index loaded in {time.perf_counter() - start:.2f} s")
+
+        timings = {"exhaustive": [], "cells": []}
+        recalled = 0
+        for query in queries:
+            start = time.perf_counter()
+            exact = index.search(query, args.k, exhaustive=True)
+            timings["exhaustive"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            approximate = index.search(query, args.k)
+            timings["cells"].append(time.perf_counter() - start)
+            recalled += len({i for i, _ in exact} & {i for i, _ in approximate})
+        for label, samples in timings.items():
+            print(f"Search, {label:10}: {percentiles(samples)}")
+        print(f"Recall@{args.k} of the cell search: {recalled / (args.k * len(queries)):.3f}")
+
+        if args.embed:
+            embedder = Embedder(DEFAULT_EMBEDDING_MODEL)
+            texts = [f"What did I tell you about my trip number {i} last spring?" for i in range(50)]
+            embedder.embed(texts[:1])
+            samples = []
+            for text in texts:
+                start = time.perf_counter()
+                embedder.embed([text])
+                samples.append(time.perf_counter() - start)
+            print(f"Query embedding ({DEFAULT_EMBEDDING_MODEL}): {percentiles(samples)}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
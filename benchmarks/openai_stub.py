@@ -0,0 +1,156 @@
+"""Local OpenAI-compatible chat completion server that replays recorded replies.
+
+Stands in for LM Studio in benchmarks: POST /v1/chat/completions answers with
+the next reply from a fixtures file, in rotation, whatever the prompt. Streamed
+requests get one server-sent event per token (words with their leading space)
+at a fixed token rate after a fixed time to first token, so LLM timing is the
+same on every run. Can be used from a harness (CompletionReplayServer) or run
+on its own, pointing "llm_api_base" in settings.json at it:
+
+    python benchmarks/openai_stub.py --port 1234 --token-rate 30
+"""
+import argparse
+import itertools
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "pipeline.json"
+
+
+def split_tokens(text: str) -> list:
+    """Word-sized tokens that concatenate back to the text, like an LLM stream."""
+    return re.findall(r"\s*\S+|\s+$", text)
+
+
+class CompletionReplayServer:
+    def __init__(self, completions: list, token_rate: float = 30.0, first_token_delay: float = 0.3,
+                 host: str = "127.0.0.1", port: int = 0) -> None:
+        self.token_rate = token_rate
+        self.first_token_delay = first_token_delay
+        self._completions = itertools.cycle(completions)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def api_base(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="openai-stub", daemon=True)
+        self._thread.start()
+        return self.api_base
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def next_completion(self) -> str:
+        with self._lock:
+            self.requests += 1
+            return next(self._completions)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                text = server.next_completion()
+                model = request.get("model", "local-model")
+                if request.get("stream"):
+                    self._stream(text, model)
+                else:
+                    time.sleep(server.first_token_delay + len(split_tokens(text)) / server.token_rate)
+                    self._send_json({
+                        "id": "chatcmpl-replay", "object": "chat.completion", "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                                     "finish_reason": "stop"}],
+                    })
+
+            def _send_json(self, body: dict) -> None:
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, text: str, model: str) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+
+                def event(delta: dict, finish_reason: str = None) -> None:
+                    chunk = {
+                        "id": "chatcmpl-replay", "object": "chat.completion.chunk", "created": int(time.time()),
+                        "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+
+                # Tokens are due on a fixed schedule, independent of how fast the client reads
+                due = time.perf_counter() + server.first_token_delay
+                try:
+                    event({"role": "assistant"})
+                    for token in split_tokens(text):
+                        time.sleep(max(0.0, due - time.perf_counter()))
+                        event({"content": token})
+                        due += 1.0 / server.token_rate
+                    event({}, "stop")
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client stopped the generation
+                    pass
+
+        return Handler
+
+
+def load_completions(path: Path = FIXTURES) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["completions"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES, help="JSON file with a \"completions\" list")
+    parser.add_argument("--token-rate", type=float, default=30.0, help="streamed tokens per second")
+    parser.add_argument("--first-token-delay", type=float, default=0.3, help="seconds before the first token")
+    args = parser.parse_args()
+
+    server = CompletionReplayServer(load_completions(args.fixtures), args.token_rate, args.first_token_delay,
+                                    port=args.port)
+    print(f"Replaying {args.fixtures.name} at {server.api_base} ({args.token_rate:g} tokens/s)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""Throughput of parallel sentence synthesis on the CPU for 1 to N workers.
+
+The sentences of a long reply are synthesized by a SynthesisPool with 1, 2, ...
+workers, the cores split evenly between them (one worker with all cores is
+what synthesis without the pool gets). Reported per worker count are the
+throughput in seconds of audio per wall-clock second, its speedup over one
+worker, and the wait for the first sentence, which is what the pool costs.
+
+With --tts xtts the real model is used (speaker.wav and settings of a build
+folder). The default stand-in decodes like XTTS's GPT, one token at a time with
+matrix-vector products, so it scales with threads the same poor way, but needs
+no model download.
+
+    python benchmarks/parallel_synthesis_benchmark.py
+    python benchmarks/parallel_synthesis_benchmark.py --tts xtts --data-dir LM_Studio_Voice_Dialogue_EN
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import torch
+
+from voice_dialogue.backend import load_settings
+from voice_dialogue.synthesis_pool import SynthesisPool, physical_cores, plan_workers
+
+# Output rate of XTTS and of the stand-in
+SAMPLE_RATE = 24000
+SENTENCES = [
+    "The first thing to know about sourdough is that the starter is alive.",
+    "Feed it equal weights of flour and water once a day and keep it somewhere warm.",
+    "After a week it should double in size within a few hours of a feeding.",
+    "That is the sign that it is ready to raise a loaf.",
+    "Mix four hundred grams of flour with three hundred grams of water and let it rest for an hour.",
+    "Then add a hundred grams of starter and ten grams of salt, and knead until the dough is smooth.",
+    "Over the next four hours, stretch and fold the dough every half hour.",
+    "Shape it into a tight ball, put it in a floured basket and leave it in the fridge overnight.",
+    "In the morning, heat the oven with a covered pot inside to two hundred and fifty degrees.",
+    "Score the top of the loaf with a sharp blade so it can open as it rises.",
+    "Bake it covered for twenty minutes, then uncovered for another twenty five.",
+    "Let it cool for at least an hour before cutting, or the crumb will be gummy.",
+]
+
+
+class DecoderTTS:
+    """CPU-bound stand-in for XTTS: an autoregressive loop of matrix-vector products per audio token."""
+
+    def __init__(self, layers: int = 12, width: int = 1024, tokens_per_second: float = 21.5,
+                 chars_per_second: float = 15.0, sample_rate: int = SAMPLE_RATE) -> None:
+        generator = torch.Generator().manual_seed(0)
+        self.weights = [torch.randn(width, width, generator=generator) / width ** 0.5 for _ in range(layers)]
+        self.tokens_per_second = tokens_per_second
+        self.chars_per_second = chars_per_second
+        self.synthesizer = SimpleNamespace(output_sample_rate=sample_rate, tts_model=self)
+
+    def get_conditioning_latents(self, audio_path: list) -> tuple:
+        return None, None
+
+    def inference(self, text: str, language: str, gpt_cond_latent, speaker_embedding, **kwargs) -> dict:
+        seconds = max(0.3, len(text) / self.chars_per_second)
+        state = torch.ones(self.weights[0].shape[0])
+        for _ in range(int(seconds * self.tokens_per_second)):
+            for weight in self.weights:
+                state = torch.tanh(weight @ state)
+        rate = self.synthesizer.output_sample_rate
+        t = torch.arange(int(seconds * rate)) / rate
+        return {"wav": 0.2 * torch.sin(2 * torch.pi * 140 * t) * float(state[0].abs().clamp(max=1))}
+
+    def inference_stream(self, text: str, language: str, gpt_cond_latent, speaker_embedding, **kwargs):
+        yield self.inference(text, language, gpt_cond_latent, speaker_embedding)["wav"]
+
+
+def run(settings: dict, speaker_wav: Path, tts_factory, workers: int, sentences: list, language: str) -> tuple:
+    """(audio seconds, wall seconds, seconds to the first sentence) of one pass over the sentences."""
+    pool = SynthesisPool(settings, speaker_wav, tts_factory, workers)
+    try:
+        pool.wait_started()
+        # One sentence per worker first, so lazy initialization is not timed
+        for future in [pool.submit(sentence, language) for sentence in sentences[:workers]]:
+            future.result()
+        start = time.perf_counter()
+        futures = [pool.submit(sentence, language) for sentence in sentences]
+        first = None
+        audio_seconds = 0.0
+        for future in futures:
+            samples = future.result()
+            first = first or time.perf_counter() - start
+            audio_seconds += samples.numel() / SAMPLE_RATE
+        return audio_seconds, time.perf_counter() - start, first
+    finally:
+        pool.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tts", choices=["decoder", "xtts"], default="decoder")
+    parser.add_argument("--data-dir", type=Path, default=Path("."), help="build folder with speaker.wav (--tts xtts)")
+    parser.add_argument("--max-workers", type=int, default=0, help="default: one per core, up to 8")
+    parser.add_argument("--repeat", type=int, default=1, help="passes over the sentences")
+    args = parser.parse_args()
+
+    cores = physical_cores()
+    max_workers = args.max_workers or min(cores, 8)
+    sentences = SENTENCES * args.repeat
+    if args.tts == "xtts":
+        settings = load_settings(args.data_dir)
+        tts_factory = None
+        speaker_wav = args.data_dir / "speaker.wav"
+    else:
+        settings = {"weight_cache": False}
+        tts_factory = DecoderTTS
+        speaker_wav = Path(__file__)
+    print(f"{len(sentences)} sentences, {cores} physical cores, default plan: {plan_workers(0, cores)[0]} workers")
+    print(f"  {'workers':>7} {'threads':>7} {'audio s/s':>10} {'speedup':>8} {'first sentence s':>17}")
+    baseline = None
+    for workers in range(1, max_workers + 1):
+        _, threads = plan_workers(workers, cores)
+        audio_seconds, wall, first = run(settings, speaker_wav, tts_factory, workers, sentences, "en")
+        throughput = audio_seconds / wall
+        baseline = baseline or throughput
+        print(f"  {workers:7} {threads:7} {throughput:10.2f} {throughput / baseline:7.2f}x {first:17.2f}")
+
+
+if __name__ == "__main__":
+    main()
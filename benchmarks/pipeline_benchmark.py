@@ -0,0 +1,397 @@
+"""End-to-end benchmark of the ASR -> LLM -> TTS pipeline with local stand-ins.
+
+Runs the real backend, engine and orchestrator on fixed WAV inputs, one turn per
+file, on a CPU-only machine without LM Studio or a sound card:
+- the LLM is benchmarks/openai_stub.py, which replays the recorded replies of
+  fixtures/pipeline.json at a fixed token rate,
+- Whisper is a small real model (tiny by default),
+- the TTS is a synthetic stand-in that produces a tone of speech-like length at a
+  fixed real-time factor (--tts synthetic, the default), or the real XTTS model,
+- playback goes to SDL's dummy driver, which consumes audio in real time, so the
+  gaps between sentences are measured on the mixer channel as in the app.
+
+Per turn it reports the time to first audio, the ASR and TTS real-time factors,
+the silent gaps in the reply after the first audio, CPU time and RSS, and the
+p50/p95 over all turns (with --inference-process, CPU time and RSS are those of
+the app process only). --save-baseline stores the p50s with the run
+configuration; --baseline compares against a stored file and exits with 1 when a
+metric got worse by more than --tolerance.
+
+The input WAVs are rendered once from the prompts of the fixtures with XTTS and
+a voice sample (speaker.wav of a build folder):
+
+    python benchmarks/pipeline_benchmark.py --make-inputs --tts xtts --data-dir LM_Studio_Voice_Dialogue_EN
+    python benchmarks/pipeline_benchmark.py --repeat 3 --save-baseline benchmarks/baselines/pipeline.json
+    python benchmarks/pipeline_benchmark.py --repeat 3 --baseline benchmarks/baselines/pipeline.json
+"""
+import argparse
+import functools
+import json
+import logging
+import math
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+import wave
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Read by SDL when the backend initializes the mixer
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import torch
+
+from benchmarks.openai_stub import FIXTURES, CompletionReplayServer
+from voice_dialogue import engine
+from voice_dialogue.backend import VoiceAssistantBackend, load_settings
+from voice_dialogue.cli import prepare_data_dir
+from voice_dialogue.orchestrator import TurnOrchestrator
+from voice_dialogue.tracing import percentile
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+DEFAULT_INPUTS = BENCHMARKS_DIR / "fixtures" / "wav"
+# Silences on the TTS channel shorter than this are not counted as gaps (poll resolution)
+GAP_THRESHOLD = 0.02
+POLL_INTERVAL = 0.005
+# Reported metrics: unit and absolute slack added to the relative tolerance when comparing
+# with the baseline, so that near-zero values do not flag noise as a regression
+REPORT = {
+    "first_audio": ("s", 0.05),
+    "asr": ("s", 0.05),
+    "asr_rtf": ("x", 0.02),
+    "first_token": ("s", 0.05),
+    "first_sentence": ("s", 0.05),
+    "tts_rtf": ("x", 0.02),
+    "gap_count": ("", 1),
+    "gap_total": ("s", 0.1),
+    "gap_max": ("s", 0.05),
+    "cpu": ("s", 0.1),
+    # CPU seconds per second of the turn
+    "cpu_load": ("x", 0.1),
+    "rss": ("MB", 50),
+}
+
+
+class SyntheticTTS:
+    """Stand-in for the XTTS model with the interface the backend uses.
+
+    Produces a tone with a syllable envelope, as long as the text would take to
+    say, and sleeps for rtf times its duration to emulate the synthesis time.
+    """
+
+    def __init__(self, rtf: float = 0.3, chars_per_second: float = 15.0, sample_rate: int = 24000,
+                 chunk_seconds: float = 0.5, first_chunk_latency: float = 0.2) -> None:
+        self.rtf = rtf
+        self.chars_per_second = chars_per_second
+        self.chunk_seconds = chunk_seconds
+        self.first_chunk_latency = first_chunk_latency
+        self.synthesizer = SimpleNamespace(output_sample_rate=sample_rate, tts_model=self)
+
+    def _samples(self, text: str) -> torch.Tensor:
+        rate = self.synthesizer.output_sample_rate
+        t = torch.arange(int(max(0.3, len(text) / self.chars_per_second) * rate)) / rate
+        return 0.2 * torch.sin(2 * math.pi * 140 * t) * torch.sin(math.pi * 4 * t) ** 2
+
+    def tts_to_file(self, text: str, speaker_wav: str, language: str, file_path: str, **kwargs) -> None:
+        samples = self._samples(text)
+        time.sleep(self.first_chunk_latency + len(samples) / self.synthesizer.output_sample_rate * self.rtf)
+        write_wav(file_path, samples, self.synthesizer.output_sample_rate)
+
+    def get_conditioning_latents(self, audio_path: list) -> tuple:
+        return None, None
+
+    def inference_stream(self, text: str, language: str, gpt_cond_latent, speaker_embedding, **kwargs):
+        rate = self.synthesizer.output_sample_rate
+        samples = self._samples(text)
+        step = int(self.chunk_seconds * rate)
+        time.sleep(self.first_chunk_latency)
+        for offset in range(0, len(samples), step):
+            chunk = samples[offset:offset + step]
+            time.sleep(len(chunk) / rate * self.rtf)
+            yield chunk
+
+
+class BenchmarkBackend(VoiceAssistantBackend):
+    """Backend that logs the real-time factor of every synthesis call."""
+
+    def __init__(self, settings: dict, data_dir: Path, tts_factory=None) -> None:
+        # (synthesis seconds, seconds of audio produced)
+        self.synthesis_log = []
+        super().__init__(settings, data_dir, tts_factory)
+
+    def synthesize_to_file(self, text: str, file_path: str, language: str = None) -> float:
+        elapsed = super().synthesize_to_file(text, file_path, language)
+        self.synthesis_log.append((elapsed, wav_duration(file_path)))
+        return elapsed
+
+    def synthesize_stream(self, text: str, language: str = None):
+        start = time.perf_counter()
+        samples = 0
+        for chunk in super().synthesize_stream(text, language):
+            samples += chunk.numel()
+            yield chunk
+        self.synthesis_log.append((time.perf_counter() - start, samples / self.tts_sample_rate))
+
+
+class PlaybackMonitor:
+    """Polls the TTS channel and records the intervals during which it was playing."""
+
+    def __init__(self, channel) -> None:
+        self.channel = channel
+        self.intervals = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="playback-monitor", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        started = None
+        while not self._stop.is_set():
+            now = time.perf_counter()
+            busy = self.channel.get_busy()
+            if busy and started is None:
+                started = now
+            elif not busy and started is not None:
+                self.intervals.append((started, now))
+                started = None
+            time.sleep(POLL_INTERVAL)
+        if started is not None:
+            self.intervals.append((started, time.perf_counter()))
+
+    def gaps(self) -> list:
+        """Silences between the first and the last audio of the reply."""
+        return [start - end for (_, end), (start, _) in zip(self.intervals, self.intervals[1:])
+                if start - end >= GAP_THRESHOLD]
+
+
+def write_wav(path, samples: torch.Tensor, sample_rate: int) -> None:
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes((samples.clamp(-1.0, 1.0) * 32767).to(torch.int16).numpy().tobytes())
+
+
+def wav_duration(path) -> float:
+    with wave.open(str(path), "rb") as wf:
+        return wf.getnframes() / wf.getframerate()
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status", "r") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def make_inputs(backend: BenchmarkBackend, prompts: list, inputs: Path) -> None:
+    """Render the prompts into the input WAVs with the loaded TTS model."""
+    inputs.mkdir(parents=True, exist_ok=True)
+    for index, prompt in enumerate(prompts, 1):
+        path = inputs / f"turn{index:02d}.wav"
+        backend.synthesize_to_file(prompt, str(path))
+        print(f"{path}: {wav_duration(path):.1f} s")
+
+
+def run_turn(orchestrator: TurnOrchestrator, backend: BenchmarkBackend, wav_path: Path) -> dict:
+    logged = len(backend.synthesis_log)
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    with PlaybackMonitor(backend.tts_channel) as monitor:
+        orchestrator.audio_turn(str(wav_path)).result()
+        # The last sound may still be playing when the turn returns
+        while backend.tts_channel.get_busy():
+            time.sleep(POLL_INTERVAL)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    trace = backend.tracer.turns[-1]
+    metrics = trace.metrics()
+    result = {
+        "input": wav_path.name,
+        "first_audio": metrics.get("response"),
+        "asr": metrics.get("asr"),
+        "first_token": metrics.get("first_token"),
+        "first_sentence": metrics.get("first_sentence"),
+        "cpu": cpu,
+        "cpu_load": cpu / wall,
+        "rss": rss_mb(),
+    }
+    if result["asr"] is not None:
+        result["asr_rtf"] = result["asr"] / wav_duration(wav_path)
+    synthesis = backend.synthesis_log[logged:]
+    audio_seconds = sum(audio for _, audio in synthesis)
+    if audio_seconds:
+        result["tts_rtf"] = sum(elapsed for elapsed, _ in synthesis) / audio_seconds
+    gaps = monitor.gaps()
+    result.update(gap_count=len(gaps), gap_total=sum(gaps), gap_max=max(gaps, default=0.0))
+    return {name: value for name, value in result.items() if value is not None}
+
+
+def summarize(turns: list) -> dict:
+    """{metric: (p50, p95)} over the turns."""
+    summary = {}
+    for metric in REPORT:
+        values = [turn[metric] for turn in turns if metric in turn]
+        if values:
+            summary[metric] = (percentile(values, 0.5), percentile(values, 0.95))
+    return summary
+
+
+def compare(summary: dict, baseline: dict, tolerance: float) -> list:
+    """Print the p50s next to the baseline; returns the metrics that regressed."""
+    regressions = []
+    print(f"\n{'vs baseline':16} {'p50':>9} {'baseline':>9} {'change':>8}")
+    for metric, (unit, slack) in REPORT.items():
+        if metric not in summary or metric not in baseline["p50"]:
+            continue
+        value = summary[metric][0]
+        reference = baseline["p50"][metric]
+        change = f"{(value - reference) / reference:+.0%}" if reference else ""
+        regressed = value > reference * (1 + tolerance) + slack
+        if regressed:
+            regressions.append(metric)
+        print(f"  {metric:14} {value:9.3f} {reference:9.3f} {change:>8}  {'REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--inputs", type=Path, default=DEFAULT_INPUTS, help="folder of input WAVs, one turn each")
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES, help="prompts and recorded completions")
+    parser.add_argument("--make-inputs", action="store_true", help="render the prompts into --inputs and exit")
+    parser.add_argument("--data-dir", type=Path, help="build folder to take settings.json and speaker.wav from")
+    parser.add_argument("--language", default="en", help="language profile")
+    parser.add_argument("--whisper-model", default="tiny")
+    parser.add_argument("--tts", choices=("synthetic", "xtts"), default="synthetic")
+    parser.add_argument("--tts-rtf", type=float, default=0.3, help="real-time factor of the synthetic TTS")
+    parser.add_argument("--no-streaming", action="store_true", help="synthesize whole sentences to files")
+    parser.add_argument("--inference-process", action="store_true", help="run the models in a worker process")
+    parser.add_argument("--token-rate", type=float, default=30.0, help="LLM stub tokens per second")
+    parser.add_argument("--first-token-delay", type=float, default=0.3, help="LLM stub time to first token")
+    parser.add_argument("--repeat", type=int, default=1, help="passes over the inputs")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed turns before measuring")
+    parser.add_argument("--json", type=Path, help="write the per-turn results and the summary")
+    parser.add_argument("--save-baseline", type=Path, help="store the p50s of this run as the baseline")
+    parser.add_argument("--baseline", type=Path, help="compare with a stored baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR,
+                        format="%(asctime)s - %(levelname)s - %(message)s")
+
+    inputs = sorted(args.inputs.glob("*.wav"))
+    if not args.make_inputs and not inputs:
+        print(f"No WAV files in {args.inputs}; render them with --make-inputs --tts xtts --data-dir <build folder>")
+        return 2
+    if args.make_inputs and args.tts != "xtts":
+        print("--make-inputs needs the real TTS model (--tts xtts)")
+        return 2
+
+    with open(args.fixtures, "r", encoding="utf-8") as f:
+        fixtures = json.load(f)
+    stub = CompletionReplayServer(fixtures["completions"], args.token_rate, args.first_token_delay)
+    stub.start()
+
+    if args.data_dir:
+        data_dir = prepare_data_dir(args.data_dir.resolve(), False)
+    else:
+        data_dir = Path(tempfile.mkdtemp(prefix="voice_dialogue_"))
+    settings = load_settings(data_dir)
+    settings.update({
+        "language": args.language,
+        "whisper_model": args.whisper_model,
+        "llm_api_base": stub.api_base,
+        "tts_streaming": not args.no_streaming,
+        # Summaries would make some turns slower than others
+        "summary_interval": 10 ** 9,
+        "barge_in": False,
+        "inference_process": args.inference_process,
+    })
+    # A factory, so the model can also be created in the inference worker process
+    tts_factory = functools.partial(SyntheticTTS, args.tts_rtf) if args.tts == "synthetic" else None
+    speaker_wav = data_dir / "speaker.wav"
+    if not speaker_wav.exists():
+        if tts_factory is None:
+            print("XTTS needs a voice sample: pass --data-dir with a speaker.wav")
+            return 2
+        synthetic = tts_factory()
+        write_wav(speaker_wav, synthetic._samples("voice sample"), synthetic.synthesizer.output_sample_rate)
+
+    start = time.perf_counter()
+    backend = BenchmarkBackend(settings, data_dir, tts_factory)
+    backend.warm_up_thread.join()
+    print(f"Models loaded and warmed up in {time.perf_counter() - start:.2f} s "
+          f"(whisper {args.whisper_model}, tts {args.tts}, {torch.get_num_threads()} torch threads)")
+    if args.make_inputs:
+        make_inputs(backend, fixtures["prompts"], args.inputs)
+        backend.close()
+        return 0
+
+    orchestrator = TurnOrchestrator(engine.VoiceEngine(backend, play_audio=True))
+    for index in range(args.warmup):
+        run_turn(orchestrator, backend, inputs[index % len(inputs)])
+
+    turns = []
+    print(f"{'turn':14} {'first audio':>11} {'asr rtf':>8} {'tts rtf':>8} {'gaps':>5} {'max gap':>8} "
+          f"{'cpu':>6} {'rss':>8}")
+    for _ in range(args.repeat):
+        for wav_path in inputs:
+            turn = run_turn(orchestrator, backend, wav_path)
+            turns.append(turn)
+            print(f"{turn['input']:14} {turn.get('first_audio', math.nan):10.2f}s "
+                  f"{turn.get('asr_rtf', math.nan):8.2f} {turn.get('tts_rtf', math.nan):8.2f} "
+                  f"{turn['gap_count']:5d} {turn['gap_max']:7.2f}s {turn['cpu']:5.2f}s {turn['rss']:5.0f} MB")
+    orchestrator.close()
+    backend.close()
+    stub.stop()
+
+    summary = summarize(turns)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\n{'':16} {'p50':>9} {'p95':>9}")
+    for metric, (p50, p95) in summary.items():
+        print(f"  {metric:14} {p50:9.3f} {p95:9.3f} {REPORT[metric][0]}")
+    print(f"  peak RSS {peak_rss:.0f} MB over {len(turns)} turns")
+
+    config = {
+        "whisper_model": args.whisper_model, "tts": args.tts, "tts_rtf": args.tts_rtf,
+        "streaming": not args.no_streaming, "inference_process": args.inference_process, "token_rate": args.token_rate,
+        "first_token_delay": args.first_token_delay, "inputs": [path.name for path in inputs],
+        "torch_threads": torch.get_num_threads(), "cpu_count": os.cpu_count(),
+        "machine": platform.machine(), "python": platform.python_version(), "torch": torch.__version__,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "turns": turns, "summary": summary, "peak_rss": peak_rss}, f, indent=2)
+    if args.save_baseline:
+        args.save_baseline.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "p50": {metric: p50 for metric, (p50, _) in summary.items()}}, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        changed = [key for key, value in baseline["config"].items() if config.get(key) != value]
+        if changed:
+            print(f"Warning: run configuration differs from the baseline in {', '.join(changed)}")
+        regressions = compare(summary, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressed: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Benchmark of playback start latency: mixer at the default 44.1 kHz vs. at the TTS rate.
+
+For each mixer buffer size, a sentence of synthetic 24 kHz speech is turned
+into a Sound the way the backend used to do it (a WAV built in memory and
+loaded into a 44.1 kHz stereo mixer, which resamples it) and the way it does
+now (the raw samples given to a mixer opened at 24 kHz mono). Reported are the
+time to create the Sound and the estimated start latency: that time plus one
+mixer buffer, which SDL fills before the audio leaves.
+
+With --loopback the start latency is measured: a tone burst is played and its
+onset is detected on the default input device, so put the microphone at the
+speaker or select a loopback/monitor input. The input latency reported by
+PortAudio is subtracted.
+
+    python benchmarks/playback_latency_benchmark.py
+    python benchmarks/playback_latency_benchmark.py --loopback --buffers 256 512 1024
+"""
+import argparse
+import io
+import statistics
+import sys
+import time
+import wave
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pyaudio
+import pygame
+import torch
+
+from voice_dialogue.backend import make_sound
+
+TTS_RATE = 24000
+# (label, mixer frequency, mixer channels, how the Sound is made)
+SETUPS = [
+    ("44.1 kHz stereo, WAV", 44100, 2, "wav"),
+    ("24 kHz mono, raw", TTS_RATE, 1, "raw"),
+]
+LOOPBACK_RATE = 48000
+ONSET_THRESHOLD = 0.05
+
+
+def speech_like(seconds: float) -> torch.Tensor:
+    t = torch.arange(int(seconds * TTS_RATE)) / TTS_RATE
+    envelope = 0.5 + 0.5 * torch.sin(2 * torch.pi * 4 * t)
+    return 0.3 * envelope * torch.sin(2 * torch.pi * 180 * t + 3 * torch.sin(2 * torch.pi * 5 * t))
+
+
+def tone_burst(seconds: float = 0.3) -> torch.Tensor:
+    t = torch.arange(int(seconds * TTS_RATE)) / TTS_RATE
+    return 0.8 * torch.sin(2 * torch.pi * 1000 * t)
+
+
+def wav_sound(samples: torch.Tensor) -> pygame.mixer.Sound:
+    """The previous conversion: WAV at the TTS rate, converted by SDL to the mixer format."""
+    pcm = (samples.clamp(-1.0, 1.0) * 32767).to(torch.int16).numpy().tobytes()
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(TTS_RATE)
+        wf.writeframes(pcm)
+    buffer.seek(0)
+    return pygame.mixer.Sound(file=buffer)
+
+
+def make(kind: str, samples: torch.Tensor) -> pygame.mixer.Sound:
+    return wav_sound(samples) if kind == "wav" else make_sound(samples)
+
+
+def creation_ms(kind: str, samples: torch.Tensor, repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        make(kind, samples)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def loopback_ms(kind: str, audio: pyaudio.PyAudio, repeats: int) -> float:
+    """Median time from the request to play until the burst is heard on the input."""
+    burst = tone_burst()
+    stream = audio.open(format=pyaudio.paInt16, channels=1, rate=LOOPBACK_RATE, input=True, frames_per_buffer=128)
+    input_latency = stream.get_input_latency()
+    results = []
+    try:
+        for _ in range(repeats):
+            # Let the previous burst die away and drop what was captured meanwhile
+            time.sleep(0.5)
+            stream.read(stream.get_read_available(), exception_on_overflow=False)
+            start = time.perf_counter()
+            make(kind, burst).play()
+            deadline = start + 2.0
+            while time.perf_counter() < deadline:
+                block = torch.frombuffer(bytearray(stream.read(128, exception_on_overflow=False)), dtype=torch.int16)
+                read_at = time.perf_counter()
+                loud = (block.abs() > ONSET_THRESHOLD * 32767).nonzero()
+                if len(loud):
+                    onset = read_at - (len(block) - int(loud[0])) / LOOPBACK_RATE - input_latency
+                    results.append(onset - start)
+                    break
+    finally:
+        stream.close()
+    return statistics.median(results) * 1000 if results else float("nan")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--buffers", type=int, nargs="+", default=[256, 512, 1024, 2048, 4096])
+    parser.add_argument("--seconds", type=float, default=3.0, help="length of the synthetic sentence")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--loopback", action="store_true", help="measure on the default input device")
+    args = parser.parse_args()
+
+    samples = speech_like(args.seconds)
+    audio = pyaudio.PyAudio() if args.loopback else None
+    print(f"Sentence of {args.seconds:.1f} s at {TTS_RATE} Hz")
+    print(f"  {'mixer':22} {'buffer':>6} {'Sound ms':>9} {'est. start ms':>14}" + (f" {'measured ms':>12}" if audio else ""))
+    for buffer in args.buffers:
+        for label, frequency, channels, kind in SETUPS:
+            if pygame.mixer.get_init():
+                pygame.mixer.quit()
+            pygame.mixer.init(frequency=frequency, size=-16, channels=channels, buffer=buffer, allowedchanges=0)
+            create = creation_ms(kind, samples, args.repeats)
+            line = f"  {label:22} {buffer:6} {create:9.2f} {create + buffer / frequency * 1000:14.1f}"
+            if audio:
+                line += f" {loopback_ms(kind, audio, min(args.repeats, 10)):12.1f}"
+            print(line)
+    if audio:
+        audio.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Idle offloading of the speech models: memory saved and the cost of bringing them back.
+
+For every offload mode, ModelHost runs with a short idle timeout on small
+stand-in models: a real Whisper model (tiny by default) and a synthetic TTS
+model holding --tts-mb of weights that its synthesis runs through. Measured:
+the RSS with the models resident and after they were offloaded, a sentence
+synthesis and a transcription with the models resident (warm), right after
+they were offloaded (cold), and after a prefetch followed by --lead seconds of
+"recording" (prefetched). A last phase sets the memory budget so that only one
+model fits and uses them in turns; --verbose shows the residency log.
+
+    python benchmarks/residency_benchmark.py
+    python benchmarks/residency_benchmark.py --whisper-model base --tts-mb 400 --modes unload half
+"""
+import argparse
+import functools
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import torch
+
+from benchmarks.pipeline_benchmark import SyntheticTTS, write_wav
+from voice_dialogue.inference import ModelHost
+from voice_dialogue.residency import CHECK_INTERVAL, OFFLOAD_MODES, megabytes, process_rss, release_memory
+
+LAYER_MB = 4
+TEXT = "A heat pump moves heat instead of making it."
+
+
+class WeightedTTS(torch.nn.Module, SyntheticTTS):
+    """Synthetic TTS with real weights, which every synthesis call runs through."""
+
+    def __init__(self, size_mb: int, rtf: float = 0.1) -> None:
+        torch.nn.Module.__init__(self)
+        SyntheticTTS.__init__(self, rtf=rtf, first_chunk_latency=0.05)
+        side = int((LAYER_MB * 1024 * 1024 / 4) ** 0.5)
+        self.layers = torch.nn.ModuleList(torch.nn.Linear(side, side, bias=False)
+                                          for _ in range(max(1, size_mb // LAYER_MB)))
+
+    def _samples(self, text: str) -> torch.Tensor:
+        x = torch.ones(1, self.layers[0].in_features)
+        for layer in self.layers:
+            # Fails if the weights were left in half precision
+            x = layer(x).clamp(-1.0, 1.0)
+        return super()._samples(text)
+
+
+def timed(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def synthesize(host: ModelHost, path: Path) -> None:
+    host.synthesize_to_file(TEXT, str(path), "en")
+
+
+def wait_offloaded(host: ModelHost, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(state != "resident" for _, state, _ in host.residency.status().values()):
+            return
+        time.sleep(0.1)
+    raise RuntimeError(f"Models still resident after {timeout:.0f} s: {host.residency.status()}")
+
+
+def run_mode(mode: str, args, tts_factory, speaker_wav: Path, audio: Path) -> dict:
+    settings = {"whisper_model": args.whisper_model, "model_idle_offload_seconds": args.idle,
+                "model_offload_mode": mode}
+    host = ModelHost(settings, speaker_wav, tts_factory)
+    transcribe = functools.partial(host.transcribe, str(audio), "en")
+    synthesize_sentence = functools.partial(synthesize, host, audio.with_name("reply.wav"))
+    try:
+        result = {"warm_tts": timed(synthesize_sentence), "warm_asr": timed(transcribe)}
+        result["rss_resident"] = megabytes(process_rss())
+        wait_offloaded(host, args.idle * 4 + 10)
+        result["rss_offloaded"] = megabytes(process_rss())
+        result["cold_tts"] = timed(synthesize_sentence)
+        result["cold_asr"] = timed(transcribe)
+
+        wait_offloaded(host, args.idle * 4 + 10)
+        # What the engine does: Whisper is prefetched when recording starts, the TTS model with transcription
+        host.prefetch("whisper")
+        time.sleep(args.lead)
+        host.prefetch("tts")
+        result["prefetched_asr"] = timed(transcribe)
+        result["prefetched_tts"] = timed(synthesize_sentence)
+    finally:
+        host.close()
+        del host
+        release_memory()
+    return result
+
+
+def run_budget(args, tts_factory, speaker_wav: Path, audio: Path) -> None:
+    tts_mb = args.tts_mb
+    settings = {"whisper_model": args.whisper_model, "model_memory_budget_mb": tts_mb * 1.2}
+    host = ModelHost(settings, speaker_wav, tts_factory)
+    try:
+        # Both models were loaded; the budget check offloads the least recently used one
+        time.sleep(CHECK_INTERVAL + 0.5)
+        for _ in range(3):
+            elapsed_tts = timed(synthesize, host, audio.with_name("reply.wav"))
+            elapsed_asr = timed(host.transcribe, str(audio), "en")
+            status = ", ".join(f"{kind} {state}" for kind, (_, state, _) in host.residency.status().items())
+            print(f"  tts {elapsed_tts:.2f} s, asr {elapsed_asr:.2f} s -> {status}")
+    finally:
+        host.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", nargs="+", choices=OFFLOAD_MODES,
+                        default=["unload", "half"] + (["cpu"] if torch.cuda.is_available() else []))
+    parser.add_argument("--whisper-model", default="tiny")
+    parser.add_argument("--tts-mb", type=int, default=200, help="weights of the stand-in TTS model")
+    parser.add_argument("--idle", type=float, default=1.0, help="idle offload timeout in seconds")
+    parser.add_argument("--lead", type=float, default=2.0, help="seconds between prefetch and use")
+    parser.add_argument("--verbose", action="store_true", help="show the residency log")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(relativeCreated)8.0f ms %(message)s")
+
+    tts_factory = functools.partial(WeightedTTS, args.tts_mb)
+    workdir = Path(tempfile.mkdtemp(prefix="voice_dialogue_"))
+    synthetic = SyntheticTTS()
+    speaker_wav = workdir / "speaker.wav"
+    audio = workdir / "utterance.wav"
+    write_wav(speaker_wav, synthetic._samples("voice sample"), synthetic.synthesizer.output_sample_rate)
+    write_wav(audio, synthetic._samples(TEXT), synthetic.synthesizer.output_sample_rate)
+
+    print(f"whisper {args.whisper_model}, stand-in TTS {args.tts_mb} MB, idle timeout {args.idle:.1f} s, "
+          f"prefetch lead {args.lead:.1f} s")
+    print(f"{'mode':8} {'RSS resident':>12} {'offloaded':>10}   {'tts warm':>8} {'cold':>6} {'prefetched':>10}"
+          f"   {'asr warm':>8} {'cold':>6} {'prefetched':>10}  (MB, s)")
+    for mode in args.modes:
+        r = run_mode(mode, args, tts_factory, speaker_wav, audio)
+        print(f"{mode:8} {r['rss_resident']:12.0f} {r['rss_offloaded']:10.0f}   {r['warm_tts']:8.2f} "
+              f"{r['cold_tts']:6.2f} {r['prefetched_tts']:10.2f}   {r['warm_asr']:8.2f} {r['cold_asr']:6.2f} "
+              f"{r['prefetched_asr']:10.2f}")
+    print(f"Memory budget {args.tts_mb * 1.2:.0f} MB, models used in turns:")
+    run_budget(args, tts_factory, speaker_wav, audio)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
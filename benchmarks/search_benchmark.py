@@ -0,0 +1,120 @@
+"""Benchmark of conversation search over a large message archive.
+
+Fills a MessageArchive with N synthetic messages (words drawn from a Zipf-like
+vocabulary, so there are common and rare words) and measures archiving with the
+full-text index trigger, the one-time indexing of an archive that had no index
+yet, and the search latency for rare, common, multi-word and prefix queries,
+with FTS5 and with the fallback scan. Last, the jump to the oldest hit in a
+ChatView holding the whole archive (offscreen Qt platform).
+
+    python benchmarks/search_benchmark.py [--messages 100000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PyQt6.QtWidgets import QApplication
+
+from voice_dialogue.archive import MessageArchive
+from voice_dialogue.chat_view import ChatView
+
+VOCABULARY = [f"word{index}" for index in range(20000)]
+WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+LABELS = {"user": "User:", "assistant": "Assistant:"}
+# A trailing space ends the word; without it the last word is matched as a prefix
+QUERIES = {
+    "rare word": "word15000 ",
+    "common word": "word1 ",
+    "two words": "word3 word40 ",
+    "prefix": "word12",
+    "short prefix": "word1",
+}
+
+
+def build_messages(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [["user" if index % 2 == 0 else "assistant", " ".join(rng.choices(VOCABULARY, WEIGHTS, k=rng.randint(5, 40)))]
+            for index in range(count)]
+
+
+def wait_for_index(path: Path) -> None:
+    connection = sqlite3.connect(str(path))
+    while not connection.execute("PRAGMA user_version").fetchone()[0]:
+        time.sleep(0.01)
+    connection.close()
+
+
+def percentiles(archive: MessageArchive, query: str, repeats: int = 50) -> tuple:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        hits = archive.search(query)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return statistics.median(samples) * 1000, samples[int(len(samples) * 0.95)] * 1000, len(hits)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100000)
+    args = parser.parse_args()
+    messages = build_messages(args.messages)
+    directory = Path(tempfile.mkdtemp(prefix="voice_dialogue_search_"))
+
+    # An archive without the index, as left by a version before search
+    old_path = directory / "old.sqlite3"
+    connection = sqlite3.connect(str(old_path))
+    connection.execute("CREATE TABLE messages (id INTEGER PRIMARY KEY, created REAL NOT NULL, role TEXT NOT NULL, "
+                       "language TEXT, content TEXT NOT NULL)")
+    connection.executemany("INSERT INTO messages (created, role, content) VALUES (?, ?, ?)",
+                           [(time.time(), role, text) for role, text in messages])
+    connection.commit()
+    connection.close()
+    start = time.perf_counter()
+    old_archive = MessageArchive(old_path)
+    wait_for_index(old_path)
+    old_archive.close()
+    print(f"{args.messages} messages; indexing an existing archive: {time.perf_counter() - start:.2f} s")
+
+    archive = MessageArchive(directory / "archive.sqlite3")
+    wait_for_index(directory / "archive.sqlite3")
+    start = time.perf_counter()
+    for role, text in messages[:2000]:
+        archive.append(role, text)
+    print(f"Archiving one message with the index trigger: {(time.perf_counter() - start) / 2000 * 1000:.2f} ms")
+    archive.import_messages(messages[2000:])
+
+    for full_text in (True, False):
+        archive.full_text = full_text
+        print("FTS5" if full_text else "Fallback scan (LIKE)")
+        for label, query in QUERIES.items():
+            p50, p95, hits = percentiles(archive, query, 50 if full_text else 5)
+            print(f"  {label:12} {query!r:16} p50 {p50:8.2f} ms  p95 {p95:8.2f} ms  {hits} results")
+    archive.full_text = True
+
+    app = QApplication(sys.argv)
+    view = ChatView(LABELS)
+    view.resize(600, 500)
+    view.show()
+    view.load_history(archive.dialogue)
+    while len(view.messages) < args.messages:
+        app.processEvents()
+    hit = min(archive.search(QUERIES["rare word"]), key=lambda message: message["id"])
+    start = time.perf_counter()
+    view.show_message(view.find_message(hit["id"], hit["role"], hit["content"]), QUERIES["rare word"])
+    app.processEvents()
+    print(f"Jump to the oldest hit (message {hit['id']} of {args.messages}): "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms, {view.rendered_count()} messages rendered")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Benchmark of spell-check highlighting of a large paste.
+
+Pastes about 50 KB of text into voice_dialogue.spellcheck.SpellCheckTextEdit and
+into a QPlainTextEdit with the previous uncached highlighter, then types a few
+characters into the pasted text and re-highlights the whole document. Needs
+pyenchant with the requested dictionary; runs without a display through the
+offscreen Qt platform.
+
+    python benchmarks/spellcheck_benchmark.py [--size-kb 50] [--dictionary en_US]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import enchant
+from PyQt6.QtGui import QColor, QSyntaxHighlighter, QTextCharFormat, QTextCursor
+from PyQt6.QtWidgets import QApplication, QPlainTextEdit
+
+from voice_dialogue.spellcheck import SpellCheckTextEdit
+
+SAMPLES = {
+    "en": "The quick brown fox jumps over the lazy dog, while teh assistant reads a longer paragraph aloud. ",
+    "ru": "Съешь же ещё этих мягких французских булок да выпей чаю, сказал асистент и продолжил читать. ",
+}
+
+
+class LegacyHighlighter(QSyntaxHighlighter):
+    """The previous highlighter: every word of every block is checked on every pass."""
+
+    def __init__(self, document, dictionary) -> None:
+        super().__init__(document)
+        self.dictionary = dictionary
+        self.error_format = QTextCharFormat()
+        self.error_format.setUnderlineStyle(QTextCharFormat.UnderlineStyle.SingleUnderline)
+        self.error_format.setUnderlineColor(QColor("red"))
+
+    def highlightBlock(self, text):
+        for match in re.finditer(r'\b\w+\b', text):
+            if not self.dictionary.check(match.group()):
+                self.setFormat(match.start(), match.end() - match.start(), self.error_format)
+
+
+def build_text(sample: str, size_bytes: int) -> str:
+    lines = []
+    size = 0
+    while size < size_bytes:
+        # A few sentences per paragraph, as in a pasted document
+        line = sample * 4
+        lines.append(line)
+        size += len(line.encode("utf-8")) + 1
+    return "\n".join(lines)
+
+
+def bench(name: str, edit: QPlainTextEdit, highlighter: QSyntaxHighlighter, text: str, app: QApplication) -> None:
+    start = time.perf_counter()
+    edit.insertPlainText(text)
+    app.processEvents()
+    paste = time.perf_counter() - start
+
+    cursor = edit.textCursor()
+    cursor.movePosition(QTextCursor.MoveOperation.Start)
+    cursor.movePosition(QTextCursor.MoveOperation.Down, QTextCursor.MoveMode.MoveAnchor, edit.blockCount() // 2)
+    start = time.perf_counter()
+    for ch in "typing ":
+        cursor.insertText(ch)
+        app.processEvents()
+    typing = (time.perf_counter() - start) / len("typing ")
+
+    start = time.perf_counter()
+    highlighter.rehighlight()
+    app.processEvents()
+    rehighlight = time.perf_counter() - start
+    print(f"  {name:8}: paste {paste * 1000:8.1f} ms, keystroke {typing * 1000:6.2f} ms, "
+          f"full re-highlight {rehighlight * 1000:8.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-kb", type=float, default=50.0)
+    parser.add_argument("--dictionary", default="en_US")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    dictionary = enchant.Dict(args.dictionary)
+    text = build_text(SAMPLES["ru" if args.dictionary.startswith("ru") else "en"], int(args.size_kb * 1024))
+    print(f"Paste of {len(text.encode('utf-8')) / 1024:.0f} KB, {text.count(chr(10)) + 1} blocks, dictionary {args.dictionary}")
+
+    edit = SpellCheckTextEdit(lambda: enchant.Dict(args.dictionary))
+    bench("cached", edit, edit.highlighter, text, app)
+
+    legacy = QPlainTextEdit()
+    bench("legacy", legacy, LegacyHighlighter(legacy.document(), dictionary), text, app)
+
+
+if __name__ == "__main__":
+    main()
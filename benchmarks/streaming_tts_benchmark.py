@@ -0,0 +1,99 @@
+"""CPU time to first audio of a long sentence: XTTS streaming against whole-sentence synthesis.
+
+For sentences of increasing length, the time until the first audio is
+available is measured for synthesize_stream (the first chunk of
+inference_stream) and for synthesize_to_file (the whole sentence, which is
+what playback waits for without streaming), together with the real-time factor
+of both. CUDA is hidden, so this measures the CPU path; --threads sets
+tts_num_threads and --chunk-sizes the tts_stream_chunk_size values to compare.
+
+    python benchmarks/streaming_tts_benchmark.py --data-dir LM_Studio_Voice_Dialogue_EN
+    python benchmarks/streaming_tts_benchmark.py --data-dir LM_Studio_Voice_Dialogue_EN --chunk-sizes 10 20 40
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import wave
+from pathlib import Path
+
+# Before torch is imported
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from voice_dialogue.backend import load_settings
+from voice_dialogue.inference import ModelHost
+from voice_dialogue.profiles import get_profile
+
+CLAUSE = "the quick brown fox jumps over the lazy dog while the farmer watches from the porch"
+
+
+def sentence(words: int) -> str:
+    clauses = (CLAUSE.split() * (words // len(CLAUSE.split()) + 1))[:words]
+    return " ".join(clauses).capitalize() + "."
+
+
+def wav_seconds(path: str) -> float:
+    with wave.open(path, "rb") as wf:
+        return wf.getnframes() / wf.getframerate()
+
+
+def measure_stream(host: ModelHost, text: str, tts_language: str) -> tuple:
+    """(seconds to the first chunk, total seconds, seconds of audio)."""
+    start = time.perf_counter()
+    first = None
+    samples = 0
+    for chunk in host.synthesize_stream(text, tts_language, threading.Event()):
+        first = first or time.perf_counter() - start
+        samples += chunk.numel()
+    return first, time.perf_counter() - start, samples / host.sample_rate
+
+
+def measure_whole(host: ModelHost, text: str, tts_language: str, path: str) -> tuple:
+    start = time.perf_counter()
+    host.synthesize_to_file(text, path, tts_language)
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed, wav_seconds(path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-dir", type=Path, required=True, help="build folder with settings.json and speaker.wav")
+    parser.add_argument("--words", type=int, nargs="+", default=[10, 25, 50])
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[20])
+    parser.add_argument("--threads", type=int, default=0, help="torch CPU threads (0 = torch default)")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    settings = load_settings(args.data_dir)
+    settings.update(tts_num_threads=args.threads, model_idle_offload_seconds=0, model_memory_budget_mb=0)
+    host = ModelHost(settings, args.data_dir / "speaker.wav", with_whisper=False)
+    if not host.streaming_supported:
+        print(f"{host.tts_model_name} has no inference_stream; nothing to compare")
+        return 1
+    tts_language = get_profile(settings.get("language"))["tts_language"]
+    # Lazy initialization and the speaker latents are not timed
+    measure_stream(host, sentence(5), tts_language)
+    path = os.path.join(tempfile.mkdtemp(prefix="voice_dialogue_stream_"), "sentence.wav")
+
+    print(f"{'words':>5} {'path':14} {'first audio s':>13} {'total s':>8} {'audio s':>8} {'RTF':>6}")
+    for words in args.words:
+        text = sentence(words)
+        runs = [("whole", lambda: measure_whole(host, text, tts_language, path))]
+        for chunk_size in args.chunk_sizes:
+            def stream(chunk_size=chunk_size):
+                settings["tts_stream_chunk_size"] = chunk_size
+                return measure_stream(host, text, tts_language)
+            runs.append((f"stream/{chunk_size}", stream))
+        for label, run in runs:
+            results = [run() for _ in range(args.repeats)]
+            first, total, audio = (statistics.median(values) for values in zip(*results))
+            print(f"{words:5} {label:14} {first:13.2f} {total:8.2f} {audio:8.2f} {total / audio:6.2f}")
+    host.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""GUI event loop latency during speech synthesis, models in-process vs. in a worker.
+
+A Qt timer ticks every 16 ms (one frame at 60 Hz) while a thread streams
+synthesis the way the speech stage does; how late the ticks come is the stutter
+the user sees. Three phases are measured: idle, the models in this process
+(ModelHost), and the models in the inference worker process (InferenceClient).
+The default TTS is a stand-in that spends its synthesis time in pure Python,
+holding the GIL like the Python-side decoding loop of XTTS; --tts xtts uses the
+real model and a voice sample.
+
+    python benchmarks/ui_latency_benchmark.py
+    python benchmarks/ui_latency_benchmark.py --tts xtts --speaker-wav LM_Studio_Voice_Dialogue_EN/speaker.wav
+"""
+import argparse
+import functools
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import torch
+from PyQt6.QtCore import QCoreApplication, Qt, QTimer
+
+from benchmarks.pipeline_benchmark import SyntheticTTS, write_wav
+from voice_dialogue.inference import InferenceClient, ModelHost
+from voice_dialogue.tracing import percentile
+
+FRAME = 0.016
+# A tick this late is a visible stutter
+STUTTER = 0.05
+TEXT = ("A heat pump moves heat instead of making it. A fluid called a refrigerant absorbs warmth "
+        "from the outside air, even when it is cold.")
+
+
+def burn(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        for i in range(1000):
+            total += i
+
+
+class GilBoundTTS(SyntheticTTS):
+    """Synthetic TTS that computes in Python instead of sleeping."""
+
+    def inference_stream(self, text: str, language: str, gpt_cond_latent, speaker_embedding, **kwargs):
+        rate = self.synthesizer.output_sample_rate
+        samples = self._samples(text)
+        step = int(self.chunk_seconds * rate)
+        burn(self.first_chunk_latency)
+        for offset in range(0, len(samples), step):
+            chunk = samples[offset:offset + step]
+            burn(len(chunk) / rate * self.rtf)
+            yield chunk
+
+
+def synthesis_loop(models, stop: threading.Event) -> None:
+    while not stop.is_set():
+        for samples in models.synthesize_stream(TEXT, "en", stop):
+            # What the app does with every chunk before handing it to the mixer
+            (samples.clamp(-1.0, 1.0) * 32767).to(torch.int16)
+
+
+def measure(app: QCoreApplication, seconds: float, models=None) -> list:
+    """Lateness of the frame timer ticks in seconds, with synthesis running if models are given."""
+    stop = threading.Event()
+    worker = threading.Thread(target=synthesis_loop, args=(models, stop), daemon=True) if models else None
+    lateness = []
+    last = [time.perf_counter()]
+
+    def tick() -> None:
+        now = time.perf_counter()
+        lateness.append(max(0.0, now - last[0] - FRAME))
+        last[0] = now
+
+    timer = QTimer()
+    timer.setTimerType(Qt.TimerType.PreciseTimer)
+    timer.setInterval(int(FRAME * 1000))
+    timer.timeout.connect(tick)
+    QTimer.singleShot(int(seconds * 1000), app.quit)
+    if worker is not None:
+        worker.start()
+    timer.start()
+    app.exec()
+    timer.stop()
+    stop.set()
+    if worker is not None:
+        worker.join()
+    return lateness
+
+
+def report(name: str, lateness: list) -> None:
+    stutters = sum(1 for value in lateness if value > STUTTER)
+    print(f"{name:14} {len(lateness):6d} {percentile(lateness, 0.5) * 1000:7.1f} "
+          f"{percentile(lateness, 0.95) * 1000:7.1f} {percentile(lateness, 0.99) * 1000:7.1f} "
+          f"{max(lateness) * 1000:7.1f} {stutters:9d}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10.0, help="duration of each phase")
+    parser.add_argument("--tts", choices=("synthetic", "xtts"), default="synthetic")
+    parser.add_argument("--tts-rtf", type=float, default=0.8, help="real-time factor of the synthetic TTS")
+    parser.add_argument("--speaker-wav", type=Path, help="voice sample for XTTS")
+    parser.add_argument("--whisper-model", default="tiny")
+    args = parser.parse_args()
+
+    tts_factory = functools.partial(GilBoundTTS, args.tts_rtf) if args.tts == "synthetic" else None
+    speaker_wav = args.speaker_wav
+    if speaker_wav is None:
+        if tts_factory is None:
+            print("XTTS needs a voice sample: pass --speaker-wav")
+            return 2
+        synthetic = tts_factory()
+        speaker_wav = Path(tempfile.mkdtemp(prefix="voice_dialogue_")) / "speaker.wav"
+        write_wav(speaker_wav, synthetic._samples("voice sample"), synthetic.synthesizer.output_sample_rate)
+    settings = {"whisper_model": args.whisper_model}
+
+    app = QCoreApplication(sys.argv)
+    print(f"Frame timer {FRAME * 1000:.0f} ms, {args.seconds:.0f} s per phase, tts {args.tts}")
+    print(f"{'phase':14} {'ticks':>6} {'p50':>7} {'p95':>7} {'p99':>7} {'max':>7} {'stutters':>9}  (lateness, ms)")
+    report("idle", measure(app, args.seconds))
+
+    host = ModelHost(settings, speaker_wav, tts_factory)
+    report("in-process", measure(app, args.seconds, host))
+    del host
+
+    client = InferenceClient(settings, speaker_wav, tts_factory)
+    try:
+        report("worker", measure(app, args.seconds, client))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
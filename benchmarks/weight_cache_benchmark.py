@@ -0,0 +1,109 @@
+"""Model load time and memory: torch.load of the checkpoint vs. the memory-mapped weight cache.
+
+Every load runs in a fresh process, on the CPU, in three phases per model:
+checkpoint (the normal torch.load path, no cache), cold (empty cache: normal
+load plus the one-time conversion) and warm (from the cache). Reported are
+the load time, the peak RSS, and the RSS after loading split into anonymous
+memory (private to the process) and file-backed pages (shared between the
+processes that map the same file, and droppable by the kernel). --processes N
+also starts N warm loads at once and reports the total private memory.
+
+The OS page cache is not dropped between phases (that needs root): warm is a
+warm start. Run `sync; echo 3 | sudo tee /proc/sys/vm/drop_caches` between
+runs for cold-disk numbers.
+
+    python benchmarks/weight_cache_benchmark.py
+    python benchmarks/weight_cache_benchmark.py --whisper-model large-v3-turbo --tts-model tts_models/multilingual/multi-dataset/xtts_v2
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def memory_status() -> dict:
+    """RssAnon and RssFile of this process in MB (Linux), empty elsewhere."""
+    status = {}
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("RssAnon", "RssFile"):
+                    status[key] = int(value.split()[0]) / 1024
+    except OSError:
+        pass
+    return status
+
+
+def load_in_child(kind: str, name: str, cache_dir: str) -> None:
+    """Load one model and print the measurements as JSON (runs in the child process)."""
+    import whisper
+    from TTS.api import TTS
+
+    from voice_dialogue.weight_cache import WeightCache, load_whisper, load_xtts
+
+    cache = WeightCache(cache_dir) if cache_dir else None
+    start = time.perf_counter()
+    if kind == "whisper":
+        model = load_whisper(cache, name, "cpu") if cache else whisper.load_model(name, device="cpu")
+    else:
+        model = load_xtts(cache, name) if cache else TTS(model_name=name)
+    seconds = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"seconds": seconds, "peak_rss": peak, **memory_status()}))
+    del model
+
+
+def run_child(kind: str, name: str, cache_dir: str) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, __file__, "--child", kind, name, cache_dir or ""],
+                            stdout=subprocess.PIPE, text=True)
+
+
+def result_of(process: subprocess.Popen) -> dict:
+    output, _ = process.communicate()
+    if process.returncode:
+        raise RuntimeError(f"Load process exited with code {process.returncode}")
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def report(phase: str, result: dict) -> None:
+    print(f"  {phase:11} {result['seconds']:8.2f} {result['peak_rss']:9.0f} "
+          f"{result.get('RssAnon', float('nan')):9.0f} {result.get('RssFile', float('nan')):9.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--whisper-model", default="tiny")
+    parser.add_argument("--tts-model", help="also measure this TTS model (XTTS)")
+    parser.add_argument("--processes", type=int, default=2, help="concurrent warm loads")
+    parser.add_argument("--child", nargs=3, metavar=("KIND", "NAME", "CACHE_DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        load_in_child(*args.child)
+        return
+
+    models = [("whisper", args.whisper_model)] + ([("tts", args.tts_model)] if args.tts_model else [])
+    for kind, name in models:
+        cache_dir = tempfile.mkdtemp(prefix="voice_dialogue_weights_")
+        print(f"{kind} {name}")
+        print(f"  {'phase':11} {'load s':>8} {'peak MB':>9} {'anon MB':>9} {'file MB':>9}")
+        report("checkpoint", result_of(run_child(kind, name, None)))
+        report("cold", result_of(run_child(kind, name, cache_dir)))
+        report("warm", result_of(run_child(kind, name, cache_dir)))
+        if args.processes > 1:
+            for label, directory in (("checkpoint", None), ("warm", cache_dir)):
+                results = [result_of(process) for process in
+                           [run_child(kind, name, directory) for _ in range(args.processes)]]
+                print(f"  {args.processes} processes at once, {label}: "
+                      f"{sum(result.get('RssAnon', 0) for result in results):.0f} MB private, "
+                      f"slowest load {max(result['seconds'] for result in results):.2f} s")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
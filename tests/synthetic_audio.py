@@ -0,0 +1,34 @@
+"""Synthetic voices for the barge-in tests, as in benchmarks/barge_in_benchmark.py.
+
+(An installed package named "benchmarks", pysbd's, shadows the benchmarks
+folder, so the tests do not import from it.)
+"""
+import array
+import math
+import random
+
+RATE = 22050
+CHUNK = 1024
+# The echo reaches the microphone a little after the audio is handed to the mixer
+ECHO_DELAY = 0.08
+NOISE_LEVEL = 0.002
+
+
+def voice(duration: float, f0: float, syllable_rate: float, amplitude: float, seed: int) -> list:
+    """Harmonic tone with vibrato, syllable envelope and pauses between words."""
+    rng = random.Random(seed)
+    pauses = set(rng.sample(range(int(duration * syllable_rate)), int(duration * syllable_rate) // 4))
+    out = []
+    phase = 0.0
+    for n in range(int(duration * RATE)):
+        t = n / RATE
+        syllable = int(t * syllable_rate)
+        envelope = 0.0 if syllable in pauses else math.sin(math.pi * (t * syllable_rate % 1.0)) ** 2
+        phase += 2 * math.pi * f0 * (1 + 0.03 * math.sin(2 * math.pi * 5 * t)) / RATE
+        tone = sum(math.sin(k * phase) / k for k in range(1, 6)) / 1.5
+        out.append(amplitude * envelope * tone)
+    return out
+
+
+def to_pcm(samples: list) -> bytes:
+    return array.array("h", [max(-32768, min(32767, int(sample * 32767))) for sample in samples]).tobytes()
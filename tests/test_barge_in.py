@@ -0,0 +1,326 @@
+"""A barge-in turn on a fake audio device.
+
+The real backend, engine and orchestrator answer a typed message, in real time.
+Only the edges are stand-ins:
+- the mixer channel: its output is heard by the fake microphone as echo;
+- the microphone: it adds the user starting to talk over the reply, and room noise;
+- the LLM stream: a scripted reply, streamed word by word;
+- the synthesis pool: one sentence after the other, slower than the LLM;
+- the models: they keep the recording handed to Whisper.
+The user starts talking during the third piece of the reply. At that point that
+piece's later sentences still wait for synthesis and the LLM is still streaming.
+"""
+import array
+import random
+import re
+import threading
+import time
+import wave
+from concurrent.futures import Future
+from queue import Queue
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pyaudio = pytest.importorskip("pyaudio")
+pygame = pytest.importorskip("pygame")
+openai = pytest.importorskip("openai")
+
+from synthetic_audio import CHUNK, ECHO_DELAY, NOISE_LEVEL, RATE, to_pcm, voice
+from voice_dialogue.archive import MessageArchive
+from voice_dialogue.backend import VoiceAssistantBackend, load_settings
+from voice_dialogue.engine import RECORDING, StateChanged, VoiceEngine
+from voice_dialogue.orchestrator import TurnOrchestrator
+from voice_dialogue.profiling import TurnProfiler
+from voice_dialogue.tracing import Tracer
+from voice_dialogue.vad import EchoReference
+
+REPLY = " ".join(f"This is sentence {number} of the story." for number in range(1, 61))
+TOKEN_SECONDS = 0.02
+SENTENCE_SECONDS = 1.0
+SYNTHESIS_SECONDS = 0.5
+# Seconds after the first audio of the reply. The first two pieces are one sentence each,
+# each waited for and played, so the first sentence of the third piece is playing then
+USER_ONSET = 3.4
+USER_SECONDS = 1.5
+COUPLING = 1.0
+# The user is 12 dB above the echo
+USER_GAIN = COUPLING * 4.0
+# From the user's onset until the channel is stopped, and from there until the capture is the turn's state
+DETECTION_BOUND = 0.8
+WIND_DOWN_BOUND = 0.5
+
+
+class FakeSound:
+    """Stands in for pygame.mixer.Sound(buffer=...) of 16-bit mono audio."""
+
+    def __init__(self, buffer: bytes) -> None:
+        self.buffer = buffer
+        self.samples = array.array("h", buffer)
+
+    def get_raw(self) -> bytes:
+        return self.buffer
+
+    def get_length(self) -> float:
+        return len(self.samples) / RATE
+
+
+class FakeSpeakers:
+    """Stands in for the TTS mixer channel; remembers what played when, for the microphone to hear."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.sounds = []  # [start, end, samples] in time.monotonic(), like the echo reference
+        self.first_play = None
+        self.stopped_at = None
+
+    def play(self, sound: FakeSound) -> None:
+        with self.lock:
+            now = time.monotonic()
+            self._cut(now)
+            self.sounds.append([now, now + sound.get_length(), sound.samples])
+            self.first_play = self.first_play or now
+
+    def queue(self, sound: FakeSound) -> None:
+        with self.lock:
+            start = max([time.monotonic()] + [end for _, end, _ in self.sounds])
+            self.sounds.append([start, start + sound.get_length(), sound.samples])
+
+    def stop(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            self.stopped_at = self.stopped_at or now
+            self._cut(now)
+
+    def get_busy(self) -> bool:
+        now = time.monotonic()
+        with self.lock:
+            return any(start <= now < end for start, end, _ in self.sounds)
+
+    def get_queue(self):
+        now = time.monotonic()
+        with self.lock:
+            return next((samples for start, _, samples in self.sounds if start > now), None)
+
+    def output(self, start: float, count: int) -> list:
+        """count samples of what the speakers played from start on."""
+        out = [0.0] * count
+        with self.lock:
+            for begin, end, samples in self.sounds:
+                # Index in samples of out[0]
+                offset = round((start - begin) * RATE)
+                for n in range(max(0, -offset), min(count, len(samples) - offset, round((end - start) * RATE))):
+                    out[n] += samples[offset + n] / 32768
+        return out
+
+    def _cut(self, now: float) -> None:
+        # The sound that is playing ends now, the queued one never starts
+        self.sounds = [[start, min(end, now), samples] for start, end, samples in self.sounds if start <= now]
+
+
+class FakeMicrophone:
+    """Stands in for a PyAudio input stream; a chunk is returned once it has been recorded."""
+
+    def __init__(self, speakers: FakeSpeakers, user: list) -> None:
+        self.speakers = speakers
+        self.user = user
+        self.opened_at = time.monotonic()
+        self.position = 0
+        self.closed_at = None
+        self.noise = random.Random(1)
+
+    @property
+    def user_start(self) -> float:
+        first_play = self.speakers.first_play
+        return None if first_play is None else first_play + USER_ONSET
+
+    def read(self, chunk: int, exception_on_overflow: bool = True) -> bytes:
+        start = self.opened_at + self.position / RATE
+        delay = start + chunk / RATE - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        echo = self.speakers.output(start - ECHO_DELAY, chunk)
+        user_start = self.user_start
+        samples = []
+        for n in range(chunk):
+            sample = COUPLING * echo[n] + self.noise.gauss(0.0, NOISE_LEVEL)
+            if user_start is not None:
+                offset = int((start - user_start) * RATE) + n
+                if 0 <= offset < len(self.user):
+                    sample += USER_GAIN * self.user[offset]
+            samples.append(sample)
+        self.position += chunk
+        return to_pcm(samples)
+
+    def stop_stream(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed_at = self.position
+
+
+class FakeAudio:
+    """Stands in for pyaudio.PyAudio; every input stream is in the same room."""
+
+    def __init__(self, speakers: FakeSpeakers, user: list) -> None:
+        self.speakers = speakers
+        self.user = user
+        self.streams = []
+
+    def open(self, **kwargs) -> FakeMicrophone:
+        stream = FakeMicrophone(self.speakers, self.user)
+        self.streams.append(stream)
+        return stream
+
+    def get_sample_size(self, audio_format) -> int:
+        return 2
+
+
+class ScriptedLLM:
+    """Stands in for openai.ChatCompletion.create: streams REPLY word by word."""
+
+    def __init__(self) -> None:
+        self.tokens = re.findall(r"\s*\S+", REPLY)
+        self.sent = 0
+
+    def create(self, model: str, messages: list, stream: bool = False):
+        assert stream
+        return self._stream()
+
+    def _stream(self):
+        for token in self.tokens:
+            time.sleep(TOKEN_SECONDS)
+            self.sent += 1
+            yield SimpleNamespace(choices=[SimpleNamespace(delta={"content": token})])
+
+
+class SlowSynthesisPool:
+    """Stands in for the synthesis pool: one worker, SYNTHESIS_SECONDS per sentence, in order."""
+
+    ready = True
+
+    def __init__(self, samples: torch.Tensor) -> None:
+        self.samples = samples
+        self.futures = []
+        self._requests = Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str, tts_language: str) -> Future:
+        future = Future()
+        self.futures.append(future)
+        self._requests.put(future)
+        return future
+
+    def close(self) -> None:
+        self._requests.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            future = self._requests.get()
+            if future is None:
+                return
+            if future.set_running_or_notify_cancel():
+                time.sleep(SYNTHESIS_SECONDS)
+                future.set_result(self.samples)
+
+
+class FakeModels:
+    """Stands in for the model host; hears nothing in the recording but keeps its length."""
+
+    streaming_supported = False
+
+    def __init__(self) -> None:
+        self.recorded_frames = []
+
+    def prefetch(self, kind: str) -> None:
+        pass
+
+    def transcribe(self, filename: str, asr_language: str = None) -> dict:
+        with wave.open(filename, "rb") as wf:
+            self.recorded_frames.append(wf.getnframes())
+        return {"text": "", "language": asr_language, "segments": []}
+
+
+class FakeDeviceBackend(VoiceAssistantBackend):
+    """The backend on the fake audio device: only what a turn uses is set up, no model is loaded."""
+
+    def __init__(self, settings: dict, data_dir, audio: FakeAudio, models: FakeModels,
+                 pool: SlowSynthesisPool) -> None:
+        self.settings = settings
+        self.data_dir = data_dir
+        self.history_file = data_dir / "conversation_history.json"
+        self.message_counter_file = data_dir / "message_counter.json"
+        self.set_language(settings["language"])
+        self.conversation_history = []
+        self.history_lock = threading.RLock()
+        self.archive = MessageArchive(data_dir / "archive.sqlite3")
+        self.memory = None
+        self.stop_event = threading.Event()
+        self.tracer = Tracer()
+        self.profiler = TurnProfiler(data_dir / "profiles")
+        self.cancel_record_event = threading.Event()
+        self.stop_record_event = threading.Event()
+        self.summary_interval = settings["summary_interval"]
+        self.message_count = 0
+        self.audio = audio
+        self.audio_format = pyaudio.paInt16
+        self.channels = 1
+        self.rate = RATE
+        self.chunk = CHUNK
+        self.echo_reference = EchoReference()
+        self.echo_coupling = None
+        self.models = models
+        self.tts_sample_rate = RATE
+        self.tts_channel = audio.speakers
+        self._resampler = None
+        self.cue_sounds = {key: SimpleNamespace(play=lambda: None) for key in self.SOUND_FILES}
+        self.synthesis_pool = pool
+        self.chars_per_second = 15.0
+
+
+def test_user_talking_over_the_reply_interrupts_it(tmp_path, monkeypatch):
+    speakers = FakeSpeakers()
+    audio = FakeAudio(speakers, voice(USER_SECONDS, 210.0, 5.0, 0.05, seed=5))
+    llm = ScriptedLLM()
+    pool = SlowSynthesisPool(torch.tensor(voice(SENTENCE_SECONDS, 120.0, 4.0, 0.05, seed=2)))
+    models = FakeModels()
+    monkeypatch.setattr(pygame.mixer, "get_init", lambda: (RATE, -16, 1))
+    monkeypatch.setattr(pygame.mixer, "Sound", FakeSound)
+    monkeypatch.setattr(openai.ChatCompletion, "create", llm.create)
+
+    settings = load_settings(tmp_path)
+    # Every sentence is synthesized on its own
+    settings.update(barge_in=True, barge_in_end_silence=0.5, tts_call_overhead_chars=0, profiling="off")
+    backend = FakeDeviceBackend(settings, tmp_path, audio, models, pool)
+    engine = VoiceEngine(backend)
+    recording_at = []
+    engine.subscribe(lambda event: recording_at.append(time.monotonic())
+                     if event == StateChanged(RECORDING) else None)
+    orchestrator = TurnOrchestrator(engine)
+    try:
+        assert orchestrator.text_turn("Tell me a long story.").result(30) == ""
+    finally:
+        orchestrator.close()
+        pool.close()
+
+    user_start = audio.streams[0].user_start
+    assert user_start is not None
+    # The channel was stopped soon after the user started talking
+    assert speakers.stopped_at is not None
+    assert 0 < speakers.stopped_at - user_start <= DETECTION_BOUND
+    # The sentences still waiting for synthesis were canceled, none is left pending
+    assert all(future.done() for future in pool.futures)
+    assert any(future.cancelled() for future in pool.futures)
+    # The LLM stream was abandoned
+    assert 0 < llm.sent < len(llm.tokens)
+    # The capture became the turn's recording once the reply had wound down...
+    assert len(recording_at) == 1
+    assert 0 <= recording_at[0] - speakers.stopped_at <= WIND_DOWN_BOUND
+    # ... and starts before the user's first syllable, on the listener's stream
+    assert len(audio.streams) == 1 and models.recorded_frames
+    stream = audio.streams[0]
+    captured_from = stream.opened_at + (stream.closed_at - models.recorded_frames[0]) / RATE
+    assert captured_from <= user_start
@@ -0,0 +1,28 @@
+"""Spoken forms of signed amounts: the minus is read before every kind of number."""
+import pytest
+
+from voice_dialogue.normalization import normalize
+from voice_dialogue.profiles import get_profile
+
+CASES = [
+    ("en", "-3", "minus three"),
+    ("en", "-10°C", "minus ten degrees Celsius"),
+    ("en", "-5 kg", "minus five kilograms"),
+    ("en", "-2.5 km", "minus two point five kilometers"),
+    ("en", "-$5", "minus five dollars"),
+    ("en", "-5%", "minus five percent"),
+    ("en", "5 kg", "five kilograms"),
+    # A hyphen between numbers is not a sign
+    ("en", "1-2", "one - two"),
+    ("ru", "-15 °C", "минус пятнадцать градусов Цельсия"),
+    ("ru", "-5 кг", "минус пять килограммов"),
+    ("ru", "-5 ₽", "минус пять рублей"),
+    ("ru", "-3,5%", "минус три целых пять десятых процента"),
+    ("ru", "5-6", "пять - шесть"),
+]
+
+
+@pytest.mark.parametrize("language, text, spoken", CASES)
+def test_signed_amounts(language, text, spoken):
+    normalized, _ = normalize(text, get_profile(language)["normalization"])
+    assert normalized == spoken
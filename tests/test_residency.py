@@ -0,0 +1,206 @@
+"""Idle offloading and the memory budget, on small stand-in models.
+
+The stand-ins are 1 MB linear layers; their loaders count the loads and take
+LOAD_SECONDS, so that a reload ahead of use can be told from one on use. The
+watcher checks every CHECK_INTERVAL seconds instead of every 5 s.
+"""
+import logging
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from voice_dialogue import residency as residency_module
+from voice_dialogue.residency import RESIDENT, ModelResidency
+from voice_dialogue.tracing import Tracer
+
+# 512 x 512 float32 weights, 1 MB
+SIDE = 512
+MODEL_MB = 1.0
+IDLE_SECONDS = 0.2
+CHECK_INTERVAL = 0.05
+LOAD_SECONDS = 0.3
+
+
+def stand_in() -> torch.nn.Module:
+    return torch.nn.Linear(SIDE, SIDE, bias=False)
+
+
+class Loader:
+    """Loads a stand-in model in LOAD_SECONDS and keeps the names it loaded."""
+
+    def __init__(self) -> None:
+        self.loads = []
+
+    def __call__(self, name: str) -> torch.nn.Module:
+        time.sleep(LOAD_SECONDS)
+        self.loads.append(name)
+        return stand_in()
+
+
+def state(residency: ModelResidency, kind: str) -> str:
+    return residency.status()[kind][1]
+
+
+def wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def keep_resident(residency: ModelResidency) -> None:
+    # The idle clock of a reloaded model runs from its prefetch; the rest of the test must not race it
+    residency.idle_seconds = 60
+
+
+@pytest.fixture
+def make_residency(monkeypatch):
+    monkeypatch.setattr(residency_module, "CHECK_INTERVAL", CHECK_INTERVAL)
+    created = []
+
+    def make(device: str = "cpu", **kwargs) -> ModelResidency:
+        residency = ModelResidency(device, **kwargs)
+        created.append(residency)
+        return residency
+
+    yield make
+    for residency in created:
+        residency.close()
+
+
+def test_unload_drops_the_idle_model_and_loads_it_on_use(make_residency):
+    residency = make_residency(idle_seconds=IDLE_SECONDS, mode="unload")
+    loader = Loader()
+    residency.add("tts", "stand-in", stand_in(), loader)
+    assert wait_for(lambda: state(residency, "tts") == "unload")
+    keep_resident(residency)
+    with residency.use("tts") as model:
+        assert model.weight.dtype == torch.float32
+    assert loader.loads == ["stand-in"]
+    assert residency.status()["tts"] == ("stand-in", RESIDENT, MODEL_MB)
+
+
+def test_half_keeps_the_idle_model_at_float16(make_residency):
+    residency = make_residency(idle_seconds=IDLE_SECONDS, mode="half")
+    loader = Loader()
+    model = stand_in()
+    residency.add("tts", "stand-in", model, loader)
+    assert wait_for(lambda: state(residency, "tts") == "half")
+    assert model.weight.dtype == torch.float16
+    keep_resident(residency)
+    with residency.use("tts") as used:
+        # The same weights, converted back; nothing is loaded from disk
+        assert used is model and used.weight.dtype == torch.float32
+        used(torch.ones(1, SIDE))
+    assert loader.loads == []
+
+
+def test_cpu_needs_a_gpu(make_residency):
+    assert make_residency("cpu", idle_seconds=IDLE_SECONDS, mode="cpu").mode == "unload"
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="needs a GPU")
+def test_cpu_moves_the_idle_model_to_system_memory(make_residency):
+    residency = make_residency("cuda", idle_seconds=IDLE_SECONDS, mode="cpu")
+    model = stand_in().to("cuda")
+    residency.add("tts", "stand-in", model, Loader())
+    assert wait_for(lambda: state(residency, "tts") == "cpu")
+    assert model.weight.device.type == "cpu"
+    keep_resident(residency)
+    with residency.use("tts") as used:
+        assert used is model and used.weight.device.type == "cuda"
+
+
+def test_model_in_use_is_not_offloaded(make_residency):
+    residency = make_residency(idle_seconds=IDLE_SECONDS, mode="unload")
+    residency.add("tts", "stand-in", stand_in(), Loader())
+    with residency.use("tts"):
+        time.sleep(3 * IDLE_SECONDS)
+        assert state(residency, "tts") == RESIDENT
+    # The idle time counts from the end of the use
+    time.sleep(IDLE_SECONDS / 2)
+    assert state(residency, "tts") == RESIDENT
+    assert wait_for(lambda: state(residency, "tts") == "unload")
+
+
+def test_budget_offloads_the_least_recently_used_model(make_residency):
+    residency = make_residency(budget_mb=1.5 * MODEL_MB)
+    residency.add("whisper", "stand-in-asr", stand_in(), Loader())
+    residency.add("tts", "stand-in-tts", stand_in(), Loader())
+    with residency.use("tts"):
+        pass
+    assert wait_for(lambda: state(residency, "whisper") == "unload")
+    assert state(residency, "tts") == RESIDENT
+
+
+def test_budget_makes_room_for_a_model_brought_back(make_residency):
+    residency = make_residency(budget_mb=1.5 * MODEL_MB)
+    whisper_loader = Loader()
+    residency.add("whisper", "stand-in-asr", stand_in(), whisper_loader)
+    residency.add("tts", "stand-in-tts", stand_in(), Loader())
+    assert wait_for(lambda: state(residency, "whisper") == "unload")
+    with residency.use("whisper"):
+        # The idle TTS model went first, so the models stay within the budget
+        assert state(residency, "tts") == "unload"
+    assert whisper_loader.loads == ["stand-in-asr"]
+    assert state(residency, "whisper") == RESIDENT
+
+
+def test_budget_never_offloads_a_model_in_use(make_residency, caplog):
+    residency = make_residency(budget_mb=1.5 * MODEL_MB)
+    residency.add("whisper", "stand-in-asr", stand_in(), Loader())
+    residency.add("tts", "stand-in-tts", stand_in(), Loader())
+    assert wait_for(lambda: state(residency, "whisper") == "unload")
+    with caplog.at_level(logging.WARNING), residency.use("tts"), residency.use("whisper"):
+        assert state(residency, "tts") == state(residency, "whisper") == RESIDENT
+    assert "exceeds the memory budget" in caplog.text
+
+
+def test_prefetch_reloads_ahead_of_use(make_residency):
+    residency = make_residency(idle_seconds=IDLE_SECONDS, mode="unload")
+    loader = Loader()
+    residency.add("whisper", "stand-in", stand_in(), loader)
+    assert wait_for(lambda: state(residency, "whisper") == "unload")
+    keep_resident(residency)
+    residency.prefetch("whisper")
+    time.sleep(2 * LOAD_SECONDS)
+    start = time.perf_counter()
+    with residency.use("whisper"):
+        pass
+    assert time.perf_counter() - start < LOAD_SECONDS / 2
+    # A resident model is not fetched again
+    residency.prefetch("whisper")
+    time.sleep(LOAD_SECONDS / 2)
+    assert loader.loads == ["stand-in"]
+
+
+def test_recording_reloads_whisper_while_the_user_talks(make_residency):
+    # What the record hotkey starts; the engine needs the app's audio stack
+    engine_module = pytest.importorskip("voice_dialogue.engine")
+    residency = make_residency(idle_seconds=IDLE_SECONDS, mode="unload")
+    loader = Loader()
+    residency.add("whisper", "stand-in", stand_in(), loader)
+    assert wait_for(lambda: state(residency, "whisper") == "unload")
+    keep_resident(residency)
+    states = []
+
+    def record_audio(filename: str, max_duration: int = None, capture: tuple = None) -> str:
+        states.append(state(residency, "whisper"))
+        # The user talks
+        time.sleep(2 * LOAD_SECONDS)
+        states.append(state(residency, "whisper"))
+        return filename
+
+    backend = SimpleNamespace(tracer=Tracer(), profiler=None, record_audio=record_audio,
+                              models=SimpleNamespace(prefetch=residency.prefetch))
+    path = engine_module.VoiceEngine(backend, play_audio=False).record()
+    os.remove(path)
+    # Still offloaded when recording started, back by the time it ended, without waiting for the reload
+    assert states == ["unload", RESIDENT]
+    assert loader.loads == ["stand-in"]
@@ -0,0 +1,89 @@
+"""Corpus test of sentence segmentation and of the synthesis cost model.
+
+tests/fixtures/segmentation_corpus.json holds EN/RU replies with the sentences
+they must be cut into (abbreviations, decimals, initials, numbered lists, code
+blocks) and streamed prefixes with the part that is already complete.
+"""
+import json
+from pathlib import Path
+
+import pytest
+
+from voice_dialogue.normalization import normalize
+from voice_dialogue.profiles import get_profile
+from voice_dialogue.segmentation import complete_prefix_end, segment_text
+
+CORPUS = json.loads((Path(__file__).parent / "fixtures" / "segmentation_corpus.json").read_text(encoding="utf-8"))
+LONG_REPLY = " ".join(f"Sentence number {word} is here." for word in
+                      ["one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten", "eleven", "twelve"])
+
+
+def case_id(case: dict) -> str:
+    return f"{case['language']}:{case['text'][:30]}"
+
+
+def assert_covers(text: str, segments: list) -> None:
+    """Segments are in order, do not overlap and leave out only whitespace."""
+    position = 0
+    for start, end, _ in segments:
+        assert start >= position and end > start
+        assert not text[position:start].strip()
+        position = end
+    assert not text[position:].strip()
+
+
+@pytest.mark.parametrize("case", CORPUS["sentences"], ids=case_id)
+def test_sentences(case):
+    text = case["text"]
+    # Without a per-call overhead merging never pays off, so every sentence is its own segment
+    segments = segment_text(text, get_profile(case["language"])["abbreviations"], max_chars=1000, call_overhead=0)
+    assert [text[start:end] for start, end, _ in segments] == case["segments"]
+    assert [index for index, (_, _, speakable) in enumerate(segments) if not speakable] == case.get("unspeakable", [])
+    assert_covers(text, segments)
+
+
+@pytest.mark.parametrize("case", CORPUS["streaming"], ids=case_id)
+def test_complete_prefix(case):
+    text = case["text"]
+    end = complete_prefix_end(text, 0, get_profile(case["language"])["abbreviations"])
+    assert text[:end] == case["complete"]
+
+
+@pytest.mark.parametrize("case", CORPUS["sentences"], ids=case_id)
+def test_normalized_offsets_stay_aligned(case):
+    text = case["text"]
+    profile = get_profile(case["language"])
+    for start, end, speakable in segment_text(text, profile["abbreviations"]):
+        if not speakable:
+            continue
+        original = text[start:end]
+        normalized, offsets = normalize(original, profile["normalization"])
+        # One offset per normalized character, never going back, always inside the original segment
+        assert len(offsets) == len(normalized)
+        assert offsets == sorted(offsets)
+        assert all(0 <= offset < len(original) for offset in offsets)
+        # Only punctuation dropped by the normalizer may follow the last mapped character
+        assert not original[offsets[-1] + 1:].strip(" .,:;!?…")
+
+
+def segment_lengths(**cost) -> list:
+    segments = segment_text(LONG_REPLY, **cost)
+    assert_covers(LONG_REPLY, segments)
+    return [end - start for start, end, _ in segments]
+
+
+def test_max_chars_caps_segments():
+    for max_chars in (40, 80, 160):
+        assert max(segment_lengths(max_chars=max_chars)) <= max_chars
+    assert len(segment_lengths(max_chars=40)) > len(segment_lengths(max_chars=160))
+
+
+def test_call_overhead_merges_sentences():
+    counts = [len(segment_lengths(max_chars=1000, call_overhead=overhead)) for overhead in (0, 80, 1000)]
+    assert counts[0] == 12
+    assert counts[0] > counts[1] > counts[2]
+
+
+def test_quadratic_chars_splits_long_groups():
+    counts = [len(segment_lengths(max_chars=1000, call_overhead=80, quadratic_chars=q)) for q in (50, 400, 100000)]
+    assert counts[0] > counts[1] > counts[2]
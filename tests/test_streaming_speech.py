@@ -0,0 +1,76 @@
+"""Stopping a chunk spoken from the XTTS stream.
+
+The stand-in stream has its first two chunks ready at once. It then waits to
+be resumed and, like the backend's, checks its stop event (stop_event by
+default) before each further chunk. The test resumes it once the engine is
+done with the chunk and stop_event has been cleared, as when the turn winds
+down; the stream must still see that it was stopped.
+"""
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+engine_module = pytest.importorskip("voice_dialogue.engine")
+
+from voice_dialogue.profiling import TurnProfiler
+from voice_dialogue.tracing import Tracer
+
+RATE = 22050
+CHUNKS = 40
+READY_CHUNKS = 2
+TEXT = "A sentence long enough to be revealed one character per chunk of the stream."
+
+
+class StandInStream:
+    """Remembers how many chunks it yielded and whether it has ended."""
+
+    def __init__(self, stop_event: threading.Event) -> None:
+        self.stop_event = stop_event
+        self.resume = threading.Event()
+        self.yielded = 0
+        self.ended = threading.Event()
+
+    def __call__(self, text: str, language: str = None, stop: threading.Event = None):
+        stop = stop or self.stop_event
+        try:
+            for n in range(CHUNKS):
+                if n >= READY_CHUNKS:
+                    self.resume.wait()
+                    if stop.is_set():
+                        return
+                self.yielded += 1
+                # One second of audio, one character at chars_per_second
+                yield torch.zeros(RATE)
+        finally:
+            self.ended.set()
+
+
+def speak(tmp_path, stop_on_first_words: bool) -> StandInStream:
+    stop_event = threading.Event()
+    stream = StandInStream(stop_event)
+    backend = SimpleNamespace(tracer=Tracer(), profiler=TurnProfiler(tmp_path), stop_event=stop_event,
+                              synthesize_stream=stream, tts_channel=None, tts_sample_rate=RATE,
+                              chars_per_second=1.0)
+    engine = engine_module.VoiceEngine(backend, play_audio=False)
+    if stop_on_first_words:
+        engine.subscribe(lambda event: stop_event.set() if isinstance(event, engine_module.PlaybackProgress) else None)
+    else:
+        stream.resume.set()
+    engine._speak_streaming(0, TEXT, TEXT, list(range(len(TEXT))), "en", [])
+    stop_event.clear()
+    stream.resume.set()
+    return stream
+
+
+def test_stream_is_played_to_its_end(tmp_path):
+    stream = speak(tmp_path, stop_on_first_words=False)
+    assert stream.ended.is_set() and stream.yielded == CHUNKS
+
+
+def test_stop_ends_the_stream_although_stop_event_is_cleared(tmp_path):
+    stream = speak(tmp_path, stop_on_first_words=True)
+    # Nothing is synthesized after the stop for nobody to hear, holding the TTS model meanwhile
+    assert stream.ended.wait(1.0)
+    assert stream.yielded == READY_CHUNKS
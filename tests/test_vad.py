@@ -0,0 +1,92 @@
+"""Barge-in detection on synthetic overlapping audio.
+
+A fake microphone on a simulated clock replays the echo of the assistant's
+reply, the user starting to talk USER_ONSET seconds into it, and room noise.
+"""
+import random
+import threading
+
+import pytest
+
+from synthetic_audio import CHUNK, ECHO_DELAY, NOISE_LEVEL, RATE, to_pcm, voice
+from voice_dialogue.vad import EchoReference, SpeechDetector, wait_for_speech
+
+DURATION = 6.0
+USER_ONSET = 3.0
+COUPLINGS = [0.3, 1.0, 2.0]
+# Seconds from the user's onset to the trigger; min_speech is 0.25 s
+DETECTION_BOUND = 0.6
+ASSISTANT = voice(DURATION, 120.0, 4.0, 0.05, seed=2)
+USER = voice(DURATION - USER_ONSET, 210.0, 5.0, 0.05, seed=3)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeMicrophone:
+    """Stands in for a PyAudio input stream; reading advances the simulated clock."""
+
+    def __init__(self, pcm: bytes, clock: FakeClock, stop: threading.Event) -> None:
+        self.pcm = pcm
+        self.clock = clock
+        self.stop = stop
+        self.position = 0
+
+    def read(self, chunk: int, exception_on_overflow: bool = True) -> bytes:
+        frame = self.pcm[2 * self.position:2 * (self.position + chunk)]
+        self.position += chunk
+        self.clock.now = self.position / RATE
+        if 2 * self.position >= len(self.pcm):
+            self.stop.set()
+        return frame.ljust(2 * chunk, b"\0")
+
+
+def listen(coupling: float, user_db: float = None, echo_gate: bool = True) -> tuple:
+    """Play the reply with the user db above its echo (None: silent) and listen for barge-in.
+
+    Returns (trigger time, start of the returned frames), or (None, None).
+    """
+    clock = FakeClock()
+    echo = EchoReference(clock)
+    echo.add(to_pcm(ASSISTANT), RATE)
+    user_gain = 0.0 if user_db is None else coupling * 10 ** (user_db / 20)
+    noise = random.Random(1)
+    delay = int(ECHO_DELAY * RATE)
+    onset = int(USER_ONSET * RATE)
+    mic = []
+    for n in range(len(ASSISTANT)):
+        sample = coupling * ASSISTANT[n - delay] if n >= delay else 0.0
+        if n >= onset:
+            sample += user_gain * USER[n - onset]
+        mic.append(sample + noise.gauss(0.0, NOISE_LEVEL))
+
+    stop = threading.Event()
+    microphone = FakeMicrophone(to_pcm(mic), clock, stop)
+    detector = SpeechDetector(CHUNK / RATE, echo if echo_gate else None)
+    frames = wait_for_speech(microphone, detector, CHUNK, stop)
+    if not frames:
+        return None, None
+    return clock.now, (microphone.position - len(frames) * CHUNK) / RATE
+
+
+@pytest.mark.parametrize("coupling", COUPLINGS)
+def test_echo_alone_does_not_trigger(coupling):
+    assert listen(coupling) == (None, None)
+
+
+@pytest.mark.parametrize("coupling", COUPLINGS)
+def test_user_over_the_echo_is_detected_with_its_onset(coupling):
+    triggered, captured_from = listen(coupling, user_db=6)
+    assert USER_ONSET <= triggered <= USER_ONSET + DETECTION_BOUND
+    # The pre-roll handed to the capture starts before the first syllable
+    assert captured_from <= USER_ONSET
+
+
+def test_echo_triggers_without_the_gate():
+    triggered, _ = listen(2.0, echo_gate=False)
+    assert triggered is not None and triggered < USER_ONSET
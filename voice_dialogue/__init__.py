@@ -0,0 +1 @@
+"""Shared code of the LM Studio Voice Dialogue language builds."""
@@ -0,0 +1,834 @@
+"""PyQt6 application of the voice dialogue, shared by all language builds.
+
+The language scripts only call main() with their default language and data
+folder; everything language specific is taken from voice_dialogue.profiles.
+"""
+import logging
+import os
+import sys
+from functools import partial
+from pathlib import Path
+
+from voice_dialogue.backend import VoiceAssistantBackend, load_settings, save_settings
+from voice_dialogue.chat_view import ChatView
+from voice_dialogue.engine import (
+    IDLE, RECORDING, SPEAKING, THINKING, ModelsSwapped, PlaybackProgress, StateChanged, TranscriptFinal,
+    VoiceEngine
+)
+from voice_dialogue.orchestrator import TurnOrchestrator
+from voice_dialogue.profiles import DEFAULT_LANGUAGE, PROFILES, get_profile
+from voice_dialogue.search_box import SearchBox
+from voice_dialogue.spellcheck import SpellCheckTextEdit, open_dictionary
+
+# Attempt to import QKeySequenceEdit from QtGui; if that fails, import it from QtWidgets
+try:
+    from PyQt6.QtGui import QKeySequenceEdit
+except ImportError:
+    from PyQt6.QtWidgets import QKeySequenceEdit
+
+from PyQt6.QtGui import (
+    QFont, QColor, QIcon,
+    QKeySequence, QShortcut
+)
+from PyQt6.QtWidgets import (
+    QApplication, QWidget, QHBoxLayout, QVBoxLayout,
+    QPushButton, QDialog,
+    QLabel, QSpinBox, QComboBox, QFormLayout, QDialogButtonBox,
+    QTextEdit, QColorDialog, QGroupBox, QGridLayout, QCheckBox
+)
+from PyQt6.QtCore import pyqtSignal, pyqtSlot
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+# Settings that take effect after a restart, with their defaults; model changes are applied at runtime
+RESTART_SETTINGS = {"tts_num_threads": 0, "tts_quantize_int8": False, "inference_process": False}
+
+
+# --- Settings Window ---
+class SettingsWindow(QDialog):
+    def __init__(self, parent=None, strings: dict = None, current_language: str = DEFAULT_LANGUAGE,
+                 current_auto_detect: bool = False, current_barge_in: bool = False, current_text_size: int = 14,
+                 current_tts: str = "tts_models/multilingual/multi-dataset/xtts_v2",
+                 current_whisper: str = "large-v3-turbo",
+                 current_summary_interval: int = 10,
+                 current_tts_threads: int = 0,
+                 current_tts_quantize: bool = False,
+                 current_inference_process: bool = False,
+                 current_profiling: str = "off",
+                 current_colors: dict = None,
+                 current_hotkeys: dict = None) -> None:
+        super().__init__(parent)
+        strings = strings or get_profile(current_language)["strings"]
+        self.setWindowTitle(strings["settings"])
+        self.setModal(True)
+        self.resize(750, 500)
+        self.setStyleSheet(f"font-size: {current_text_size}px;")
+        
+        main_layout = QVBoxLayout(self)
+        groups_layout = QHBoxLayout()
+        
+        general_group = QGroupBox(strings["general_group"])
+        general_layout = QFormLayout()
+        self.language_combo = QComboBox()
+        for code, profile in PROFILES.items():
+            self.language_combo.addItem(profile["name"], code)
+        self.language_combo.setCurrentIndex(max(0, self.language_combo.findData(current_language)))
+        general_layout.addRow(QLabel(strings["language"]), self.language_combo)
+
+        self.auto_detect_check = QCheckBox()
+        self.auto_detect_check.setChecked(current_auto_detect)
+        general_layout.addRow(QLabel(strings["auto_detect"]), self.auto_detect_check)
+
+        self.barge_in_check = QCheckBox()
+        self.barge_in_check.setChecked(current_barge_in)
+        general_layout.addRow(QLabel(strings["barge_in"]), self.barge_in_check)
+
+        self.text_size_spin = QSpinBox()
+        self.text_size_spin.setRange(10, 30)
+        self.text_size_spin.setValue(current_text_size)
+        general_layout.addRow(QLabel(strings["text_size"]), self.text_size_spin)
+
+        self.tts_combo = QComboBox()
+        self.tts_combo.addItems([
+            "tts_models/multilingual/multi-dataset/xtts_v2",
+            "tts_models/en/ljspeech/tacotron2-DDC"
+        ])
+        self.tts_combo.setCurrentText(current_tts)
+        general_layout.addRow(QLabel(strings["tts_model"]), self.tts_combo)
+
+        self.whisper_combo = QComboBox()
+        self.whisper_combo.addItems(["tiny", "base", "small", "medium", "large-v3-turbo"])
+        self.whisper_combo.setCurrentText(current_whisper)
+        general_layout.addRow(QLabel(strings["whisper_model"]), self.whisper_combo)
+
+        self.summary_spin = QSpinBox()
+        self.summary_spin.setRange(1, 1000)
+        self.summary_spin.setValue(current_summary_interval)
+        general_layout.addRow(QLabel(strings["summary_interval"]), self.summary_spin)
+
+        self.tts_threads_spin = QSpinBox()
+        self.tts_threads_spin.setRange(0, os.cpu_count() or 64)
+        self.tts_threads_spin.setSpecialValueText(strings["auto"])
+        self.tts_threads_spin.setValue(current_tts_threads)
+        general_layout.addRow(QLabel(strings["cpu_threads"]), self.tts_threads_spin)
+
+        self.tts_quantize_check = QCheckBox()
+        self.tts_quantize_check.setChecked(current_tts_quantize)
+        general_layout.addRow(QLabel(strings["int8"]), self.tts_quantize_check)
+
+        self.inference_process_check = QCheckBox()
+        self.inference_process_check.setChecked(current_inference_process)
+        general_layout.addRow(QLabel(strings["inference_process"]), self.inference_process_check)
+
+        self.profiling_combo = QComboBox()
+        for mode, label in strings["profiling_modes"].items():
+            self.profiling_combo.addItem(label, mode)
+        self.profiling_combo.setCurrentIndex(max(0, self.profiling_combo.findData(current_profiling)))
+        general_layout.addRow(QLabel(strings["profiling"]), self.profiling_combo)
+        general_group.setLayout(general_layout)
+        
+        colors_group = QGroupBox(strings["colors_group"])
+        colors_layout = QGridLayout()
+        self.colors = {}
+        defaults = {
+            "text_input_bg": "#2F2F2F",
+            "text_input_text": "#FFFFFF",
+            "chat_bg": "#2F2F2F",
+            "chat_text": "#FFFFFF",
+            "system_log_bg": "#1F1F1F",
+            "system_log_text": "#FFA500",
+            "button_bg": "#333333",
+            "button_text": "orange",
+            "button_hover_color": "#444444",
+            "panel_bg": "#3F3F3F",
+            "window_bg": "#2F2F2F",
+            "system_label_color": "#AAAAAA",
+            "system_content_color": "#FFFFFF",
+            "user_label_color": "#008080",
+            "user_content_color": "#ADD8E6",
+            "assistant_label_color": "#9B59B6",
+            "assistant_content_color": "#FFA500",
+            "scrollbar_handle_color": "#888888",
+            "scrollbar_track_color": "#444444"
+        }
+        if current_colors is None:
+            current_colors = defaults
+        for key, default in defaults.items():
+            self.colors[key] = current_colors.get(key, default)
+
+        self.color_buttons = {}
+        color_options = [(label, key) for key, label in strings["color_labels"].items()]
+        row = 0
+        for label_text, key in color_options:
+            lbl = QLabel(label_text + ":")
+            btn = QPushButton()
+            btn.setStyleSheet(f"background-color: {self.colors[key]};")
+            btn.setFixedWidth(80)
+            btn.clicked.connect(lambda _, k=key, b=btn: self.choose_color(k, b))
+            self.color_buttons[key] = btn
+            colors_layout.addWidget(lbl, row, 0)
+            colors_layout.addWidget(btn, row, 1)
+            row += 1
+        colors_group.setLayout(colors_layout)
+        
+        # --- New group for hotkeys ---
+        hotkeys_group = QGroupBox(strings["hotkeys_group"])
+        hotkeys_layout = QFormLayout()
+        self.hotkey_edits = {}
+        # Default function keys and their labels, including "send_text"
+        hotkey_options = list(strings["hotkey_labels"].items())
+        if current_hotkeys is None:
+            current_hotkeys = {
+                "record_audio": "F9",
+                "stop_recording": "F10",
+                "cancel_recording": "F11",
+                "record_voice_sample": "F12",
+                "stop_generation": "F8",
+                "send_text": "F7"
+            }
+        for key, label in hotkey_options:
+            lbl = QLabel(label)
+            key_edit = QKeySequenceEdit()
+            key_edit.setKeySequence(QKeySequence(current_hotkeys.get(key, "")))
+            self.hotkey_edits[key] = key_edit
+            hotkeys_layout.addRow(lbl, key_edit)
+        hotkeys_group.setLayout(hotkeys_layout)
+        
+        # Arrange groups in a horizontal layout
+        groups_layout.addWidget(general_group)
+        groups_layout.addWidget(colors_group)
+        groups_layout.addWidget(hotkeys_group)
+        main_layout.addLayout(groups_layout)
+        
+        self.choose_color_title = strings["choose_color"]
+        self.buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        self.buttons.accepted.connect(self.accept)
+        self.buttons.rejected.connect(self.reject)
+        main_layout.addWidget(self.buttons)
+
+    def choose_color(self, key: str, button: QPushButton) -> None:
+        color = QColorDialog.getColor(QColor(self.colors[key]), self, self.choose_color_title)
+        if color.isValid():
+            self.colors[key] = color.name()
+            button.setStyleSheet(f"background-color: {color.name()};")
+
+    def get_settings(self) -> dict:
+        # Collect hotkeys from QKeySequenceEdit
+        hotkeys = {}
+        for key, editor in self.hotkey_edits.items():
+            hotkeys[key] = editor.keySequence().toString()
+        return {
+            "language": self.language_combo.currentData(),
+            "auto_detect_language": self.auto_detect_check.isChecked(),
+            "barge_in": self.barge_in_check.isChecked(),
+            "text_size": self.text_size_spin.value(),
+            "tts_model": self.tts_combo.currentText(),
+            "whisper_model": self.whisper_combo.currentText(),
+            "summary_interval": self.summary_spin.value(),
+            "tts_num_threads": self.tts_threads_spin.value(),
+            "tts_quantize_int8": self.tts_quantize_check.isChecked(),
+            "inference_process": self.inference_process_check.isChecked(),
+            "profiling": self.profiling_combo.currentData(),
+            "colors": self.colors,
+            "hotkeys": hotkeys
+        }
+
+
+# --- Main Application Window ---
+class VoiceAssistantUI(QWidget):
+    # Engine events arrive on the orchestrator's threads and are delivered to the GUI thread through this signal
+    engineEvent = pyqtSignal(object)
+
+    def __init__(self, settings: dict, data_dir: Path) -> None:
+        super().__init__()
+        self.settings = settings
+        self.data_dir = data_dir
+        self.current_text_size = self.settings.get("text_size", 14)
+        self.backend = VoiceAssistantBackend(self.settings, data_dir)
+        self.engine = VoiceEngine(self.backend)
+        self.engine.subscribe(self.engineEvent.emit)
+        self.engineEvent.connect(self.on_engine_event)
+        self.orchestrator = TurnOrchestrator(self.engine)
+        self.strings = self.backend.profile["strings"]
+        self.setWindowIcon(QIcon(str(self._icon_path())))
+        self.shortcuts = {}  # Store hotkeys here
+        self.init_ui()
+        # History is prepared in the background and rendered page by page, without delaying the first paint;
+        # it comes from the archive, so search hits older than conversation_history.json can be shown
+        self.chat_edit.load_history(self.backend.archive.dialogue)
+        self.update_hotkeys()
+        self.update_system_message(self.strings["ready"])
+
+    def _icon_path(self) -> Path:
+        # Each build folder ships the icon of its own language only
+        names = [self.backend.profile["icon"]] + [profile["icon"] for profile in PROFILES.values()]
+        return next((self.data_dir / name for name in names if (self.data_dir / name).exists()), self.data_dir / names[0])
+
+    def _dictionary_factory(self):
+        return partial(open_dictionary, self.backend.profile["dictionary"])
+
+    def _chat_labels(self) -> dict:
+        return {"user": self.strings["user_label"], "assistant": self.strings["assistant_label"]}
+
+    def init_ui(self) -> None:
+        scrollbar_handle_color = self.settings["colors"].get("scrollbar_handle_color", "#888888")
+        scrollbar_track_color = self.settings["colors"].get("scrollbar_track_color", "#444444")
+        window_bg = self.settings["colors"].get("window_bg", "#2F2F2F")
+        self.setStyleSheet(f"background-color: {window_bg};")
+        self.setWindowTitle(self.strings["title"])
+        main_layout = QHBoxLayout(self)
+        main_layout.setContentsMargins(10, 10, 10, 10)
+        main_layout.setSpacing(10)
+
+        # Text input panel
+        self.input_panel = QWidget()
+        panel_bg = self.settings["colors"].get("panel_bg", "#3F3F3F")
+        self.input_panel.setStyleSheet(f"background-color: {panel_bg}; border-radius: 15px;")
+        input_layout = QVBoxLayout(self.input_panel)
+        input_layout.setContentsMargins(15, 15, 15, 15)
+        input_layout.setSpacing(10)
+
+        self.text_input = SpellCheckTextEdit(self._dictionary_factory())
+        text_input_bg = self.settings["colors"].get("text_input_bg", "#2F2F2F")
+        text_input_text = self.settings["colors"].get("text_input_text", "#FFFFFF")
+        self.text_input.setStyleSheet(f"""
+            QPlainTextEdit {{
+                background-color: {text_input_bg};
+                color: {text_input_text};
+                border-radius: 15px;
+                padding: 8px;
+                font-size: {self.current_text_size}px;
+                font-family: Arial, sans-serif;
+            }}
+            QPlainTextEdit QScrollBar:vertical {{
+                background: {scrollbar_track_color};
+                width: 10px;
+                margin: 0px;
+                border-radius: 5px;
+            }}
+            QPlainTextEdit QScrollBar::handle:vertical {{
+                background: {scrollbar_handle_color};
+                border-radius: 5px;
+                min-height: 20px;
+            }}
+            QPlainTextEdit QScrollBar::handle:vertical:hover {{
+                background: #aaaaaa;
+            }}
+            QPlainTextEdit QScrollBar::add-line:vertical,
+            QPlainTextEdit QScrollBar::sub-line:vertical {{
+                height: 0px;
+            }}
+            QPlainTextEdit QScrollBar::add-page:vertical,
+            QPlainTextEdit QScrollBar::sub-page:vertical {{
+                background: {scrollbar_track_color};
+                border-radius: 5px;
+            }}
+        """)
+        self.text_input.setPlaceholderText(self.strings["placeholder"])
+        input_layout.addWidget(self.text_input)
+
+        self.btn_send_text = QPushButton(self.strings["send"])
+        self.style_round_button(self.btn_send_text)
+        self.btn_send_text.clicked.connect(self.on_send_text)
+        input_layout.addWidget(self.btn_send_text)
+        self.input_panel.setFixedWidth(220)
+        main_layout.addWidget(self.input_panel)
+
+        # Chat panel
+        self.chat_panel = QWidget()
+        self.chat_panel.setStyleSheet(f"background-color: {panel_bg}; border-radius: 15px;")
+        chat_layout = QVBoxLayout(self.chat_panel)
+        chat_layout.setContentsMargins(15, 15, 15, 15)
+        chat_layout.setSpacing(10)
+
+        self.search_box = SearchBox(self.backend.archive.search, self._chat_labels(), self.strings)
+        self.search_box.setStyleSheet(self._search_box_style())
+        self.search_box.messageChosen.connect(self.show_search_hit)
+        chat_layout.addWidget(self.search_box, stretch=0)
+
+        self.chat_edit = ChatView(self._chat_labels())
+        self.chat_edit.set_colors(self.settings["colors"])
+        chat_bg = self.settings["colors"].get("chat_bg", "#2F2F2F")
+        chat_text = self.settings["colors"].get("chat_text", "#FFFFFF")
+        self.chat_edit.setStyleSheet(f"""
+            QTextEdit {{
+                background-color: {chat_bg};
+                border-radius: 15px;
+                padding: 8px;
+                color: {chat_text};
+                font-size: {self.current_text_size}px;
+                font-family: Arial, sans-serif;
+            }}
+            QTextEdit QScrollBar:vertical {{
+                background: {scrollbar_track_color};
+                width: 10px;
+                margin: 0px;
+                border-radius: 5px;
+            }}
+            QTextEdit QScrollBar::handle:vertical {{
+                background: {scrollbar_handle_color};
+                border-radius: 5px;
+                min-height: 20px;
+            }}
+            QTextEdit QScrollBar::handle:vertical:hover {{
+                background: #aaaaaa;
+            }}
+            QTextEdit QScrollBar::add-line:vertical,
+            QTextEdit QScrollBar::sub-line:vertical {{
+                height: 0px;
+            }}
+            QTextEdit QScrollBar::add-page:vertical,
+            QTextEdit QScrollBar::sub-page:vertical {{
+                background: {scrollbar_track_color};
+                border-radius: 5px;
+            }}
+        """)
+        chat_layout.addWidget(self.chat_edit, stretch=3)
+
+        self.system_log = QTextEdit()
+        self.system_log.setReadOnly(True)
+        system_log_bg = self.settings["colors"].get("system_log_bg", "#1F1F1F")
+        system_log_text = self.settings["colors"].get("system_log_text", "#FFA500")
+        self.system_log.setStyleSheet(f"""
+            QTextEdit {{
+                background-color: {system_log_bg};
+                border-radius: 15px;
+                padding: 8px;
+                color: {system_log_text};
+                font-size: {self.current_text_size}px;
+                font-family: Arial, sans-serif;
+            }}
+            QTextEdit::selection {{
+                background-color: #444444;
+                color: {system_log_text};
+            }}
+        """)
+        self.system_log.setFixedHeight(80)
+        chat_layout.addWidget(self.system_log, stretch=0)
+        main_layout.addWidget(self.chat_panel, stretch=1)
+
+        # Button panel
+        self.button_panel = QWidget()
+        self.button_panel.setStyleSheet(f"background-color: {panel_bg}; border-radius: 15px;")
+        btn_layout = QVBoxLayout(self.button_panel)
+        btn_layout.setContentsMargins(15, 15, 15, 15)
+        btn_layout.setSpacing(10)
+
+        self.btn_record = QPushButton(self.strings["record"])
+        self.style_round_button(self.btn_record)
+        self.btn_record.clicked.connect(self.on_record_audio)
+        btn_layout.addWidget(self.btn_record)
+
+        self.btn_stop_record = QPushButton(self.strings["stop_recording"])
+        self.style_round_button(self.btn_stop_record)
+        self.btn_stop_record.clicked.connect(self.on_stop_recording)
+        btn_layout.addWidget(self.btn_stop_record)
+
+        self.btn_cancel = QPushButton(self.strings["cancel_recording"])
+        self.style_round_button(self.btn_cancel)
+        self.btn_cancel.clicked.connect(self.on_cancel_recording)
+        btn_layout.addWidget(self.btn_cancel)
+
+        self.btn_voice = QPushButton(self.strings["voice_sample"])
+        self.style_round_button(self.btn_voice)
+        self.btn_voice.clicked.connect(self.on_record_voice_sample)
+        btn_layout.addWidget(self.btn_voice)
+
+        self.btn_stop_gen = QPushButton(self.strings["stop_generation"])
+        self.style_round_button(self.btn_stop_gen)
+        self.btn_stop_gen.clicked.connect(self.on_stop_generation)
+        btn_layout.addWidget(self.btn_stop_gen)
+
+        self.btn_settings = QPushButton(self.strings["settings"])
+        self.style_round_button(self.btn_settings)
+        self.btn_settings.clicked.connect(self.open_settings)
+        btn_layout.addWidget(self.btn_settings)
+
+        self.button_panel.setFixedWidth(220)
+        main_layout.addWidget(self.button_panel)
+
+        self.setLayout(main_layout)
+        self.resize(1000, 600)
+
+    def style_round_button(self, btn: QPushButton) -> None:
+        btn.setToolTip(btn.text())
+        button_bg = self.settings["colors"].get("button_bg", "#333333")
+        button_text = self.settings["colors"].get("button_text", "orange")
+        button_hover = self.settings["colors"].get("button_hover_color", "#444444")
+        btn.setStyleSheet(f"""
+            QPushButton {{
+                background-color: {button_bg};
+                color: {button_text};
+                border: 2px solid {button_bg};
+                border-radius: 15px;
+                padding: 8px;
+                font-size: {self.current_text_size}px;
+                font-family: Arial, sans-serif;
+            }}
+            QPushButton:hover {{
+                background-color: {button_hover};
+            }}
+        """)
+
+    def update_all_button_styles(self) -> None:
+        self.style_round_button(self.btn_send_text)
+        for btn in [self.btn_record, self.btn_stop_record, self.btn_cancel, self.btn_voice, self.btn_stop_gen, self.btn_settings]:
+            self.style_round_button(btn)
+
+    def retranslate_ui(self) -> None:
+        """Apply the strings of the current language profile to the window."""
+        self.strings = self.backend.profile["strings"]
+        self.setWindowTitle(self.strings["title"])
+        self.setWindowIcon(QIcon(str(self._icon_path())))
+        self.text_input.setPlaceholderText(self.strings["placeholder"])
+        for btn, key in [(self.btn_send_text, "send"), (self.btn_record, "record"),
+                         (self.btn_stop_record, "stop_recording"), (self.btn_cancel, "cancel_recording"),
+                         (self.btn_voice, "voice_sample"), (self.btn_stop_gen, "stop_generation"),
+                         (self.btn_settings, "settings")]:
+            btn.setText(self.strings[key])
+        # Tooltips repeat the button text
+        self.update_all_button_styles()
+        self.chat_edit.set_labels(self._chat_labels())
+        self.search_box.set_strings(self._chat_labels(), self.strings)
+
+    def apply_styles(self) -> None:
+        """Update styles for all widgets based on current settings."""
+        scrollbar_handle_color = self.settings["colors"].get("scrollbar_handle_color", "#888888")
+        scrollbar_track_color = self.settings["colors"].get("scrollbar_track_color", "#444444")
+        text_input_bg = self.settings["colors"].get("text_input_bg", "#2F2F2F")
+        text_input_text = self.settings["colors"].get("text_input_text", "#FFFFFF")
+        chat_bg = self.settings["colors"].get("chat_bg", "#2F2F2F")
+        chat_text = self.settings["colors"].get("chat_text", "#FFFFFF")
+        system_log_bg = self.settings["colors"].get("system_log_bg", "#1F1F1F")
+        system_log_text = self.settings["colors"].get("system_log_text", "#FFA500")
+        panel_bg = self.settings["colors"].get("panel_bg", "#3F3F3F")
+
+        # Update text input styles
+        self.text_input.setStyleSheet(f"""
+            QPlainTextEdit {{
+                background-color: {text_input_bg};
+                color: {text_input_text};
+                border-radius: 15px;
+                padding: 8px;
+                font-size: {self.current_text_size}px;
+                font-family: Arial, sans-serif;
+            }}
+            QPlainTextEdit QScrollBar:vertical {{
+                background: {scrollbar_track_color};
+                width: 10px;
+                margin: 0px;
+                border-radius: 5px;
+            }}
+            QPlainTextEdit QScrollBar::handle:vertical {{
+                background: {scrollbar_handle_color};
+                border-radius: 5px;
+                min-height: 20px;
+            }}
+            QPlainTextEdit QScrollBar::handle:vertical:hover {{
+                background: #aaaaaa;
+            }}
+            QPlainTextEdit QScrollBar::add-line:vertical,
+            QPlainTextEdit QScrollBar::sub-line:vertical {{
+                height: 0px;
+            }}
+            QPlainTextEdit QScrollBar::add-page:vertical,
+            QPlainTextEdit QScrollBar::sub-page:vertical {{
+                background: {scrollbar_track_color};
+                border-radius: 5px;
+            }}
+        """)
+        # Update chat area styles
+        self.chat_edit.setStyleSheet(f"""
+            QTextEdit {{
+                background-color: {chat_bg};
+                border-radius: 15px;
+                padding: 8px;
+                color: {chat_text};
+                font-size: {self.current_text_size}px;
+                font-family: Arial, sans-serif;
+            }}
+            QTextEdit QScrollBar:vertical {{
+                background: {scrollbar_track_color};
+                width: 10px;
+                margin: 0px;
+                border-radius: 5px;
+            }}
+            QTextEdit QScrollBar::handle:vertical {{
+                background: {scrollbar_handle_color};
+                border-radius: 5px;
+                min-height: 20px;
+            }}
+            QTextEdit QScrollBar::handle:vertical:hover {{
+                background: #aaaaaa;
+            }}
+            QTextEdit QScrollBar::add-line:vertical,
+            QTextEdit QScrollBar::sub-line:vertical {{
+                height: 0px;
+            }}
+            QTextEdit QScrollBar::add-page:vertical,
+            QTextEdit QScrollBar::sub-page:vertical {{
+                background: {scrollbar_track_color};
+                border-radius: 5px;
+            }}
+        """)
+        self.system_log.setStyleSheet(f"""
+            QTextEdit {{
+                background-color: {system_log_bg};
+                border-radius: 15px;
+                padding: 8px;
+                color: {system_log_text};
+                font-size: {self.current_text_size}px;
+                font-family: Arial, sans-serif;
+            }}
+            QTextEdit::selection {{
+                background-color: #444444;
+                color: {system_log_text};
+            }}
+        """)
+        self.input_panel.setStyleSheet(f"background-color: {panel_bg}; border-radius: 15px;")
+        self.chat_panel.setStyleSheet(f"background-color: {panel_bg}; border-radius: 15px;")
+        self.button_panel.setStyleSheet(f"background-color: {panel_bg}; border-radius: 15px;")
+        self.search_box.setStyleSheet(self._search_box_style())
+        self.chat_edit.set_colors(self.settings["colors"])
+        self.update_all_button_styles()
+
+    def _search_box_style(self) -> str:
+        text_input_bg = self.settings["colors"].get("text_input_bg", "#2F2F2F")
+        text_input_text = self.settings["colors"].get("text_input_text", "#FFFFFF")
+        return f"""
+            QLineEdit, QListWidget {{
+                background-color: {text_input_bg};
+                color: {text_input_text};
+                border-radius: 10px;
+                padding: 4px 8px;
+                font-size: {self.current_text_size}px;
+                font-family: Arial, sans-serif;
+            }}
+        """
+
+    def show_search_hit(self, message: dict, query: str) -> None:
+        """Jump to a message picked in the search results."""
+        index = self.chat_edit.find_message(message["id"], message["role"], message["content"])
+        if index < 0:
+            # The history is still being loaded into the chat panel
+            return
+        terms = query.split()
+        self.chat_edit.show_message(index, terms[0] if terms else "")
+
+    @pyqtSlot(str)
+    def append_user_message(self, text: str) -> None:
+        self.chat_edit.append_message("user", text)
+
+    def update_system_message(self, text: str) -> None:
+        system_label_color = self.settings["colors"].get("system_label_color", "#AAAAAA")
+        system_content_color = self.settings["colors"].get("system_content_color", "#FFFFFF")
+        system_label = self.strings["system_label"]
+        html = f"<p><b style='color: {system_label_color};'>{system_label}</b> <span style='color: {system_content_color};'>{text}</span></p>"
+        readout = self.latency_readout()
+        if readout:
+            html += f"<p style='color: {system_label_color};'>{readout}</p>"
+        self.system_log.setHtml(html)
+        self.system_log.verticalScrollBar().setValue(self.system_log.verticalScrollBar().maximum())
+        if text == self.strings["ready"]:
+            self.backend._play_sound("system_ready")
+
+    def latency_readout(self) -> str:
+        """p50/p95 of the stage latencies over the recent turns, e.g. for the system log panel."""
+        stats = self.backend.tracer.stats()
+        labels = self.strings["latency_labels"]
+        parts = [f"{label} {stats[metric][0]:.2f}/{stats[metric][1]:.2f} s"
+                 for metric, label in labels.items() if metric in stats]
+        if not parts:
+            return ""
+        turns = max(count for _, _, count in stats.values())
+        return f"{self.strings['latency']} ({turns}): " + ", ".join(parts)
+
+    def export_traces(self) -> None:
+        if self.settings.get("trace_export", False):
+            try:
+                self.backend.tracer.export_jsonl(self.data_dir / "traces.jsonl")
+                self.backend.tracer.export_chrome(self.data_dir / "traces.chrome.json")
+                logging.info("Latency traces exported")
+            except Exception:
+                logging.exception("Error exporting latency traces:")
+
+    def set_input_enabled(self, enabled: bool) -> None:
+        self.text_input.setEnabled(enabled)
+        self.btn_record.setEnabled(enabled)
+        self.btn_send_text.setEnabled(enabled)
+
+    @pyqtSlot(object)
+    def on_engine_event(self, event) -> None:
+        if isinstance(event, PlaybackProgress):
+            self.chat_edit.append_text(event.text)
+        elif isinstance(event, TranscriptFinal):
+            self.append_user_message(event.text)
+        elif isinstance(event, StateChanged):
+            self.on_engine_state(event.state)
+        elif isinstance(event, ModelsSwapped):
+            if event.error:
+                self.update_system_message(self.strings["models_swap_failed"].format(error=event.error))
+                return
+            message = self.strings["models_swapped"].format(models=", ".join(event.models))
+            if event.peak_rss_mb is not None:
+                message += " " + self.strings["models_peak_memory"].format(rss=event.peak_rss_mb)
+            self.update_system_message(message)
+
+    def on_engine_state(self, state: str) -> None:
+        if state == SPEAKING:
+            self.chat_edit.begin_message("assistant")
+            self.update_system_message(self.strings["synthesizing"])
+            return
+        if self.chat_edit.streaming:
+            # The reply is over, or the user interrupted it by talking (barge-in)
+            self.chat_edit.end_message()
+            self.update_system_message(self.strings["ready"] if state == IDLE else self.strings["recording"])
+        self.set_input_enabled(state == IDLE)
+
+    def on_send_text(self) -> None:
+        if self.engine.busy:
+            self.update_system_message(self.strings["wait_synthesis"])
+            return
+        user_text = self.text_input.toPlainText().strip()
+        if not user_text:
+            return
+        self.set_input_enabled(False)
+        self.backend._play_sound("input")
+        self.append_user_message(user_text)
+        self.text_input.clear()
+        self.orchestrator.text_turn(user_text)
+
+    def on_record_audio(self) -> None:
+        if self.engine.state == RECORDING:
+            self.update_system_message(self.strings["wait_recording"])
+            return
+        if self.engine.busy:
+            self.update_system_message(self.strings["wait_synthesis"])
+            return
+        self.update_system_message(self.strings["recording"])
+        self.set_input_enabled(False)
+        self.orchestrator.voice_turn()
+
+    def on_stop_recording(self) -> None:
+        if self.engine.state in (THINKING, SPEAKING):
+            self.update_system_message(self.strings["wait_synthesis"])
+            return
+        self.update_system_message(self.strings["recording_stopped"])
+        self.engine.stop_recording()
+
+    def on_cancel_recording(self) -> None:
+        if self.engine.state in (THINKING, SPEAKING):
+            self.update_system_message(self.strings["wait_synthesis"])
+            return
+        self.update_system_message(self.strings["recording_canceled"])
+        self.engine.cancel_recording()
+
+    def on_record_voice_sample(self) -> None:
+        if self.engine.state == RECORDING:
+            self.update_system_message(self.strings["wait_recording"])
+            return
+        if self.engine.busy:
+            self.update_system_message(self.strings["wait_synthesis"])
+            return
+        self.update_system_message(self.strings["voice_sample_started"])
+        self.orchestrator.record_voice_sample()
+
+    def on_stop_generation(self) -> None:
+        if self.engine.state != SPEAKING:
+            self.update_system_message(self.strings["no_synthesis"])
+            return
+        self.update_system_message(self.strings["synthesis_stopped"])
+        self.engine.stop_speaking()
+
+    def open_settings(self) -> None:
+        settings_dialog = SettingsWindow(
+            self,
+            strings=self.strings,
+            current_language=self.backend.language,
+            current_auto_detect=self.settings.get("auto_detect_language", False),
+            current_barge_in=self.settings.get("barge_in", False),
+            current_text_size=self.current_text_size,
+            current_tts=self.settings.get("tts_model", "tts_models/multilingual/multi-dataset/xtts_v2"),
+            current_whisper=self.settings.get("whisper_model", "large-v3-turbo"),
+            current_summary_interval=self.settings.get("summary_interval", 10),
+            current_tts_threads=self.settings.get("tts_num_threads", 0),
+            current_tts_quantize=self.settings.get("tts_quantize_int8", False),
+            current_inference_process=self.settings.get("inference_process", False),
+            current_profiling=self.settings.get("profiling", "off"),
+            current_colors=self.settings.get("colors", {}),
+            current_hotkeys=self.settings.get("hotkeys", {})
+        )
+        if settings_dialog.exec() == QDialog.DialogCode.Accepted:
+            new_settings = settings_dialog.get_settings()
+            restart_needed = any(new_settings[key] != self.settings.get(key, default)
+                                 for key, default in RESTART_SETTINGS.items())
+            new_tts = new_settings["tts_model"]
+            if new_tts == self.settings.get("tts_model", "tts_models/multilingual/multi-dataset/xtts_v2"):
+                new_tts = None
+            new_whisper = new_settings["whisper_model"]
+            if new_whisper == self.settings.get("whisper_model", "large-v3-turbo"):
+                new_whisper = None
+            self.current_text_size = new_settings["text_size"]
+            self.settings.update(new_settings)
+            save_settings(self.settings, self.data_dir)
+            if new_settings["language"] != self.backend.language:
+                # Models are multilingual: only the profile, dictionary and strings change
+                self.backend.set_language(new_settings["language"])
+                self.text_input.set_dictionary_factory(self._dictionary_factory())
+                self.retranslate_ui()
+            QApplication.instance().setFont(QFont("Arial", self.current_text_size))
+            self.apply_styles()
+            self.update_hotkeys()
+            messages = []
+            if new_tts or new_whisper:
+                # Unchanged models are not reloaded
+                self.orchestrator.swap_models(new_tts, new_whisper)
+                messages.append(self.strings["models_loading"])
+            if restart_needed:
+                messages.append(self.strings["restart_needed"])
+            if messages:
+                self.update_system_message(" ".join(messages))
+
+    def update_hotkeys(self) -> None:
+        """Create/update hotkeys according to current settings."""
+        # Remove previously created hotkeys if they exist
+        for shortcut in self.shortcuts.values():
+            shortcut.disconnect()
+            shortcut.setParent(None)
+        self.shortcuts.clear()
+        hotkeys = self.settings.get("hotkeys", {})
+        if "record_audio" in hotkeys:
+            self.shortcuts["record_audio"] = QShortcut(QKeySequence(hotkeys["record_audio"]), self)
+            self.shortcuts["record_audio"].activated.connect(self.on_record_audio)
+        if "stop_recording" in hotkeys:
+            self.shortcuts["stop_recording"] = QShortcut(QKeySequence(hotkeys["stop_recording"]), self)
+            self.shortcuts["stop_recording"].activated.connect(self.on_stop_recording)
+        if "cancel_recording" in hotkeys:
+            self.shortcuts["cancel_recording"] = QShortcut(QKeySequence(hotkeys["cancel_recording"]), self)
+            self.shortcuts["cancel_recording"].activated.connect(self.on_cancel_recording)
+        if "record_voice_sample" in hotkeys:
+            self.shortcuts["record_voice_sample"] = QShortcut(QKeySequence(hotkeys["record_voice_sample"]), self)
+            self.shortcuts["record_voice_sample"].activated.connect(self.on_record_voice_sample)
+        if "stop_generation" in hotkeys:
+            self.shortcuts["stop_generation"] = QShortcut(QKeySequence(hotkeys["stop_generation"]), self)
+            self.shortcuts["stop_generation"].activated.connect(self.on_stop_generation)
+        if "send_text" in hotkeys:
+            self.shortcuts["send_text"] = QShortcut(QKeySequence(hotkeys["send_text"]), self)
+            self.shortcuts["send_text"].activated.connect(self.on_send_text)
+
+
+def main(language: str = DEFAULT_LANGUAGE, data_dir: Path = None) -> None:
+    """Start the application; data_dir holds settings, history, the voice sample and sounds."""
+    data_dir = data_dir or Path.cwd()
+    settings = load_settings(data_dir, language)
+    app = QApplication(sys.argv)
+    app.setFont(QFont("Arial", settings.get("text_size", 14)))
+    app.setStyleSheet("QToolTip { font-size: 12px; }")
+    ui = VoiceAssistantUI(settings, data_dir)
+    app.aboutToQuit.connect(ui.orchestrator.close)
+    app.aboutToQuit.connect(ui.export_traces)
+    app.aboutToQuit.connect(ui.backend.close)
+    ui.show()
+    sys.exit(app.exec())
+
@@ -0,0 +1,176 @@
+"""Permanent archive of the dialogue.
+
+conversation_history.json is the context sent to the LLM and is trimmed to
+200 KB, so older turns fall out of it. Every user message and reply is also
+appended to an SQLite database in the build folder (archive.sqlite3), which
+is never trimmed; the chat panel, search and long-term memory retrieval read
+it. On first use the messages still in conversation_history.json are imported.
+
+Search goes through an SQLite FTS5 index over the message text, kept up to date
+by a trigger on every insert (so on the thread that archives the message, never
+the GUI thread). Messages archived before the index existed are indexed once on
+a background thread. Without FTS5 in the SQLite build, search scans the table.
+"""
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    role TEXT NOT NULL,
+    language TEXT,
+    content TEXT NOT NULL
+)
+"""
+FTS_SCHEMA = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        content, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+    END""",
+)
+# Kept in PRAGMA user_version; an archive with a lower version is indexed again
+FTS_VERSION = 1
+BACKFILL_BATCH = 5000
+SNIPPET_TOKENS = 12
+COLUMNS = ("id", "created", "role", "language", "content")
+
+
+class MessageArchive:
+    """Append-only message store; thread-safe."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        self.full_text = True
+        with self._lock, self._connection:
+            # Readers do not wait for a write that is in progress
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(SCHEMA)
+            try:
+                for statement in FTS_SCHEMA:
+                    self._connection.execute(statement)
+            except sqlite3.OperationalError:
+                logging.info("SQLite has no FTS5; conversation search scans the archive")
+                self.full_text = False
+            version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+        if self.full_text and version < FTS_VERSION:
+            threading.Thread(target=self._backfill, name="archive-index", daemon=True).start()
+
+    def _backfill(self) -> None:
+        """Index the messages archived before the full-text index existed."""
+        start = time.perf_counter()
+        try:
+            with self._lock, self._connection:
+                self._connection.execute("INSERT INTO messages_fts (messages_fts) VALUES ('delete-all')")
+                # Later messages are indexed by the trigger
+                last_id = self._connection.execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0]
+            # In batches, so that archiving a new message does not wait for the whole archive
+            for low in range(0, last_id, BACKFILL_BATCH):
+                with self._lock, self._connection:
+                    self._connection.execute(
+                        "INSERT INTO messages_fts (rowid, content) SELECT id, content FROM messages "
+                        "WHERE id > ? AND id <= ?", (low, min(low + BACKFILL_BATCH, last_id)))
+            with self._lock, self._connection:
+                self._connection.execute(f"PRAGMA user_version = {FTS_VERSION}")
+            logging.info(f"Search index built over {last_id} archived messages in "
+                         f"{time.perf_counter() - start:.2f} s")
+        except sqlite3.ProgrammingError:
+            # The archive was closed meanwhile; the index is built again next time
+            pass
+        except Exception:
+            logging.exception("Error building the search index:")
+
+    def append(self, role: str, content: str, language: str = None) -> int:
+        """Archive a message; returns its id."""
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO messages (created, role, language, content) VALUES (?, ?, ?, ?)",
+                (time.time(), role, language, content))
+            return cursor.lastrowid
+
+    def import_messages(self, messages: list, language: str = None) -> int:
+        """Archive [role, content] pairs at once (history from before the archive); returns their number."""
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT INTO messages (created, role, language, content) VALUES (?, ?, ?, ?)",
+                [(now, role, language, content) for role, content in messages])
+        return len(messages)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def get(self, ids: list) -> list:
+        """Messages with the given ids as dicts, in the order of ids (unknown ids are left out)."""
+        ids = [int(message_id) for message_id in ids]
+        if not ids:
+            return []
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM messages WHERE id IN ({', '.join('?' * len(ids))})",
+                ids).fetchall()
+        by_id = {row[0]: dict(zip(COLUMNS, row)) for row in rows}
+        return [by_id[message_id] for message_id in ids if message_id in by_id]
+
+    def dialogue(self) -> list:
+        """All messages as [role, content, id], oldest first (for the chat panel)."""
+        with self._lock:
+            rows = self._connection.execute("SELECT role, content, id FROM messages ORDER BY id").fetchall()
+        return [list(row) for row in rows]
+
+    def search(self, query: str, limit: int = 50) -> list:
+        """Messages containing all words of query, newest first.
+
+        The last word is matched as a prefix unless the query ends with a space (search as you type).
+
+        Returns message dicts with a "snippet" of the text around the match.
+        """
+        terms = query.split()
+        if not terms:
+            return []
+        with self._lock:
+            if self.full_text:
+                # Newest first rather than by relevance: the index is read backwards and stops at limit,
+                # while ranking would score every match of a common word
+                # Every word quoted, so FTS5 operators typed by the user are taken literally
+                match = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+                if not query[-1].isspace():
+                    match += "*"
+                try:
+                    rows = self._connection.execute(
+                        f"SELECT {', '.join('m.' + column for column in COLUMNS)}, "
+                        f"snippet(messages_fts, 0, '', '', '…', {SNIPPET_TOKENS}) "
+                        "FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+                        "WHERE messages_fts MATCH ? ORDER BY messages_fts.rowid DESC LIMIT ?",
+                        (match, limit)).fetchall()
+                except sqlite3.OperationalError:
+                    # A query of nothing but separators
+                    return []
+            else:
+                patterns = ["%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                            for term in terms]
+                rows = self._connection.execute(
+                    f"SELECT {', '.join(COLUMNS)}, substr(content, 1, 120) FROM messages "
+                    f"WHERE {' AND '.join(['content LIKE ? ESCAPE ?'] * len(terms))} ORDER BY id DESC LIMIT ?",
+                    [value for pattern in patterns for value in (pattern, "\\")] + [limit]).fetchall()
+        return [dict(zip(COLUMNS + ("snippet",), row)) for row in rows]
+
+    def after(self, message_id: int, limit: int = 1000) -> list:
+        """Up to limit messages with ids above message_id, oldest first."""
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM messages WHERE id > ? ORDER BY id LIMIT ?",
+                (message_id, limit)).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
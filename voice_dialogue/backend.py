@@ -0,0 +1,693 @@
+"""Voice assistant backend: settings, conversation state, ASR, LLM and TTS.
+
+Language specifics come from voice_dialogue.profiles; the Whisper and XTTS models
+are multilingual and loaded once, whatever the selected language, in this
+process or in an inference worker process (voice_dialogue.inference).
+"""
+import os
+os.environ["TTS_NO_CHECKS"] = "1"
+os.environ["DISABLE_UPDATE_CHECKS"] = "1"
+os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+import json
+import logging
+import tempfile
+import threading
+import time
+import wave
+from contextlib import suppress
+from pathlib import Path
+
+import pyaudio
+import pygame
+import openai
+import torch
+
+from voice_dialogue.archive import MessageArchive
+from voice_dialogue.inference import InferenceClient, ModelHost
+from voice_dialogue.memory import DEFAULT_EMBEDDING_MODEL, LongTermMemory, format_recalled
+from voice_dialogue.profiles import DEFAULT_LANGUAGE, PROFILES, get_profile, profile_for_asr_language
+from voice_dialogue.profiling import TurnProfiler
+from voice_dialogue.synthesis_pool import SynthesisPool
+from voice_dialogue.tracing import Tracer
+from voice_dialogue.vad import EchoReference, SpeechDetector, wait_for_speech
+
+SETTINGS_FILE_NAME = "settings.json"
+# Number of mixer channels; the TTS speech plays on this one
+MIXER_CHANNELS = 8
+TTS_CHANNEL = 1
+# Summary requests of every language are hidden from the chat panel
+SUMMARY_PROMPTS = frozenset(profile["summary_prompt"] for profile in PROFILES.values())
+
+
+def load_settings(data_dir: Path, language: str = DEFAULT_LANGUAGE) -> dict:
+    """Load settings from data_dir or return default settings for the given language."""
+    settings_file = data_dir / SETTINGS_FILE_NAME
+    default_settings = {
+        "language": language,
+        # Pick the reply language from Whisper's detection instead of the selected language
+        "auto_detect_language": False,
+        "text_size": 14,
+        "tts_model": "tts_models/multilingual/multi-dataset/xtts_v2",
+        "whisper_model": "large-v3-turbo",
+        "summary_interval": 10,
+        # Recall relevant past messages from the whole archive into the prompt (embeds every message)
+        "long_term_memory": False,
+        "memory_embedding_model": DEFAULT_EMBEDDING_MODEL,
+        # Past messages recalled per reply, and the prompt tokens they may take
+        "memory_top_k": 4,
+        "memory_token_budget": 300,
+        # OpenAI-compatible endpoint of the LLM server (LM Studio by default)
+        "llm_api_base": "http://localhost:1234/v1",
+        # Run Whisper and XTTS in a worker process so inference does not hold up the GUI
+        "inference_process": False,
+        # Shared memory for streamed audio coming back from the worker
+        "inference_audio_buffer_mb": 16,
+        # Offload a model that has not been used for this long (0 = never): "unload" it, keep it
+        # at "half" precision, or move it to the "cpu" from the GPU; it is reloaded ahead of use
+        "model_idle_offload_seconds": 0,
+        "model_offload_mode": "unload",
+        # Memory the resident models may take (0 = no limit); idle models are offloaded to stay below
+        "model_memory_budget_mb": 0,
+        # Convert the model checkpoints once into memory-mapped files (default folder:
+        # ~/.cache/voice_dialogue/weights), so later starts are faster and share the pages
+        "weight_cache": True,
+        "weight_cache_dir": "",
+        # Number of CPU threads for torch (0 = torch default)
+        "tts_num_threads": 0,
+        # CPU only: synthesize the upcoming sentences of a reply in a pool of worker processes,
+        # several at a time, each with a share of the cores (0 workers = planned from the core count)
+        "parallel_synthesis": False,
+        "parallel_synthesis_workers": 0,
+        # Seconds to wait for a pooled sentence before synthesizing it without the pool
+        "parallel_synthesis_timeout": 60,
+        # Dynamic int8 quantization of the XTTS GPT decoder (CPU only)
+        "tts_quantize_int8": False,
+        # Stream XTTS audio chunks to the mixer while the sentence is still being synthesized
+        "tts_streaming": True,
+        "tts_stream_chunk_size": 20,
+        # Output rate of the mixer (0 = the TTS model's rate, so speech is played without resampling)
+        "mixer_frequency": 0,
+        # Mixer buffer in samples: smaller starts playback sooner, too small crackles
+        "mixer_buffer": 512,
+        # Crossfade length between streamed chunks, in samples at the TTS output rate
+        "tts_crossfade_samples": 1024,
+        # Cost model for grouping sentences into synthesis calls (see segment_text);
+        # the maximum segment length defaults to the value of the language profile
+        "tts_call_overhead_chars": 80,
+        "tts_quadratic_chars": 400,
+        # Listen to the microphone during replies and stop speaking when the user starts talking
+        "barge_in": False,
+        # Seconds of silence that end an utterance captured by barge-in
+        "barge_in_end_silence": 0.8,
+        # How much louder than the expected echo of the reply the user has to be
+        "barge_in_echo_margin": 2.0,
+        # Number of turns kept for the latency readout; with trace_export they are
+        # written to traces.jsonl and traces.chrome.json in the build folder on exit
+        "trace_capacity": 200,
+        "trace_export": False,
+        # Profile every turn into profiles/ in the build folder: "off", "cprofile" or "torch"
+        # (cProfile plus torch.profiler for model calls); the oldest profiles are deleted above profile_max_mb
+        "profiling": "off",
+        "profile_max_mb": 200,
+        "colors": {
+            "text_input_bg": "#2F2F2F",
+            "text_input_text": "#FFFFFF",
+            "chat_bg": "#2F2F2F",
+            "chat_text": "#FFFFFF",
+            "system_log_bg": "#1F1F1F",
+            "system_log_text": "#FFA500",
+            "button_bg": "#333333",
+            "button_text": "orange",
+            "button_hover_color": "#444444",
+            "panel_bg": "#3F3F3F",
+            "window_bg": "#2F2F2F",
+            "system_label_color": "#AAAAAA",
+            "system_content_color": "#FFFFFF",
+            "user_label_color": "#008080",
+            "user_content_color": "#ADD8E6",
+            "assistant_label_color": "#9B59B6",
+            "assistant_content_color": "#FFA500",
+            "scrollbar_handle_color": "#888888",
+            "scrollbar_track_color": "#444444"
+        },
+        # Hotkey settings with default values, including "send_text"
+        "hotkeys": {
+            "record_audio": "F9",
+            "stop_recording": "F10",
+            "cancel_recording": "F11",
+            "record_voice_sample": "F12",
+            "stop_generation": "F8",
+            "send_text": "F7"
+        }
+    }
+    if settings_file.exists():
+        try:
+            with settings_file.open("r", encoding="utf-8") as f:
+                settings = json.load(f)
+            # Ensure all color keys are present
+            settings.setdefault("colors", {})
+            for key, val in default_settings["colors"].items():
+                settings["colors"].setdefault(key, val)
+            # Ensure hotkey settings are present
+            settings.setdefault("hotkeys", {})
+            for key, val in default_settings["hotkeys"].items():
+                settings["hotkeys"].setdefault(key, val)
+            settings.setdefault("language", language)
+            logging.info("Settings loaded successfully")
+            return settings
+        except Exception:
+            logging.exception("Error loading settings:")
+    return default_settings
+
+
+def save_settings(settings: dict, data_dir: Path) -> None:
+    """Save settings to data_dir."""
+    try:
+        with (data_dir / SETTINGS_FILE_NAME).open("w", encoding="utf-8") as f:
+            json.dump(settings, f, ensure_ascii=False, indent=2)
+        logging.info("Settings saved")
+    except Exception:
+        logging.exception("Error saving settings:")
+
+
+def dialogue_messages(history: list) -> list:
+    """Return [role, text] pairs of a conversation history without the hidden summary exchanges."""
+    messages = []
+    skip_reply = False
+    for message in history:
+        role, content = message.get("role"), message.get("content", "")
+        if role == "user" and content in SUMMARY_PROMPTS:
+            skip_reply = True
+            continue
+        # The reply to a summary request is long-term memory, not part of the dialogue
+        if skip_reply and role == "assistant":
+            skip_reply = False
+            continue
+        skip_reply = False
+        if role in ("user", "assistant"):
+            messages.append([role, content])
+    return messages
+
+
+def make_sound(samples: torch.Tensor, resampler=None) -> pygame.mixer.Sound:
+    """A Sound of float samples at the mixer rate (or brought to it by resampler), in the mixer's own format.
+
+    The raw buffer is taken as is, without the WAV parsing and conversion of Sound(file=...).
+    """
+    samples = samples.squeeze().float().cpu()
+    if resampler is not None:
+        samples = resampler(samples)
+    pcm = (samples.clamp(-1.0, 1.0) * 32767).to(torch.int16)
+    _, _, channels = pygame.mixer.get_init()
+    if channels > 1:
+        pcm = pcm.unsqueeze(-1).expand(-1, channels)
+    return pygame.mixer.Sound(buffer=pcm.contiguous().numpy().tobytes())
+
+
+class VoiceAssistantBackend:
+    SOUND_FILES = {
+        "system_ready": "system_ready.mp3",
+        "recording": "recording.mp3",
+        "stop_recording": "stop_recording.mp3",
+        "assistant_message": "assistant_message.mp3",
+        "stop_generation": "stop_generation.mp3",
+        "termination": "termination.mp3",
+        "input": "input.mp3"
+    }
+
+    def __init__(self, settings: dict, data_dir: Path, tts_factory=None) -> None:
+        self.settings = settings
+        # Settings, history, voice sample and sounds of a build live in its folder
+        self.data_dir = data_dir
+        self.history_file = data_dir / "conversation_history.json"
+        self.message_counter_file = data_dir / "message_counter.json"
+        self.speaker_wav = data_dir / "speaker.wav"
+        self.set_language(self.settings.get("language", DEFAULT_LANGUAGE))
+        self.conversation_history = []
+        # The history is read by the UI (display, summaries) while a turn appends to it
+        self.history_lock = threading.RLock()
+        self._load_history()
+        self.archive = MessageArchive(data_dir / "archive.sqlite3")
+        if not self.archive.count():
+            self.archive.import_messages(self.history_for_display(), self.language)
+        self.memory = None
+        if self.settings.get("long_term_memory", False):
+            try:
+                self.memory = LongTermMemory(self.archive, data_dir / "memory_index",
+                                             self.settings.get("memory_embedding_model", DEFAULT_EMBEDDING_MODEL))
+            except Exception:
+                logging.exception("Error loading long-term memory, continuing without it:")
+        self.stop_event = threading.Event()
+        self.tracer = Tracer(self.settings.get("trace_capacity", 200))
+        self.profiler = TurnProfiler(data_dir / "profiles", self.settings.get("profile_max_mb", 200),
+                                     self.settings.get("inference_process", False))
+        self.cancel_record_event = threading.Event()
+        self.stop_record_event = threading.Event()
+        self.summary_interval = self.settings.get("summary_interval", 10)
+        self.message_count = self._load_message_count()
+
+        self.audio = pyaudio.PyAudio()
+        self.audio_format = pyaudio.paInt16
+        self.channels = 1
+        self.rate = 22050
+        self.chunk = 1024
+        # What the speakers are playing, for the echo gate of barge-in detection
+        self.echo_reference = EchoReference()
+        # Speaker-to-microphone coupling learned by the last barge-in detector
+        self.echo_coupling = None
+
+        # The speech models, loaded here or in a worker process (see voice_dialogue.inference)
+        if self.settings.get("inference_process", False):
+            self.models = InferenceClient(self.settings, self.speaker_wav, tts_factory,
+                                          self.settings.get("inference_audio_buffer_mb", 16))
+        else:
+            self.models = ModelHost(self.settings, self.speaker_wav, tts_factory)
+        self.tts_sample_rate = self.models.sample_rate
+        self._init_mixer()
+        self._tts_factory = tts_factory
+        self.synthesis_pool = self._start_synthesis_pool()
+        # Running estimate of normalized characters per second of speech (for streamed text sync)
+        self.chars_per_second = 15.0
+
+        openai.api_base = self.settings.get("llm_api_base", "http://localhost:1234/v1")
+        openai.api_key = "not-needed"
+
+        # Warm up the TTS model off the UI thread so the first reply is not slowed down
+        # by lazy kernel initialization and allocator growth
+        self.warm_up_thread = threading.Thread(target=self._warm_up_tts, daemon=True)
+        self.warm_up_thread.start()
+
+    def set_language(self, language: str) -> None:
+        """Switch the language profile; the multilingual models stay loaded."""
+        self.language = language if language in PROFILES else DEFAULT_LANGUAGE
+        self.profile = get_profile(self.language)
+        # Language the next reply is spoken in; Whisper's detection may override it
+        self.reply_language = self.language
+
+    def synthesize_to_file(self, text: str, file_path: str, language: str = None) -> float:
+        """Synthesize text into a WAV file and return the synthesis time in seconds."""
+        start = time.perf_counter()
+        self.models.synthesize_to_file(text, file_path, get_profile(language or self.language)["tts_language"])
+        return time.perf_counter() - start
+
+    def streaming_enabled(self) -> bool:
+        return self.settings.get("tts_streaming", True) and self.models.streaming_supported
+
+    def _init_mixer(self) -> None:
+        """Open the mixer at the TTS output rate, so that synthesized speech needs no conversion.
+
+        Called again when a model swap changes the rate. Cue sounds are decoded and converted once here.
+        """
+        frequency = self.settings.get("mixer_frequency", 0) or self.tts_sample_rate
+        buffer = self.settings.get("mixer_buffer", 512)
+        if pygame.mixer.get_init():
+            pygame.mixer.quit()
+        # allowedchanges=0 keeps exactly this format; SDL converts to the device's in its audio callback
+        pygame.mixer.init(frequency=frequency, size=-16, channels=1, buffer=buffer, allowedchanges=0)
+        pygame.mixer.set_num_channels(MIXER_CHANNELS)
+        self.tts_channel = pygame.mixer.Channel(TTS_CHANNEL)
+        self.mixer_frequency = pygame.mixer.get_init()[0]
+        # Only with a fixed mixer_frequency: speech is resampled once per chunk, in one vectorized step
+        self._resampler = None
+        if self.mixer_frequency != self.tts_sample_rate:
+            import torchaudio
+            self._resampler = torchaudio.transforms.Resample(self.tts_sample_rate, self.mixer_frequency)
+        self.cue_sounds = {}
+        for sound_key, file_name in self.SOUND_FILES.items():
+            sound_path = self.data_dir / file_name
+            if sound_path.exists():
+                try:
+                    self.cue_sounds[sound_key] = pygame.mixer.Sound(str(sound_path))
+                except Exception:
+                    logging.exception(f"Error loading sound {sound_path}:")
+        logging.info(f"Audio output at {self.mixer_frequency} Hz, buffer of {buffer} samples "
+                     f"({buffer / self.mixer_frequency * 1000:.0f} ms)")
+
+    def samples_to_sound(self, samples: torch.Tensor) -> pygame.mixer.Sound:
+        return make_sound(samples, self._resampler)
+
+    def synthesize_stream(self, text: str, language: str = None, stop: threading.Event = None):
+        """Yield consecutive audio chunks (float sample tensors) of the text as XTTS produces them.
+
+        The stream ends early once stop (stop_event by default) is set.
+        """
+        tts_language = get_profile(language or self.language)["tts_language"]
+        yield from self.models.synthesize_stream(text, tts_language, stop or self.stop_event)
+
+    def _start_synthesis_pool(self):
+        """Start the synthesis pool if parallel_synthesis is on; None on a GPU or on failure."""
+        if not self.settings.get("parallel_synthesis", False):
+            return None
+        if torch.cuda.is_available():
+            logging.info("Parallel synthesis is for the CPU; one synthesis at a time on the GPU")
+            return None
+        try:
+            return SynthesisPool(self.settings, self.speaker_wav, self._tts_factory,
+                                 self.settings.get("parallel_synthesis_workers", 0))
+        except Exception:
+            logging.exception("Error starting the synthesis pool, continuing without it:")
+            return None
+
+    def _warm_up_tts(self) -> None:
+        temp_wav = None
+        warm_up_text = self.profile["warm_up_text"]
+        try:
+            start = time.perf_counter()
+            if self.streaming_enabled():
+                first_chunk = None
+                for _ in self.synthesize_stream(warm_up_text):
+                    first_chunk = first_chunk or time.perf_counter() - start
+                logging.info(f"TTS warm-up: first chunk in {first_chunk or 0:.2f} s, "
+                             f"total {time.perf_counter() - start:.2f} s")
+                return
+            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_wav:
+                temp_wav = tmp_wav.name
+            elapsed = self.synthesize_to_file(warm_up_text, temp_wav)
+            logging.info(f"TTS warm-up finished in {elapsed:.2f} s")
+        except Exception:
+            logging.exception("Error during TTS warm-up:")
+        finally:
+            if temp_wav is not None:
+                with suppress(Exception):
+                    os.remove(temp_wav)
+
+    def commit_model_swap(self) -> list:
+        """Put the models loaded by models.prepare_swap() in service; call between turns."""
+        swapped = self.models.commit_swap()
+        if self.models.sample_rate != self.tts_sample_rate:
+            self.tts_sample_rate = self.models.sample_rate
+            self._init_mixer()
+        if self.synthesis_pool is not None and self.settings.get("tts_model") in swapped:
+            # The workers load the new TTS model in the background; meanwhile sentences go one at a time
+            self.synthesis_pool.close()
+            self.synthesis_pool = self._start_synthesis_pool()
+        return swapped
+
+    def close(self) -> None:
+        """Release the speech models (stops the inference worker and the synthesis pool) and the archive."""
+        if self.synthesis_pool is not None:
+            self.synthesis_pool.close()
+        self.models.close()
+        if self.memory is not None:
+            self.memory.close()
+        self.archive.close()
+
+    def history_for_display(self) -> list:
+        """Return [role, text] pairs of the saved conversation without the hidden summary exchanges."""
+        with self.history_lock:
+            history = list(self.conversation_history)
+        return dialogue_messages(history)
+
+    def _load_history(self) -> None:
+        if self.history_file.exists():
+            try:
+                with self.history_file.open("r", encoding="utf-8") as f:
+                    self.conversation_history = json.load(f)
+                logging.info("Conversation history loaded")
+            except Exception:
+                logging.exception("Error loading conversation history:")
+                self.conversation_history = []
+        else:
+            self.conversation_history = []
+
+    def _save_history(self) -> None:
+        try:
+            with self.history_lock:
+                history_json = json.dumps(self.conversation_history, ensure_ascii=False, indent=2)
+                max_size = 200 * 1024
+                while len(history_json.encode('utf-8')) > max_size and self.conversation_history:
+                    self.conversation_history.pop(0)
+                    history_json = json.dumps(self.conversation_history, ensure_ascii=False, indent=2)
+                with self.history_file.open("w", encoding="utf-8") as f:
+                    f.write(history_json)
+            logging.info("Conversation history saved")
+        except Exception:
+            logging.exception("Error saving conversation history:")
+
+    def _load_message_count(self) -> int:
+        if self.message_counter_file.exists():
+            try:
+                with self.message_counter_file.open("r", encoding="utf-8") as f:
+                    data = json.load(f)
+                logging.info("Message counter loaded")
+                return data.get("message_count", 0)
+            except Exception:
+                logging.exception("Error loading message counter:")
+        return 0
+
+    def _save_message_count(self) -> None:
+        try:
+            with self.message_counter_file.open("w", encoding="utf-8") as f:
+                json.dump({"message_count": self.message_count}, f, ensure_ascii=False, indent=2)
+            logging.info("Message counter saved")
+        except Exception:
+            logging.exception("Error saving message counter:")
+
+    def _play_sound(self, sound_key: str) -> None:
+        sound = self.cue_sounds.get(sound_key)
+        if sound is None:
+            logging.warning(f"Sound file for key '{sound_key}' not found.")
+            return
+        try:
+            sound.play()
+        except Exception:
+            logging.exception(f"Error playing sound {sound_key}:")
+
+    def register_playback(self, sound: pygame.mixer.Sound, queued: bool = False) -> None:
+        """Tell the barge-in echo gate what the speakers are about to play."""
+        if self.settings.get("barge_in", False):
+            frequency, _, channels = pygame.mixer.get_init()
+            self.echo_reference.add(sound.get_raw(), frequency * channels, queued)
+
+    def _open_input_stream(self):
+        try:
+            return self.audio.open(
+                format=self.audio_format,
+                channels=self.channels,
+                rate=self.rate,
+                input=True,
+                frames_per_buffer=self.chunk
+            )
+        except Exception:
+            logging.exception("Error opening audio stream:")
+            return None
+
+    def listen_for_barge_in(self, stop: threading.Event):
+        """Monitor the microphone during a reply until stop is set.
+
+        Returns (stream, frames, detector) as soon as the user starts talking; pass
+        it to record_audio() to continue that capture without losing the onset.
+        """
+        stream = self._open_input_stream()
+        if stream is None:
+            return None
+        detector = SpeechDetector(
+            self.chunk / self.rate,
+            self.echo_reference,
+            echo_margin=self.settings.get("barge_in_echo_margin", 2.0),
+            coupling=self.echo_coupling
+        )
+        try:
+            frames = wait_for_speech(stream, detector, self.chunk, stop)
+        except Exception:
+            logging.exception("Error monitoring the microphone:")
+            frames = []
+        if detector.echo_duration > detector.calibration:
+            self.echo_coupling = detector.coupling
+        if not frames:
+            stream.stop_stream()
+            stream.close()
+            return None
+        logging.info("User started talking during the reply")
+        return stream, frames, detector
+
+    def record_audio(self, filename: str = "temp_audio.wav", max_duration: int = None, capture: tuple = None) -> str:
+        """Record to a WAV file until stopped, canceled or max_duration; returns the file name or "".
+
+        With a capture from listen_for_barge_in() the recording continues on its
+        stream and also ends after barge_in_end_silence seconds of silence.
+        """
+        if capture is None:
+            stream = self._open_input_stream()
+            if stream is None:
+                return ""
+            self._play_sound("recording")
+            frames = []
+            detector = None
+        else:
+            stream, frames, detector = capture
+            frames = list(frames)
+        end_silence = self.settings.get("barge_in_end_silence", 0.8)
+        self.cancel_record_event.clear()
+        self.stop_record_event.clear()
+        start_time = time.time()
+
+        try:
+            while (max_duration is None) or (time.time() - start_time < max_duration):
+                try:
+                    data = stream.read(self.chunk, exception_on_overflow=False)
+                except Exception:
+                    logging.exception("Error reading audio:")
+                    break
+                frames.append(data)
+                if detector is not None:
+                    detector.feed(data)
+                    if detector.silence_duration >= end_silence:
+                        break
+                if self.cancel_record_event.is_set():
+                    self._play_sound("stop_generation")
+                    break
+                if self.stop_record_event.is_set():
+                    self._play_sound("stop_recording")
+                    break
+        finally:
+            stream.stop_stream()
+            stream.close()
+
+        if self.cancel_record_event.is_set():
+            return ""
+        try:
+            with wave.open(filename, 'wb') as wf:
+                wf.setnchannels(self.channels)
+                wf.setsampwidth(self.audio.get_sample_size(self.audio_format))
+                wf.setframerate(self.rate)
+                wf.writeframes(b''.join(frames))
+            return filename
+        except Exception:
+            logging.exception("Error writing audio file:")
+            return ""
+
+    def record_voice_sample(self) -> None:
+        audio_file = self.record_audio(str(self.speaker_wav))
+        if audio_file:
+            logging.info("Voice sample updated")
+        else:
+            logging.info("Voice sample recording canceled")
+
+    def transcribe_audio(self, filename: str, on_segment=None) -> str:
+        """Transcribe a WAV file; on_segment(text) is called for every recognized segment."""
+        auto_detect = self.settings.get("auto_detect_language", False)
+        try:
+            result = self.models.transcribe(filename, None if auto_detect else self.profile["asr_language"])
+            if auto_detect:
+                # Reply in the detected language when a profile exists for it
+                detected = result.get("language")
+                self.reply_language = profile_for_asr_language(detected) or self.language
+                logging.info(f"Detected speech language: {detected}")
+            else:
+                self.reply_language = self.language
+            if on_segment is not None:
+                for segment_text in result["segments"]:
+                    on_segment(segment_text)
+            return result["text"]
+        except Exception:
+            logging.exception("Error during transcription:")
+            return ""
+
+    def generate_reply(self, user_message: str, on_token=None) -> str:
+        """Ask the LLM for a reply; with on_token the reply is streamed and on_token(text) gets every delta."""
+        with self.history_lock:
+            self.conversation_history.append({"role": "user", "content": user_message})
+            messages = list(self.conversation_history)
+        self.message_count += 1
+        self._save_message_count()
+        self._save_history()
+        message_id = self.archive.append("user", user_message, self.reply_language)
+        if self.memory is not None:
+            messages = self._with_recalled(messages, user_message)
+            self.memory.add(message_id, user_message)
+        self.tracer.mark("llm_request")
+        try:
+            if on_token is None:
+                response = openai.ChatCompletion.create(
+                    model="local-model",
+                    messages=messages
+                )
+                reply = response.choices[0].message.content.strip() if response.choices else ""
+            else:
+                reply = self._stream_reply(messages, on_token)
+            reply = reply or self.profile["strings"]["empty_reply"]
+        except Exception:
+            logging.exception("Error generating reply:")
+            reply = self.profile["strings"]["reply_error"]
+        self.tracer.mark("llm_first_token")
+        self.tracer.mark("llm_last_token")
+        with self.history_lock:
+            self.conversation_history.append({"role": "assistant", "content": reply})
+        self._save_history()
+        if reply not in (self.profile["strings"]["empty_reply"], self.profile["strings"]["reply_error"]):
+            message_id = self.archive.append("assistant", reply, self.reply_language)
+            if self.memory is not None:
+                self.memory.add(message_id, reply)
+
+        if self.message_count >= self.summary_interval:
+            self.generate_summary()
+            self.message_count = 0
+            self._save_message_count()
+        return reply
+
+    def _with_recalled(self, messages: list, user_message: str) -> list:
+        """messages with the relevant past messages that fell out of the history put in front."""
+        self.tracer.mark("recall_start")
+        try:
+            recalled = self.memory.recall(user_message, {message["content"] for message in messages},
+                                          self.settings.get("memory_top_k", 4),
+                                          self.settings.get("memory_token_budget", 300))
+        except Exception:
+            logging.exception("Error recalling past messages:")
+            recalled = []
+        self.tracer.mark("recall_end")
+        if not recalled:
+            return messages
+        recalled_text = format_recalled(recalled, self.profile["strings"])
+        return [{"role": "system", "content": f"{self.profile['memory_prompt']}\n{recalled_text}"}] + messages
+
+    def _stream_reply(self, messages: list, on_token) -> str:
+        tokens = []
+        for chunk in openai.ChatCompletion.create(
+            model="local-model",
+            messages=messages,
+            stream=True
+        ):
+            if self.stop_event.is_set():
+                # Speech was stopped; keep what was generated so far
+                break
+            if not chunk.choices:
+                continue
+            token = chunk.choices[0].delta.get("content")
+            if token:
+                self.tracer.mark("llm_first_token")
+                tokens.append(token)
+                on_token(token)
+        return "".join(tokens).strip()
+
+    def generate_summary(self) -> None:
+        self.tracer.mark("summary_start")
+        with self.history_lock:
+            self.conversation_history.append({"role": "user", "content": self.profile["summary_prompt"]})
+            messages = list(self.conversation_history)
+        self._save_history()
+        try:
+            response = openai.ChatCompletion.create(
+                model="local-model",
+                messages=messages
+            )
+            summary = response.choices[0].message.content.strip() if response.choices else ""
+            if summary:
+                with self.history_lock:
+                    self.conversation_history.append({"role": "assistant", "content": summary})
+                self._save_history()
+                logging.info("Summary generated successfully")
+        except Exception:
+            logging.exception("Error generating summary:")
+        self.tracer.mark("summary_end")
+
+    def stop_generation(self) -> None:
+        self.stop_event.set()
+        self._play_sound("stop_generation")
+
+    def cancel_recording(self) -> None:
+        self.cancel_record_event.set()
+
+    def mouse_stop_recording(self) -> None:
+        self.stop_record_event.set()
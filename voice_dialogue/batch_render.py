@@ -0,0 +1,289 @@
+"""Offline rendering of the assistant's replies in a conversation to an audio file.
+
+Runs headless (no mixer, no audio device): the replies of conversation_history.json
+are cut into sentence groups and normalized as for live speech, synthesized by a
+SynthesisPool (voice_dialogue.synthesis_pool), several sentences at a time, with
+the speaker latents of the build's speaker.wav computed once per worker, and
+joined into one file per conversation with a pause between replies. The result
+is loudness-normalized and written as WAV or Opus (through ffmpeg).
+
+The audio of every reply is kept under parts/ next to the output, keyed by its
+text, the model, the language and the voice sample, so an interrupted run
+resumes with the first reply not yet rendered, and rendering a conversation
+again after it grew only synthesizes the new replies. A conversation whose
+output is up to date is skipped.
+
+Inputs are build folders or conversation_history.json files; the settings and
+speaker.wav come from the folder of each input, or from --data-dir:
+
+    python -m voice_dialogue.batch_render LM_Studio_Voice_Dialogue_EN --output-dir rendered
+    python -m voice_dialogue.batch_render archive/*.json --data-dir LM_Studio_Voice_Dialogue_RU --format opus
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+import wave
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from voice_dialogue.backend import dialogue_messages, load_settings
+from voice_dialogue.normalization import normalize
+from voice_dialogue.profiles import get_profile
+from voice_dialogue.segmentation import segment_text
+from voice_dialogue.synthesis_pool import SynthesisPool
+
+HISTORY_FILE_NAME = "conversation_history.json"
+# Peak level the loudness normalization may not exceed, in dBFS
+PEAK_DBFS = -1.0
+
+
+def find_conversations(inputs: list) -> list:
+    """conversation_history.json paths of the inputs (build folders or history files)."""
+    paths = []
+    for path in map(Path, inputs):
+        if path.is_dir():
+            path = path / HISTORY_FILE_NAME
+        if not path.is_file():
+            logging.warning(f"No conversation history at {path}, skipped")
+            continue
+        paths.append(path.resolve())
+    return paths
+
+
+def conversation_name(history_file: Path) -> str:
+    return history_file.parent.name if history_file.name == HISTORY_FILE_NAME else history_file.stem
+
+
+def reply_segments(text: str, profile: dict, settings: dict) -> list:
+    """The normalized sentence groups of a reply, the same ones the engine would speak."""
+    segments = segment_text(
+        text,
+        profile["abbreviations"],
+        max_chars=settings.get("tts_segment_max_chars", profile["segment_max_chars"]),
+        call_overhead=settings.get("tts_call_overhead_chars", 80),
+        quadratic_chars=settings.get("tts_quadratic_chars", 400)
+    )
+    parts = [normalize(text[start:end], profile["normalization"])[0] for start, end, speakable in segments if speakable]
+    return [part for part in parts if part.strip()]
+
+
+def normalize_loudness(replies: list, target_dbfs: float) -> float:
+    """Gain that brings the RMS level of the replies to target_dbfs, with peaks kept below PEAK_DBFS."""
+    samples = torch.cat(replies)
+    rms = samples.pow(2).mean().sqrt().item()
+    if not rms:
+        return 1.0
+    gain = 10 ** (target_dbfs / 20) / rms
+    peak = samples.abs().max().item() * gain
+    limit = 10 ** (PEAK_DBFS / 20)
+    return gain * limit / peak if peak > limit else gain
+
+
+def write_audio(path: Path, samples: torch.Tensor, sample_rate: int, bitrate: str) -> None:
+    """Write 16-bit mono WAV, or Opus through ffmpeg; the file appears only when complete."""
+    pcm = (samples.clamp(-1.0, 1.0) * 32767).to(torch.int16).numpy().tobytes()
+    partial = path.with_name(f"{path.stem}.partial{path.suffix}")
+    if path.suffix == ".wav":
+        with wave.open(str(partial), "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(sample_rate)
+            wf.writeframes(pcm)
+    else:
+        subprocess.run(["ffmpeg", "-v", "error", "-y", "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "-",
+                        "-c:a", "libopus", "-b:a", bitrate, str(partial)], input=pcm, check=True)
+    os.replace(partial, path)
+
+
+class ConversationRenderer:
+    """Renders the conversations of one build folder with one synthesis pool."""
+
+    def __init__(self, settings: dict, speaker_wav: Path, output_dir: Path, audio_format: str = "wav",
+                 workers: int = 0, pause: float = 0.8, target_dbfs: float = -20.0, bitrate: str = "32k") -> None:
+        self.settings = settings
+        self.speaker_wav = speaker_wav
+        self.output_dir = output_dir
+        self.audio_format = audio_format
+        self.pause = pause
+        self.target_dbfs = target_dbfs
+        self.bitrate = bitrate
+        self.profile = get_profile(settings.get("language"))
+        self.sentence_timeout = settings.get("parallel_synthesis_timeout", 60)
+        # One XTTS model per GPU is the sensible default there; on the CPU the pool plans from the cores
+        self.pool = SynthesisPool(settings, speaker_wav, workers=workers or (1 if torch.cuda.is_available() else 0))
+        self.pool.wait_started()
+        if not self.pool.ready:
+            raise RuntimeError("No synthesis worker could load the TTS model")
+        speaker = speaker_wav.stat()
+        self._voice = [settings.get("tts_model"), self.profile["tts_language"], speaker.st_size, speaker.st_mtime]
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def _reply_key(self, text: str) -> str:
+        return hashlib.sha1(json.dumps(self._voice + [text], ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+    def render(self, history_file: Path) -> dict:
+        """Render one conversation; returns its report (audio and synthesis seconds, real-time factor)."""
+        name = conversation_name(history_file)
+        with history_file.open(encoding="utf-8") as f:
+            history = json.load(f)
+        skipped = {self.profile["strings"]["empty_reply"], self.profile["strings"]["reply_error"]}
+        replies = [text for role, text in dialogue_messages(history) if role == "assistant" and text not in skipped]
+        keys = [self._reply_key(text) for text in replies]
+        output = self.output_dir / f"{name}.{self.audio_format}"
+        report_file = self.output_dir / f"{name}.json"
+        settings_key = [keys, self.pause, self.target_dbfs, self.bitrate]
+        conversation_key = hashlib.sha1(json.dumps(settings_key).encode("utf-8")).hexdigest()
+        if output.exists() and report_file.exists():
+            report = json.loads(report_file.read_text(encoding="utf-8"))
+            if report.get("key") == conversation_key:
+                return dict(report, skipped=True)
+
+        parts_dir = self.output_dir / "parts" / name
+        parts_dir.mkdir(parents=True, exist_ok=True)
+        missing = [(key, text) for key, text in zip(keys, replies) if not (parts_dir / f"{key}.f32").exists()]
+        start = time.perf_counter()
+        synthesized = self._synthesize(missing, parts_dir, name)
+        synthesis_seconds = time.perf_counter() - start
+
+        audio = [torch.from_numpy(np.fromfile(parts_dir / f"{key}.f32", dtype=np.float32)) for key in keys]
+        audio = [samples for samples in audio if samples.numel()]
+        if not audio:
+            logging.warning(f"{name}: no assistant replies to render")
+            return {"conversation": name, "replies": 0, "audio_seconds": 0.0}
+        gain = normalize_loudness(audio, self.target_dbfs)
+        silence = torch.zeros(int(self.pause * self.pool.sample_rate))
+        joined = [piece for samples in audio for piece in (samples * gain, silence)][:-1]
+        write_audio(output, torch.cat(joined), self.pool.sample_rate, self.bitrate)
+        # Parts of replies that are no longer in the conversation
+        for part in parts_dir.glob("*.f32"):
+            if part.stem not in keys:
+                part.unlink()
+
+        report = {
+            "conversation": name,
+            "source": str(history_file),
+            "output": str(output),
+            "replies": len(replies),
+            "synthesized_replies": len(missing),
+            "audio_seconds": round(sum(len(samples) for samples in audio) / self.pool.sample_rate, 2),
+            "synthesized_audio_seconds": round(synthesized, 2),
+            "synthesis_seconds": round(synthesis_seconds, 2),
+            "real_time_factor": round(synthesis_seconds / synthesized, 3) if synthesized else None,
+            "key": conversation_key,
+        }
+        report_file.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        return report
+
+    def _synthesize(self, replies: list, parts_dir: Path, name: str) -> float:
+        """Synthesize (key, text) replies into parts_dir; returns the seconds of audio produced.
+
+        The sentences of all replies are queued on the pool a window at a time, so
+        the workers stay busy across reply boundaries without holding the audio of
+        the whole conversation in memory.
+        """
+        sentences = iter([(index, part, segment_index == len(parts) - 1)
+                          for index, (_, text) in enumerate(replies)
+                          for parts in [reply_segments(text, self.profile, self.settings) or [""]]
+                          for segment_index, part in enumerate(parts)])
+        tts_language = self.profile["tts_language"]
+        window = 2 * self.pool.workers
+        pending = deque()
+        current = []
+        produced = 0
+        try:
+            while True:
+                while len(pending) < window:
+                    sentence = next(sentences, None)
+                    if sentence is None:
+                        break
+                    index, part, last = sentence
+                    pending.append((index, last, self.pool.submit(part, tts_language) if part else None))
+                if not pending:
+                    return produced / self.pool.sample_rate
+                index, last, future = pending.popleft()
+                if future is not None:
+                    # A worker that hangs fails the conversation instead of the whole run; its finished
+                    # replies are kept for the next run
+                    current.append(future.result(timeout=self.sentence_timeout))
+                if last:
+                    key = replies[index][0]
+                    samples = torch.cat(current) if current else torch.zeros(0)
+                    partial = parts_dir / f"{key}.partial"
+                    samples.numpy().astype(np.float32).tofile(partial)
+                    os.replace(partial, parts_dir / f"{key}.f32")
+                    produced += samples.numel()
+                    current = []
+                    logging.info(f"{name}: reply {index + 1}/{len(replies)} rendered")
+        finally:
+            # After an error, sentences of this conversation still waiting are dropped
+            for _, _, future in pending:
+                if future is not None:
+                    future.cancel()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", type=Path, help="build folders or conversation_history.json files")
+    parser.add_argument("--output-dir", type=Path, default=Path("rendered"))
+    parser.add_argument("--data-dir", type=Path, help="build folder with settings.json and speaker.wav for all inputs")
+    parser.add_argument("--format", choices=["wav", "opus"], default="wav")
+    parser.add_argument("--bitrate", default="32k", help="Opus bitrate")
+    parser.add_argument("--workers", type=int, default=0, help="synthesis workers (default: planned from the cores)")
+    parser.add_argument("--pause", type=float, default=0.8, help="seconds of silence between replies")
+    parser.add_argument("--target-dbfs", type=float, default=-20.0, help="RMS loudness of the output")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    # Conversations are rendered in groups that share the settings and the voice sample
+    groups = {}
+    for history_file in find_conversations(args.inputs):
+        groups.setdefault((args.data_dir or history_file.parent).resolve(), []).append(history_file)
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    failed = 0
+    total_synthesized = total_seconds = 0.0
+    for data_dir, history_files in groups.items():
+        try:
+            renderer = ConversationRenderer(load_settings(data_dir), data_dir / "speaker.wav", args.output_dir,
+                                            args.format, args.workers, args.pause, args.target_dbfs, args.bitrate)
+        except Exception:
+            logging.exception(f"Error starting synthesis for {data_dir}:")
+            failed += len(history_files)
+            continue
+        try:
+            for history_file in history_files:
+                try:
+                    report = renderer.render(history_file)
+                except Exception:
+                    logging.exception(f"Error rendering {history_file}:")
+                    failed += 1
+                    continue
+                if report.get("skipped"):
+                    print(f"{report['conversation']}: up to date ({report['output']})")
+                    continue
+                total_synthesized += report.get("synthesized_audio_seconds", 0.0)
+                total_seconds += report.get("synthesis_seconds", 0.0)
+                if report["replies"]:
+                    rtf = report["real_time_factor"]
+                    print(f"{report['conversation']}: {report['replies']} replies, {report['audio_seconds']:.0f} s "
+                          f"of audio ({report['synthesized_replies']} replies synthesized"
+                          + (f", real-time factor {rtf:.3f}" if rtf is not None else "") + f") -> {report['output']}")
+        finally:
+            renderer.close()
+    if total_synthesized:
+        print(f"Synthesized {total_synthesized:.0f} s of audio in {total_seconds:.0f} s, "
+              f"real-time factor {total_seconds / total_synthesized:.3f}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""Batch transcription of recorded voice notes with Whisper, without the rest of the app.
+
+Transcribing notes one at a time with whisper's transcribe() leaves most of
+the model's throughput unused: every call decodes a single sequence, and the
+audio is decoded by ffmpeg while the model waits. Here the audio of the next
+files is decoded by ffmpeg processes in parallel, a bounded number of files
+ahead of the model. Notes of up to 30 s (one Whisper window) are transcribed
+in batches: the log-mel spectrograms of a batch are computed in one call and
+decoded together. Longer notes, and batch results that transcribe() would have
+retried at a higher temperature, go through transcribe() one by one.
+
+Results are appended to a JSON Lines file as each batch finishes, with the
+timings of the batch. A rerun with the same output skips the files already
+transcribed there, so an interrupted run resumes where it stopped; files that
+failed are tried again.
+
+    python -m voice_dialogue.batch_transcription notes/ --output notes.jsonl
+    python -m voice_dialogue.batch_transcription a.ogg b.m4a --output notes.jsonl --data-dir LM_Studio_Voice_Dialogue_EN
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import torch
+import whisper
+from whisper.audio import HOP_LENGTH, N_FFT, N_SAMPLES, SAMPLE_RATE, mel_filters
+
+from voice_dialogue.backend import load_settings
+from voice_dialogue.profiles import get_profile
+from voice_dialogue.weight_cache import WeightCache, load_whisper
+
+AUDIO_EXTENSIONS = frozenset({".wav", ".mp3", ".m4a", ".ogg", ".oga", ".opus", ".flac", ".webm", ".aac", ".wma"})
+# The thresholds of whisper's transcribe(): a result past them is retried there with temperature fallback
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+
+def find_audio_files(inputs: list) -> list:
+    """Absolute paths of the audio files given directly or found in the given directories, in a stable order."""
+    files = []
+    for path in (Path(p).resolve() for p in inputs):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob("*") if p.is_file() and p.suffix.lower() in AUDIO_EXTENSIONS))
+        else:
+            files.append(path)
+    return files
+
+
+def read_done(output: Path) -> set:
+    """Paths transcribed in an earlier run into output; a line cut off by an interruption is ignored."""
+    done = set()
+    if not output.exists():
+        return done
+    with output.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "error" not in record:
+                done.add(record["path"])
+    return done
+
+
+def log_mel_batch(audio: torch.Tensor, n_mels: int) -> torch.Tensor:
+    """whisper.log_mel_spectrogram for a (batch, samples) tensor.
+
+    Whisper's own function clamps the dynamic range against the maximum of the
+    whole tensor; here it is done per note, so a note is transcribed the same
+    in a batch as on its own.
+    """
+    window = torch.hann_window(N_FFT, device=audio.device)
+    stft = torch.stft(audio, N_FFT, HOP_LENGTH, window=window, return_complex=True)
+    magnitudes = stft[..., :-1].abs() ** 2
+    log_spec = torch.clamp(mel_filters(audio.device, n_mels) @ magnitudes, min=1e-10).log10()
+    log_spec = torch.maximum(log_spec, log_spec.amax(dim=(-2, -1), keepdim=True) - 8.0)
+    return (log_spec + 4.0) / 4.0
+
+
+class BatchTranscriber:
+    """Transcribes lists of audio files with one Whisper model; see the module docstring."""
+
+    def __init__(self, model, language: str = None, batch_size: int = 8, decode_workers: int = 4) -> None:
+        """language None detects the language of every note."""
+        self.model = model
+        self.language = language
+        self.batch_size = batch_size
+        self.decode_workers = decode_workers
+        self.device = model.device
+        self.fp16 = self.device.type == "cuda"
+
+    def _load(self, path: Path) -> tuple:
+        start = time.perf_counter()
+        try:
+            return path, whisper.load_audio(str(path)), time.perf_counter() - start
+        except Exception as e:
+            return path, e, time.perf_counter() - start
+
+    def _loaded(self, paths: list):
+        """Yield (path, samples or the exception, load seconds) in order, decoding a few files ahead."""
+        with ThreadPoolExecutor(self.decode_workers, thread_name_prefix="audio-decode") as executor:
+            pending = deque()
+            paths = iter(paths)
+            for path in paths:
+                pending.append(executor.submit(self._load, path))
+                if len(pending) >= self.decode_workers + self.batch_size:
+                    break
+            while pending:
+                yield pending.popleft().result()
+                path = next(paths, None)
+                if path is not None:
+                    pending.append(executor.submit(self._load, path))
+
+    def transcribe(self, paths: list):
+        """Yield a list of result dicts per finished batch, in the order of paths."""
+        batch = []
+        for path, samples, load_seconds in self._loaded(paths):
+            if isinstance(samples, Exception):
+                yield [{"path": str(path), "error": f"{type(samples).__name__}: {samples}"}]
+                continue
+            batch.append((path, samples, load_seconds))
+            if len(batch) == self.batch_size:
+                yield self._transcribe_batch(batch)
+                batch = []
+        if batch:
+            yield self._transcribe_batch(batch)
+
+    def _transcribe_batch(self, batch: list) -> list:
+        start = time.perf_counter()
+        results = {}
+        short = [index for index, (_, samples, _) in enumerate(batch) if len(samples) <= N_SAMPLES]
+        if short:
+            try:
+                results.update(zip(short, self._decode([batch[index][1] for index in short])))
+            except Exception:
+                logging.exception("Error during batched decoding, transcribing the notes one by one:")
+        records = []
+        for index, (path, samples, load_seconds) in enumerate(batch):
+            record = {"path": str(path), "duration": round(len(samples) / SAMPLE_RATE, 3)}
+            try:
+                record.update(results.get(index) or self._transcribe_one(samples))
+            except Exception as e:
+                logging.exception(f"Error transcribing {path}:")
+                record["error"] = f"{type(e).__name__}: {e}"
+            record["load_seconds"] = round(load_seconds, 3)
+            records.append(record)
+        elapsed = time.perf_counter() - start
+        for record in records:
+            record["batch_size"] = len(batch)
+            record["batch_seconds"] = round(elapsed, 3)
+        return records
+
+    def _decode(self, clips: list) -> list:
+        """Decode clips of up to 30 s as one batch; None for a result transcribe() would retry."""
+        audio = torch.stack([torch.from_numpy(whisper.pad_or_trim(clip)) for clip in clips]).to(self.device)
+        mel = log_mel_batch(audio, self.model.dims.n_mels)
+        options = whisper.DecodingOptions(task="transcribe", language=self.language, temperature=0.0, fp16=self.fp16)
+        with torch.inference_mode():
+            decoded = whisper.decode(self.model, mel, options)
+        results = []
+        for result in decoded:
+            if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+                results.append({"text": "", "language": result.language})
+            elif result.compression_ratio > COMPRESSION_RATIO_THRESHOLD or result.avg_logprob < LOGPROB_THRESHOLD:
+                results.append(None)
+            else:
+                results.append({"text": result.text.strip(), "language": result.language})
+        return results
+
+    def _transcribe_one(self, samples) -> dict:
+        result = self.model.transcribe(samples, language=self.language, task="transcribe", fp16=self.fp16)
+        return {"text": result.get("text", "").strip(), "language": result.get("language")}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", type=Path, help="audio files and directories of them")
+    parser.add_argument("--output", type=Path, required=True, help="JSON Lines file; results are appended")
+    parser.add_argument("--data-dir", type=Path, help="build folder whose settings choose the model and language")
+    parser.add_argument("--model", help="Whisper model (default: from the settings)")
+    parser.add_argument("--language", help="Whisper language code, or \"auto\" to detect it per note")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--decode-workers", type=int, default=min(8, os.cpu_count() or 1),
+                        help="ffmpeg processes decoding audio ahead of the model")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    settings = load_settings(args.data_dir) if args.data_dir else {}
+    language = args.language
+    if language is None and not settings.get("auto_detect_language", False):
+        language = get_profile(settings.get("language"))["asr_language"]
+    if language == "auto":
+        language = None
+
+    files = find_audio_files(args.inputs)
+    done = read_done(args.output)
+    todo = [path for path in files if str(path) not in done]
+    print(f"{len(files)} files, {len(files) - len(todo)} already in {args.output}, {len(todo)} to transcribe",
+          file=sys.stderr)
+    if not todo:
+        return 0
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model_name = args.model or settings.get("whisper_model", "large-v3-turbo")
+    start = time.perf_counter()
+    if settings.get("weight_cache", True):
+        model = load_whisper(WeightCache(settings.get("weight_cache_dir") or None), model_name, device)
+    else:
+        model = whisper.load_model(model_name, device=device)
+    print(f"Whisper {model_name} loaded on {device.upper()} in {time.perf_counter() - start:.2f} s", file=sys.stderr)
+
+    transcriber = BatchTranscriber(model, language, args.batch_size, args.decode_workers)
+    start = time.perf_counter()
+    finished = failed = 0
+    audio_seconds = 0.0
+    with args.output.open("a", encoding="utf-8") as output:
+        for records in transcriber.transcribe(todo):
+            for record in records:
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                failed += "error" in record
+                audio_seconds += record.get("duration", 0.0)
+            # Written per batch, so an interruption loses at most the batch in progress
+            output.flush()
+            finished += len(records)
+            elapsed = time.perf_counter() - start
+            remaining = elapsed / finished * (len(todo) - finished)
+            print(f"[{finished}/{len(todo)}] {audio_seconds / elapsed:.1f} s of audio per second, "
+                  f"{remaining:.0f} s left" + (f", {failed} failed" if failed else ""), file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    print(f"Transcribed {finished - failed} files ({audio_seconds:.0f} s of audio) in {elapsed:.1f} s, "
+          f"real-time factor {elapsed / max(audio_seconds, 1e-9):.3f}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,314 @@
+"""Chat panel backed by a message list and block-level QTextCursor formats.
+
+Every message is one QTextBlock: a bold role label followed by the message text,
+both inserted as plain text with QTextCharFormat, so Qt never parses HTML.
+Streaming text is appended through a cursor kept at the end of the active
+message, and the view scrolls at most once per event loop iteration.
+
+Only the newest messages are kept in the document (max_rendered). Older messages
+stay in the message list and are rendered a page at a time when the user scrolls
+to the top. Saved history is converted on a background thread and arrives page by
+page, newest first, so it never delays the first paint of the window.
+
+show_message() jumps to any message, e.g. a search hit: if it is far from the
+newest ones, only a window around it is rendered, extended a page at a time when
+the user scrolls down, and the next new message returns the view to the newest.
+"""
+import logging
+import threading
+
+from PyQt6.QtCore import QTimer, pyqtSignal
+from PyQt6.QtGui import QColor, QFont, QTextBlockFormat, QTextCharFormat, QTextCursor
+from PyQt6.QtWidgets import QTextEdit
+
+# Keeps line breaks of a message inside its block
+LINE_SEPARATOR = "\u2028"
+DEFAULT_COLORS = {
+    "user_label_color": "#008080",
+    "user_content_color": "#ADD8E6",
+    "assistant_label_color": "#9B59B6",
+    "assistant_content_color": "#FFA500",
+    "system_label_color": "#AAAAAA",
+    "system_content_color": "#FFFFFF",
+}
+
+
+class ChatView(QTextEdit):
+    historyPageReady = pyqtSignal(list)
+
+    def __init__(self, labels: dict, max_rendered: int = 300, page_size: int = 50, parent=None) -> None:
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setUndoRedoEnabled(False)
+        self.labels = labels
+        self.max_rendered = max_rendered
+        self.page_size = page_size
+        # Message model: [role, text] pairs, or [role, text, archive id] from the saved history;
+        # the text of the active message is kept in chunks
+        self.messages = []
+        self.first_rendered = 0
+        # End of the rendered window while it shows older messages; None when it reaches the newest
+        self.last_rendered = None
+        self._active_chunks = None
+        self._active_cursor = None
+        self._scroll_pending = False
+        self._rebuilding = False
+        self.block_format = QTextBlockFormat()
+        self.block_format.setBottomMargin(6)
+        self.formats = {}
+        self.set_colors({})
+        self.verticalScrollBar().valueChanged.connect(self._on_scroll)
+        self.historyPageReady.connect(self._on_history_page)
+
+    def set_colors(self, colors: dict) -> None:
+        """Set label/content colors per role and re-render the visible messages."""
+        for role in self.labels:
+            label_format = QTextCharFormat()
+            label_format.setFontWeight(QFont.Weight.Bold)
+            label_format.setForeground(QColor(colors.get(f"{role}_label_color", DEFAULT_COLORS[f"{role}_label_color"])))
+            content_format = QTextCharFormat()
+            content_format.setForeground(QColor(colors.get(f"{role}_content_color", DEFAULT_COLORS[f"{role}_content_color"])))
+            self.formats[role] = (label_format, content_format)
+        if self.messages and self._active_chunks is None:
+            self._render_window(self.first_rendered, self.last_rendered)
+
+    def set_labels(self, labels: dict) -> None:
+        """Change the role labels, e.g. after switching the UI language."""
+        self.labels = labels
+        if self.messages and self._active_chunks is None:
+            self._render_window(self.first_rendered, self.last_rendered)
+
+    # --- Model ---
+    @property
+    def streaming(self) -> bool:
+        """True while a message started with begin_message is open."""
+        return self._active_chunks is not None
+
+    def _window_end(self) -> int:
+        return len(self.messages) if self.last_rendered is None else self.last_rendered
+
+    def rendered_count(self) -> int:
+        return self._window_end() - self.first_rendered
+
+    def _message_text(self, index: int) -> str:
+        text = self.messages[index][1]
+        if index == len(self.messages) - 1 and self._active_chunks is not None:
+            return "".join(self._active_chunks)
+        return text
+
+    # --- Document updates ---
+    def _insert_message(self, cursor: QTextCursor, role: str, text: str, new_block: bool) -> None:
+        label_format, content_format = self.formats[role]
+        if new_block:
+            cursor.insertBlock(self.block_format)
+        else:
+            cursor.setBlockFormat(self.block_format)
+        cursor.insertText(self.labels[role] + " ", label_format)
+        cursor.insertText(text.replace("\n", LINE_SEPARATOR), content_format)
+
+    def _render_window(self, first: int, last: int = None) -> None:
+        """Rebuild the document from messages[first:last]."""
+        # Clearing the document scrolls to the top, which must not load a page into the new window
+        self._rebuilding = True
+        try:
+            self.document().clear()
+            self.first_rendered = first
+            self.last_rendered = last if last is not None and last < len(self.messages) else None
+            cursor = QTextCursor(self.document())
+            cursor.beginEditBlock()
+            for index in range(first, self._window_end()):
+                self._insert_message(cursor, self.messages[index][0], self._message_text(index), index > first)
+            cursor.endEditBlock()
+        finally:
+            self._rebuilding = False
+        self._active_cursor = None
+        if self._active_chunks is not None and self.last_rendered is None:
+            self._active_cursor = QTextCursor(self.document())
+            self._active_cursor.movePosition(QTextCursor.MoveOperation.End)
+
+    def _at_bottom(self) -> bool:
+        scrollbar = self.verticalScrollBar()
+        return scrollbar.value() >= scrollbar.maximum() - 4
+
+    def _scroll_to_bottom_later(self) -> None:
+        # Coalesce scroll requests: layout settles before the single scroll runs
+        if not self._scroll_pending:
+            self._scroll_pending = True
+            QTimer.singleShot(0, self._scroll_to_bottom)
+
+    def _scroll_to_bottom(self) -> None:
+        self._scroll_pending = False
+        scrollbar = self.verticalScrollBar()
+        scrollbar.setValue(scrollbar.maximum())
+
+    def _trim(self) -> None:
+        """Drop the oldest rendered blocks once the window exceeds max_rendered."""
+        excess = self.rendered_count() - self.max_rendered
+        if excess <= 0:
+            return
+        # Trim a whole page at once so trimming does not happen on every message
+        excess = min(excess + self.page_size, self.rendered_count() - 1)
+        cursor = QTextCursor(self.document())
+        cursor.movePosition(QTextCursor.MoveOperation.Start)
+        cursor.movePosition(QTextCursor.MoveOperation.NextBlock, QTextCursor.MoveMode.KeepAnchor, excess)
+        cursor.removeSelectedText()
+        self.first_rendered += excess
+
+    def _append_block(self, role: str, text: str) -> None:
+        follow = self._at_bottom()
+        cursor = QTextCursor(self.document())
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.beginEditBlock()
+        self._insert_message(cursor, role, text, self.rendered_count() > 1)
+        cursor.endEditBlock()
+        self._active_cursor = cursor
+        if follow:
+            self._trim()
+            self._scroll_to_bottom_later()
+
+    def _show_newest(self) -> None:
+        """Leave a window of older messages for the newest ones."""
+        self._render_window(max(0, len(self.messages) - self.page_size))
+        self._scroll_to_bottom_later()
+
+    def _on_scroll(self, value: int) -> None:
+        if self._rebuilding:
+            return
+        if value == self.verticalScrollBar().minimum() and self.first_rendered > 0:
+            self.render_older_page()
+        elif value == self.verticalScrollBar().maximum() and self.last_rendered is not None:
+            self.render_newer_page()
+
+    def render_older_page(self) -> None:
+        """Prepend the previous page of messages, keeping the viewport in place."""
+        first = max(0, self.first_rendered - self.page_size)
+        if first == self.first_rendered:
+            return
+        scrollbar = self.verticalScrollBar()
+        old_maximum = scrollbar.maximum()
+        old_value = scrollbar.value()
+        had_blocks = self.rendered_count() > 0
+        cursor = QTextCursor(self.document())
+        cursor.movePosition(QTextCursor.MoveOperation.Start)
+        cursor.beginEditBlock()
+        for index in range(first, self.first_rendered):
+            self._insert_message(cursor, self.messages[index][0], self._message_text(index), index > first)
+        if had_blocks:
+            # Split off the previously first message into its own block again
+            cursor.insertBlock(self.block_format)
+        cursor.endEditBlock()
+        self.first_rendered = first
+        scrollbar.setValue(old_value + scrollbar.maximum() - old_maximum)
+
+    def render_newer_page(self) -> None:
+        """Append the next page of messages to a window of older messages."""
+        if self.last_rendered is None:
+            return
+        last = min(len(self.messages), self.last_rendered + self.page_size)
+        cursor = QTextCursor(self.document())
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.beginEditBlock()
+        for index in range(self.last_rendered, last):
+            self._insert_message(cursor, self.messages[index][0], self._message_text(index), True)
+        cursor.endEditBlock()
+        self.last_rendered = last if last < len(self.messages) else None
+        if self.last_rendered is None and self._active_chunks is not None:
+            self._active_cursor = cursor
+
+    def _build_history_pages(self, source) -> None:
+        try:
+            messages = source()
+        except Exception:
+            logging.exception("Error preparing conversation history for display:")
+            return
+        if not messages:
+            return
+        # The newest page is shown right away; everything older is only added to the model
+        self.historyPageReady.emit(messages[-self.page_size:])
+        if len(messages) > self.page_size:
+            self.historyPageReady.emit(messages[:-self.page_size])
+
+    def _on_history_page(self, page: list) -> None:
+        """Insert older messages in front of the model; render them if the view is not full yet."""
+        self.messages[0:0] = page
+        self.first_rendered += len(page)
+        if self.last_rendered is not None:
+            self.last_rendered += len(page)
+        if self.rendered_count() < self.page_size:
+            self.render_older_page()
+            self._scroll_to_bottom_later()
+
+    # --- Public API ---
+    def load_history(self, source) -> None:
+        """Show saved history lazily; source() returns [role, text(, id)] lists and runs off the GUI thread."""
+        threading.Thread(target=self._build_history_pages, args=(source,), daemon=True).start()
+
+    def append_message(self, role: str, text: str) -> None:
+        """Append a complete message."""
+        self.end_message()
+        self.messages.append([role, text])
+        if self.last_rendered is not None:
+            self._show_newest()
+        else:
+            self._append_block(role, text)
+
+    def begin_message(self, role: str) -> None:
+        """Start a message whose text arrives through append_text."""
+        self.end_message()
+        self.messages.append([role, ""])
+        self._active_chunks = []
+        if self.last_rendered is not None:
+            self._show_newest()
+        else:
+            self._append_block(role, "")
+
+    def append_text(self, text: str) -> None:
+        """Append text to the active message; only its block is touched."""
+        if self._active_chunks is None:
+            return
+        follow = self._at_bottom()
+        self._active_chunks.append(text)
+        if self._active_cursor is None:
+            # Not rendered: the view shows older messages
+            return
+        role = self.messages[-1][0]
+        self._active_cursor.insertText(text.replace("\n", LINE_SEPARATOR), self.formats[role][1])
+        if follow:
+            self._scroll_to_bottom_later()
+
+    def end_message(self) -> None:
+        """Finish the active message, if any."""
+        if self._active_chunks is None:
+            return
+        self.messages[-1][1] = "".join(self._active_chunks)
+        self._active_chunks = None
+        self._active_cursor = None
+
+    def find_message(self, message_id: int, role: str, text: str) -> int:
+        """Index of the message with this archive id, else of the newest one with this role and text; -1 if none."""
+        fallback = -1
+        for index in range(len(self.messages) - 1, -1, -1):
+            message = self.messages[index]
+            if len(message) > 2 and message[2] == message_id:
+                return index
+            if fallback < 0 and message[0] == role and message[1] == text:
+                fallback = index
+        return fallback
+
+    def show_message(self, index: int, highlight: str = "") -> None:
+        """Scroll to messages[index], rendering a window around it if needed, and select highlight in it."""
+        if not self.first_rendered <= index < self._window_end():
+            first = max(0, index - self.page_size // 2)
+            if len(self.messages) - first <= self.max_rendered:
+                self._render_window(first)
+            else:
+                self._render_window(first, index + self.page_size // 2 + 1)
+        block = self.document().findBlockByNumber(index - self.first_rendered)
+        cursor = QTextCursor(block)
+        start = len(self.labels[self.messages[index][0]]) + 1
+        position = block.text().lower().find(highlight.lower(), start) if highlight else -1
+        if position >= 0:
+            cursor.setPosition(block.position() + position)
+            cursor.setPosition(block.position() + position + len(highlight), QTextCursor.MoveMode.KeepAnchor)
+        self.setTextCursor(cursor)
+        self.ensureCursorVisible()
@@ -0,0 +1,93 @@
+"""Command line runner of the voice dialogue without a GUI.
+
+Runs the full ASR -> LLM -> TTS loop on WAV files, one turn per file, and prints
+the per-stage latencies of every turn and their p50/p95 from the turn traces.
+Needs the LLM server; audio output goes to SDL's dummy driver unless --play is
+given, so it runs on servers without a display or sound card.
+
+    python -m voice_dialogue.cli question1.wav question2.wav --data-dir LM_Studio_Voice_Dialogue_EN \
+        --trace-chrome trace.json
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from voice_dialogue import engine
+from voice_dialogue.backend import VoiceAssistantBackend, load_settings
+from voice_dialogue.orchestrator import TurnOrchestrator
+from voice_dialogue.tracing import METRICS
+
+
+def print_event(event) -> None:
+    if isinstance(event, engine.TranscriptFinal):
+        print(f"  heard  : {event.text.strip()}")
+    elif isinstance(event, engine.ReplyFinished):
+        print(f"  reply  : {event.text}")
+
+
+def prepare_data_dir(source: Path, in_place: bool) -> Path:
+    """Use a scratch copy of the build folder so benchmark turns do not end up in the real history."""
+    if in_place:
+        return source
+    work_dir = Path(tempfile.mkdtemp(prefix="voice_dialogue_"))
+    for name in ("settings.json", "speaker.wav"):
+        if (source / name).exists():
+            shutil.copy2(source / name, work_dir / name)
+    return work_dir
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("wav_files", nargs="+", type=Path, help="one recorded user turn per file")
+    parser.add_argument("--data-dir", type=Path, required=True, help="build folder with settings.json and speaker.wav")
+    parser.add_argument("--language", help="language profile (default: from settings)")
+    parser.add_argument("--play", action="store_true", help="play the replies through the sound card")
+    parser.add_argument("--in-place", action="store_true", help="use and update the history of the build folder")
+    parser.add_argument("--trace-jsonl", type=Path, help="write the turn traces as JSON lines")
+    parser.add_argument("--trace-chrome", type=Path, help="write the turn traces in the Chrome trace format")
+    args = parser.parse_args()
+
+    if not args.play:
+        # Read by SDL when the backend initializes the mixer
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+    data_dir = prepare_data_dir(args.data_dir.resolve(), args.in_place)
+    settings = load_settings(data_dir)
+    if args.language:
+        settings["language"] = args.language
+    start = time.perf_counter()
+    backend = VoiceAssistantBackend(settings, data_dir)
+    backend.warm_up_thread.join()
+    print(f"Models loaded and warmed up in {time.perf_counter() - start:.2f} s")
+    voice_engine = engine.VoiceEngine(backend, play_audio=args.play)
+    orchestrator = TurnOrchestrator(voice_engine)
+    voice_engine.subscribe(print_event)
+
+    tracer = backend.tracer
+    for wav_file in args.wav_files:
+        print(f"{wav_file}:")
+        orchestrator.audio_turn(str(wav_file)).result()
+        metrics = tracer.turns[-1].metrics()
+        print("  " + ", ".join(f"{metric} {value:.2f} s" for metric, value in metrics.items()))
+    orchestrator.close()
+    backend.close()
+
+    stats = tracer.stats()
+    if len(args.wav_files) > 1:
+        print(f"{'':16} {'p50':>7} {'p95':>7}")
+        for metric in METRICS:
+            if metric in stats:
+                p50, p95, _ = stats[metric]
+                print(f"  {metric:14} {p50:7.2f} {p95:7.2f} s")
+    if args.trace_jsonl:
+        tracer.export_jsonl(args.trace_jsonl)
+    if args.trace_chrome:
+        tracer.export_chrome(args.trace_chrome)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,496 @@
+"""Headless voice dialogue engine.
+
+VoiceEngine wraps a VoiceAssistantBackend into the stages of a turn (capture,
+Whisper, LLM, TTS) without any GUI; voice_dialogue.orchestrator runs them.
+Progress is reported as typed events to subscribed callbacks; callbacks run on
+the thread that produced the event, so a GUI has to forward them to its own
+thread (the Qt app does it with a queued signal). With play_audio=False nothing
+touches the mixer and text is revealed as soon as its audio is synthesized,
+which is what the CLI benchmark uses.
+"""
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import suppress
+from dataclasses import dataclass
+
+import pygame
+
+from voice_dialogue.backend import VoiceAssistantBackend
+from voice_dialogue.inference import InferenceWorkerError
+from voice_dialogue.normalization import normalize
+from voice_dialogue.profiles import get_profile
+from voice_dialogue.segmentation import segment_text
+
+# Engine states
+IDLE = "idle"
+RECORDING = "recording"
+TRANSCRIBING = "transcribing"
+THINKING = "thinking"
+SPEAKING = "speaking"
+
+# Seconds between checks of the stop flag while waiting for the synthesis pool
+POOL_WAIT_SLICE = 0.05
+
+
+# --- Events ---
+@dataclass(frozen=True)
+class StateChanged:
+    state: str
+
+
+@dataclass(frozen=True)
+class TranscriptPartial:
+    """A transcribed segment; text is the transcript so far."""
+    text: str
+
+
+@dataclass(frozen=True)
+class TranscriptFinal:
+    text: str
+    language: str
+
+
+@dataclass(frozen=True)
+class ReplyToken:
+    text: str
+
+
+@dataclass(frozen=True)
+class ReplyFinished:
+    text: str
+    language: str
+
+
+@dataclass(frozen=True)
+class SentenceAudioReady:
+    """Audio of a synthesis segment started to become available."""
+    index: int
+    text: str
+    latency: float
+
+
+@dataclass(frozen=True)
+class PlaybackProgress:
+    """Text of the reply that has just been spoken."""
+    text: str
+
+
+@dataclass(frozen=True)
+class SpeechFinished:
+    interrupted: bool
+
+
+@dataclass(frozen=True)
+class ModelsSwapped:
+    """Newly selected models went into service between turns, or failed to load (error)."""
+    models: tuple
+    peak_rss_mb: float = None
+    error: str = ""
+
+
+class VoiceEngine:
+    def __init__(self, backend: VoiceAssistantBackend, play_audio: bool = True) -> None:
+        self.backend = backend
+        self.tracer = backend.tracer
+        self.profiler = backend.profiler
+        self.play_audio = play_audio
+        self.state = IDLE
+        self._subscribers = []
+        self._subscribers_lock = threading.Lock()
+        # Streams XTTS chunks while the speech stage plays the previous ones
+        self._synthesis_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-stream")
+        self._segment_index = 0
+
+    # --- Events ---
+    def subscribe(self, callback) -> None:
+        """Call callback(event) for every event; it runs on the thread that produced the event."""
+        with self._subscribers_lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback) -> None:
+        with self._subscribers_lock:
+            self._subscribers.remove(callback)
+
+    def _emit(self, event) -> None:
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception:
+                logging.exception(f"Error in engine event subscriber for {type(event).__name__}:")
+
+    def set_state(self, state: str) -> None:
+        if state != self.state:
+            self.state = state
+            self._emit(StateChanged(state))
+
+    @property
+    def busy(self) -> bool:
+        return self.state != IDLE
+
+    # --- Control ---
+    def stop_speaking(self) -> None:
+        self.backend.stop_generation()
+
+    def stop_recording(self) -> None:
+        self.backend.mouse_stop_recording()
+
+    def cancel_recording(self) -> None:
+        self.backend.cancel_recording()
+
+    def interrupt(self) -> None:
+        """Stop the reply at once because the user started talking."""
+        self.backend.stop_event.set()
+        if self.play_audio:
+            self.backend.tts_channel.stop()
+        self.backend.echo_reference.clear()
+
+    # --- Models ---
+    def prepare_models(self, tts_model: str = None, whisper_model: str = None) -> dict:
+        """Load changed models while the current ones keep serving; returns the load report."""
+        try:
+            return self.backend.models.prepare_swap(tts_model, whisper_model)
+        except Exception as e:
+            logging.exception("Error loading new models:")
+            self._emit(ModelsSwapped((), error=str(e).strip().splitlines()[-1]))
+            return {"loaded": []}
+
+    def commit_models(self, report: dict) -> None:
+        swapped = self.backend.commit_model_swap()
+        if swapped:
+            self._emit(ModelsSwapped(tuple(swapped), report.get("peak_rss_mb")))
+
+    # --- Stages ---
+    def record(self, max_duration: int = None, capture: tuple = None) -> str:
+        """Record from the microphone to a temporary WAV file; returns its path, or "" if canceled.
+
+        capture continues a barge-in capture; the caller reports RECORDING once the
+        interrupted reply has wound down.
+        """
+        # An offloaded Whisper model is reloaded while the user talks
+        self.backend.models.prefetch("whisper")
+        if capture is None:
+            self.set_state(RECORDING)
+            self.tracer.mark("record_start")
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_wav:
+            audio_file = tmp_wav.name
+        recorded = self.backend.record_audio(audio_file, max_duration=max_duration, capture=capture)
+        self.tracer.mark("record_stop")
+        if recorded:
+            return audio_file
+        with suppress(Exception):
+            os.remove(audio_file)
+        return ""
+
+    def transcribe(self, audio_path: str) -> str:
+        self.set_state(TRANSCRIBING)
+        # ... and the TTS model while Whisper and the LLM work
+        self.backend.models.prefetch("tts")
+        segments = []
+
+        def on_segment(segment_text: str) -> None:
+            segments.append(segment_text)
+            self._emit(TranscriptPartial("".join(segments)))
+
+        self.tracer.mark("asr_start")
+        text = self.backend.transcribe_audio(audio_path, on_segment=on_segment)
+        self.tracer.mark("asr_end")
+        if text:
+            self._emit(TranscriptFinal(text, self.backend.reply_language))
+        return text
+
+    def reply(self, text: str, language: str = None, on_token=None) -> str:
+        """Generate the reply; on_token(text) gets every streamed delta on the calling thread."""
+        self.set_state(THINKING)
+        self.backend.models.prefetch("tts")
+        # Typed messages are answered in the selected language, spoken ones in the detected one
+        self.backend.reply_language = language or self.backend.language
+
+        def token_received(token: str) -> None:
+            self._emit(ReplyToken(token))
+            if on_token is not None:
+                on_token(token)
+
+        reply = self.backend.generate_reply(text, on_token=token_received)
+        self._emit(ReplyFinished(reply, self.backend.reply_language))
+        return reply
+
+    # --- Speech ---
+    def speak(self, text: str, language: str = None) -> None:
+        """Synthesize and play a whole reply, emitting progress events."""
+        self.backend.stop_event.clear()
+        synthesis_times = []
+        self.begin_speech()
+        self.speak_part(text.strip(), language, synthesis_times)
+        self.finish_speech(synthesis_times)
+
+    def begin_speech(self) -> None:
+        self.set_state(SPEAKING)
+        self._segment_index = 0
+        if self.play_audio:
+            self.backend._play_sound("assistant_message")
+
+    def speak_part(self, text: str, language: str, synthesis_times: list) -> None:
+        """Synthesize and play the next part of a reply sentence group by sentence group.
+
+        text is shown exactly as given, including its leading whitespace, so the
+        parts of a streamed reply join up in the chat.
+        """
+        language = language or self.backend.language
+        profile = get_profile(language)
+        segments = segment_text(
+            text,
+            profile["abbreviations"],
+            max_chars=self.backend.settings.get("tts_segment_max_chars", profile["segment_max_chars"]),
+            call_overhead=self.backend.settings.get("tts_call_overhead_chars", 80),
+            quadratic_chars=self.backend.settings.get("tts_quadratic_chars", 400)
+        )
+
+        # Numbers, units, dates and currencies are spelled out; offsets map the
+        # normalized text back to the original for synchronized display
+        parts = [(start, end) + (normalize(text[start:end], profile["normalization"]) if speakable else ("", []))
+                 for start, end, speakable in segments]
+        # With the synthesis pool every sentence of the part is synthesized ahead, several at a time
+        pool = self.backend.synthesis_pool
+        futures = {}
+        if pool is not None and pool.ready and not self.backend.stop_event.is_set():
+            tts_language = profile["tts_language"]
+            try:
+                for start, _, normalized_part, _ in parts:
+                    if normalized_part.strip():
+                        futures[start] = pool.submit(normalized_part, tts_language)
+            except InferenceWorkerError:
+                # The last worker died after ready was checked; the rest is synthesized directly
+                logging.warning("Synthesis pool has no running worker, synthesizing directly")
+
+        position = 0
+        try:
+            for start, end, normalized_part, offsets in parts:
+                # Whitespace between segments is shown exactly as in the reply
+                self._reveal(text[position:start], 0)
+                position = end
+                original_part = text[start:end]
+                if self.backend.stop_event.is_set():
+                    if self.play_audio:
+                        self.backend.tts_channel.stop()
+                        self.backend.echo_reference.clear()
+                    self._reveal(text[start:], 0)
+                    position = len(text)
+                    break
+
+                if not normalized_part.strip():
+                    self._reveal(original_part, 0)
+                    continue
+
+                index = self._segment_index
+                self._segment_index += 1
+                if start in futures and self._speak_pooled(index, futures[start], original_part, synthesis_times):
+                    continue
+                if self.backend.streaming_enabled():
+                    self._speak_streaming(index, normalized_part, original_part, offsets, language, synthesis_times)
+                else:
+                    self._speak_file(index, normalized_part, original_part, language, synthesis_times)
+        finally:
+            for future in futures.values():
+                future.cancel()
+        self._reveal(text[position:], 0)
+
+    def finish_speech(self, synthesis_times: list) -> None:
+        self.tracer.mark("last_audio_played")
+        self._log_latency(synthesis_times)
+        interrupted = self.backend.stop_event.is_set()
+        self.backend.stop_event.clear()
+        self._emit(SpeechFinished(interrupted))
+
+    def _reveal(self, text: str, delay_per_char: float) -> None:
+        if not text:
+            return
+        if not self.play_audio:
+            self._emit(PlaybackProgress(text))
+            return
+        for ch in text:
+            self._emit(PlaybackProgress(ch))
+            # Once speech is stopped the rest of the text is shown at once
+            if delay_per_char and not self.backend.stop_event.is_set():
+                time.sleep(delay_per_char)
+
+    def _speak_file(self, index: int, norm_chunk: str, orig_chunk: str, language: str, synthesis_times: list) -> None:
+        """Synthesize the whole chunk to a file, then play it."""
+        temp_wav = None
+        try:
+            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_wav:
+                temp_wav = tmp_wav.name
+            synthesis_times.append(self.backend.synthesize_to_file(norm_chunk, temp_wav, language))
+            self._emit(SentenceAudioReady(index, orig_chunk, synthesis_times[-1]))
+            self.tracer.mark("first_sentence_synthesized")
+            if not self.play_audio:
+                self.tracer.mark("first_audio_played")
+                self._reveal(orig_chunk, 0)
+                return
+            try:
+                sound = pygame.mixer.Sound(temp_wav)
+                duration = sound.get_length()
+                delay_per_char = duration / len(orig_chunk) if orig_chunk else duration
+                self.backend.register_playback(sound)
+                self.backend.tts_channel.play(sound)
+                self.tracer.mark("first_audio_played")
+            except Exception:
+                logging.exception("Error during sound playback:")
+                delay_per_char = 0.04
+
+            self._reveal(orig_chunk, delay_per_char)
+        except Exception:
+            logging.exception("Error during TTS synthesis:")
+        finally:
+            if temp_wav is not None:
+                with suppress(Exception):
+                    os.remove(temp_wav)
+
+    def _speak_pooled(self, index: int, future, orig_chunk: str, synthesis_times: list) -> bool:
+        """Play a chunk synthesized by the synthesis pool once its samples are ready.
+
+        Returns False when the pool failed or did not deliver in time; the caller then
+        synthesizes the chunk itself.
+        """
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.backend.settings.get("parallel_synthesis_timeout", 60)
+        # Waited for in short slices, so that stop and barge-in are not held up by a sentence in progress
+        while True:
+            if self.backend.stop_event.is_set():
+                future.cancel()
+                self._reveal(orig_chunk, 0)
+                return True
+            try:
+                samples = future.result(timeout=POOL_WAIT_SLICE)
+                break
+            except FutureTimeoutError:
+                if time.monotonic() > deadline:
+                    future.cancel()
+                    logging.warning("Synthesis pool did not deliver in time, synthesizing the sentence directly")
+                    return False
+            except Exception:
+                logging.exception("Error in the synthesis pool, synthesizing the sentence directly:")
+                return False
+        # Time spent waiting for the audio; the synthesis itself overlapped the previous sentences
+        synthesis_times.append(time.perf_counter() - start)
+        self._emit(SentenceAudioReady(index, orig_chunk, synthesis_times[-1]))
+        self.tracer.mark("first_sentence_synthesized")
+        if not self.play_audio or self.backend.stop_event.is_set():
+            self.tracer.mark("first_audio_played")
+            self._reveal(orig_chunk, 0)
+            return True
+        duration = samples.numel() / self.backend.tts_sample_rate
+        channel = self.backend.tts_channel
+        try:
+            sound = self.backend.samples_to_sound(samples)
+            if channel.get_busy():
+                # The previous sentence is still playing; this one follows it without a gap
+                while channel.get_queue() is not None and not self.backend.stop_event.is_set():
+                    time.sleep(0.005)
+                self.backend.register_playback(sound, queued=True)
+                channel.queue(sound)
+            else:
+                self.backend.register_playback(sound)
+                channel.play(sound)
+            self.tracer.mark("first_audio_played")
+            delay_per_char = duration / len(orig_chunk)
+        except Exception:
+            logging.exception("Error during sound playback:")
+            delay_per_char = 0.04
+        self._reveal(orig_chunk, delay_per_char)
+        return True
+
+    def _speak_streaming(self, index: int, norm_chunk: str, orig_chunk: str, offsets: list, language: str,
+                         synthesis_times: list) -> None:
+        """Play audio chunks as XTTS produces them, revealing text at the current speech rate."""
+        chunks = queue.Queue()
+        # Set once this chunk is abandoned. stop_event is cleared when the turn winds down, which
+        # would leave the producer holding the TTS model and the synthesis thread
+        cancel = threading.Event()
+        start = time.perf_counter()
+
+        def produce() -> None:
+            try:
+                for samples in self.backend.synthesize_stream(norm_chunk, language, cancel):
+                    chunks.put(samples)
+            except Exception:
+                logging.exception("Error during TTS synthesis:")
+            finally:
+                chunks.put(None)
+
+        self._synthesis_executor.submit(self.profiler.run, "synthesize_stream", produce)
+
+        channel = self.backend.tts_channel
+        chars_per_second = self.backend.chars_per_second
+        emitted = 0
+        spoken = 0.0
+        total_duration = 0.0
+        try:
+            while True:
+                # Waited for in short slices, so that a stop reaches the producer before its next chunk
+                try:
+                    samples = chunks.get(timeout=POOL_WAIT_SLICE)
+                except queue.Empty:
+                    if self.backend.stop_event.is_set():
+                        break
+                    continue
+                if samples is None or self.backend.stop_event.is_set():
+                    break
+                if not total_duration:
+                    # Time to first audio of this chunk
+                    synthesis_times.append(time.perf_counter() - start)
+                    self._emit(SentenceAudioReady(index, orig_chunk, synthesis_times[-1]))
+                    self.tracer.mark("first_sentence_synthesized")
+                duration = samples.numel() / self.backend.tts_sample_rate
+                if self.play_audio:
+                    try:
+                        sound = self.backend.samples_to_sound(samples)
+                        if channel.get_busy():
+                            # The channel holds one queued sound; wait for the slot to free up
+                            while channel.get_queue() is not None and not self.backend.stop_event.is_set():
+                                time.sleep(0.005)
+                            self.backend.register_playback(sound, queued=True)
+                            channel.queue(sound)
+                        else:
+                            self.backend.register_playback(sound)
+                            channel.play(sound)
+                    except Exception:
+                        logging.exception("Error during sound playback:")
+                self.tracer.mark("first_audio_played")
+                total_duration += duration
+                # Map the position reached in the normalized text back to the original text.
+                # Keep the last characters until the stream ends: the total duration is not known yet
+                spoken += duration * chars_per_second
+                target = offsets[min(int(spoken), len(offsets) - 1)]
+                count = min(target, len(orig_chunk) - 1) - emitted
+                if count > 0:
+                    self._reveal(orig_chunk[emitted:emitted + count], duration / count)
+                    emitted += count
+        finally:
+            cancel.set()
+
+        rest = orig_chunk[emitted:]
+        if self.backend.stop_event.is_set() or not total_duration:
+            self._reveal(rest, 0)
+            return
+        self._reveal(rest, 1 / chars_per_second)
+        self.backend.chars_per_second = len(norm_chunk) / total_duration
+
+    @staticmethod
+    def _log_latency(synthesis_times: list) -> None:
+        """Report first-sentence and steady-state synthesis latency of the message."""
+        if not synthesis_times:
+            return
+        logging.info(f"First sentence audio ready in {synthesis_times[0]:.2f} s")
+        if len(synthesis_times) > 1:
+            steady = synthesis_times[1:]
+            logging.info(f"Steady-state synthesis latency: {sum(steady) / len(steady):.2f} s "
+                         f"per sentence over {len(steady)} sentences")
+
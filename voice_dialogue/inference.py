@@ -0,0 +1,586 @@
+"""Speech models: XTTS synthesis and Whisper transcription.
+
+ModelHost owns the models and runs them in the calling process. InferenceClient
+has the same interface but runs a ModelHost in a worker process, so the
+Python-side parts of inference (XTTS's GPT decoding loop, Whisper's decoding)
+do not compete with the GUI thread for the GIL. Requests and small results go
+over a pipe; streamed audio comes back through a ring buffer in shared memory
+that is reused for the life of the app, so samples are copied once and never
+pickled. A worker that crashes fails the requests in flight and is restarted;
+the GUI process keeps running.
+
+Models can be replaced at runtime: prepare_swap() loads the changed models next
+to the ones in service, which keep answering meanwhile, and commit_swap() puts
+them in service at once (the orchestrator calls it between turns) and releases
+the old ones. Models are loaded one at a time, so the memory peak of a swap is
+the models in service plus the largest new one; it is measured and reported.
+
+Idle models are offloaded and brought back on demand or by prefetch() (see
+voice_dialogue.residency).
+"""
+import io
+import itertools
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+import traceback
+from contextlib import contextmanager, redirect_stderr, redirect_stdout
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import torch
+import whisper
+from TTS.api import TTS
+
+from voice_dialogue.residency import ModelResidency, RssSampler, megabytes, process_rss, release_memory
+from voice_dialogue.weight_cache import WeightCache, load_whisper, load_xtts
+
+# A worker that dies more often than this is not restarted again
+MAX_RESTARTS = 3
+RESTART_WINDOW = 60.0
+FLOAT_BYTES = 4
+
+
+class InferenceWorkerError(RuntimeError):
+    pass
+
+
+class ModelHost:
+    """The TTS and Whisper models and the calls the backend makes on them."""
+
+    def __init__(self, settings: dict, speaker_wav: Path, tts_factory=None, with_whisper: bool = True) -> None:
+        """with_whisper False loads only the TTS model (the synthesis pool's workers)."""
+        self.settings = settings
+        self.speaker_wav = Path(speaker_wav)
+        self.tts_factory = tts_factory
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        logging.info(f"Using device: {self.device.upper()}")
+        num_threads = self.settings.get("tts_num_threads", 0)
+        if num_threads > 0:
+            torch.set_num_threads(num_threads)
+        logging.info(f"Torch CPU threads: {torch.get_num_threads()}")
+
+        # Later loads memory-map the weights converted on the first one (see voice_dialogue.weight_cache)
+        self.weight_cache = None
+        if self.settings.get("weight_cache", True):
+            self.weight_cache = WeightCache(self.settings.get("weight_cache_dir") or None)
+        # Idle models are offloaded; the models are reached through residency.use() (see voice_dialogue.residency)
+        self.residency = ModelResidency(self.device, self.settings.get("model_idle_offload_seconds", 0),
+                                        self.settings.get("model_memory_budget_mb", 0),
+                                        self.settings.get("model_offload_mode", "unload"))
+        self.tts_model_name = self.settings.get("tts_model", "tts_models/multilingual/multi-dataset/xtts_v2")
+        try:
+            tts_model = self._load_tts(self.tts_model_name)
+        except Exception:
+            logging.exception("Error loading TTS model:")
+            raise
+        # Only one synthesis may run at a time (warm-up and speech stage share the model)
+        self.tts_lock = threading.Lock()
+        self._set_tts_properties(tts_model)
+        self.residency.add("tts", self.tts_model_name, tts_model, self._load_tts)
+        del tts_model
+
+        self.whisper_model_name = self.settings.get("whisper_model", "large-v3-turbo")
+        try:
+            if with_whisper:
+                self.residency.add("whisper", self.whisper_model_name, self._load_whisper(self.whisper_model_name),
+                                   self._load_whisper)
+        except Exception:
+            logging.exception("Error loading Whisper model:")
+            raise
+        # Models loaded by prepare_swap, waiting for commit_swap: {"tts"/"whisper": (name, model)}
+        self._staged = {}
+        self._swap_lock = threading.Lock()
+
+    def _set_tts_properties(self, tts_model) -> None:
+        # Kept here so they can be read while the model is offloaded
+        self.sample_rate = tts_model.synthesizer.output_sample_rate
+        self.streaming_supported = hasattr(getattr(tts_model.synthesizer, "tts_model", None), "inference_stream")
+        self._speaker_latents = None
+        self._speaker_latents_mtime = None
+
+    @contextmanager
+    def _suppress_output(self):
+        # Redirect stdout/stderr to suppress unwanted output
+        with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+            yield
+
+    def _load_tts(self, model_name: str):
+        if self.tts_factory is not None:
+            model = self.tts_factory()
+        elif self.weight_cache is not None:
+            model = load_xtts(self.weight_cache, model_name).to(self.device)
+        else:
+            model = TTS(model_name=model_name).to(self.device)
+        if self.device == "cpu" and self.settings.get("tts_quantize_int8", False):
+            self._quantize_tts_decoder(model)
+        return model
+
+    def _load_whisper(self, model_name: str):
+        if self.weight_cache is not None:
+            return load_whisper(self.weight_cache, model_name, self.device)
+        return whisper.load_model(model_name, device=self.device)
+
+    def _quantize_tts_decoder(self, tts_model) -> None:
+        """Apply dynamic int8 quantization to the XTTS GPT decoder."""
+        xtts = getattr(tts_model.synthesizer, "tts_model", None)
+        gpt = getattr(xtts, "gpt", None)
+        if gpt is None:
+            logging.warning("Int8 quantization is only supported for XTTS models.")
+            return
+        try:
+            from transformers.pytorch_utils import Conv1D
+            # GPT-2 blocks use Conv1D instead of nn.Linear; convert them so they can be quantized
+            for module in list(gpt.modules()):
+                for name, child in module.named_children():
+                    if isinstance(child, Conv1D):
+                        linear = torch.nn.Linear(child.weight.shape[0], child.weight.shape[1])
+                        linear.weight.data = child.weight.data.t().contiguous()
+                        linear.bias.data = child.bias.data
+                        setattr(module, name, linear)
+            # Quantize in place: the inference wrapper shares these modules
+            torch.ao.quantization.quantize_dynamic(gpt, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+            logging.info("XTTS GPT decoder quantized to int8")
+        except Exception:
+            logging.exception("Error quantizing XTTS GPT decoder:")
+
+    def synthesize_to_file(self, text: str, file_path: str, tts_language: str) -> None:
+        # Redirect output during TTS synthesis
+        with self.tts_lock, self.residency.use("tts") as tts_model, torch.inference_mode(), self._suppress_output():
+            tts_model.tts_to_file(
+                text=text,
+                speaker_wav=str(self.speaker_wav),
+                language=tts_language,
+                file_path=file_path,
+                temperature=0.85,
+                split_sentences=False
+            )
+
+    def _get_speaker_latents(self, xtts) -> tuple:
+        """Return XTTS conditioning latents for speaker.wav, recomputed only when the file changes."""
+        speaker_wav = self.speaker_wav
+        mtime = speaker_wav.stat().st_mtime
+        if self._speaker_latents is None or self._speaker_latents_mtime != mtime:
+            self._speaker_latents = xtts.get_conditioning_latents(audio_path=[str(speaker_wav)])
+            self._speaker_latents_mtime = mtime
+        return self._speaker_latents
+
+    def synthesize_stream(self, text: str, tts_language: str, stop: threading.Event):
+        """Yield consecutive audio chunks (float sample tensors) of the text as XTTS produces them."""
+        with self.tts_lock, self.residency.use("tts") as tts_model, torch.inference_mode():
+            xtts = tts_model.synthesizer.tts_model
+            gpt_cond_latent, speaker_embedding = self._get_speaker_latents(xtts)
+            chunks = xtts.inference_stream(
+                text,
+                tts_language,
+                gpt_cond_latent,
+                speaker_embedding,
+                stream_chunk_size=self.settings.get("tts_stream_chunk_size", 20),
+                overlap_wav_len=self.settings.get("tts_crossfade_samples", 1024),
+                temperature=0.85,
+                enable_text_splitting=False
+            )
+            for chunk in chunks:
+                if stop.is_set():
+                    break
+                yield chunk
+
+    def synthesize(self, text: str, tts_language: str) -> torch.Tensor:
+        """Synthesize the whole text at once; returns float samples on the CPU."""
+        with self.tts_lock, self.residency.use("tts") as tts_model, torch.inference_mode(), self._suppress_output():
+            if self.streaming_supported:
+                xtts = tts_model.synthesizer.tts_model
+                gpt_cond_latent, speaker_embedding = self._get_speaker_latents(xtts)
+                samples = xtts.inference(
+                    text,
+                    tts_language,
+                    gpt_cond_latent,
+                    speaker_embedding,
+                    temperature=0.85,
+                    enable_text_splitting=False
+                )["wav"]
+            else:
+                samples = tts_model.tts(
+                    text=text,
+                    speaker_wav=str(self.speaker_wav),
+                    language=tts_language,
+                    split_sentences=False
+                )
+        return torch.as_tensor(samples, dtype=torch.float32).cpu()
+
+    def transcribe(self, filename: str, asr_language: str = None) -> dict:
+        """Transcribe a WAV file; asr_language None detects the language.
+
+        Returns {"text", "language", "segments": [segment text, ...]}.
+        """
+        with self.residency.use("whisper") as whisper_model:
+            result = whisper_model.transcribe(filename, language=asr_language, task="transcribe")
+        return {
+            "text": result.get("text", ""),
+            "language": result.get("language"),
+            "segments": [segment.get("text", "") for segment in result.get("segments", [])],
+        }
+
+    # --- Model swap ---
+    def prepare_swap(self, tts_model: str = None, whisper_model: str = None) -> dict:
+        """Load the given models unless they are already in service or staged.
+
+        Returns {"loaded": [names], "rss_before_mb", "peak_rss_mb"} (None where RSS is unknown).
+        """
+        loaders = {"tts": (tts_model, self.tts_model_name, self._load_tts),
+                   "whisper": (whisper_model, self.whisper_model_name, self._load_whisper)}
+        loaded = []
+        with RssSampler() as sampler:
+            for kind, (name, current, load) in loaders.items():
+                with self._swap_lock:
+                    staged = self._staged.get(kind)
+                    if not name or name == (staged[0] if staged else current):
+                        continue
+                    # A staged model that is superseded is freed before the next one is loaded
+                    self._staged.pop(kind, None)
+                del staged
+                release_memory()
+                logging.info(f"Loading {kind} model {name} next to {current}")
+                model = load(name)
+                with self._swap_lock:
+                    self._staged[kind] = (name, model)
+                del model
+                loaded.append(name)
+        return {"loaded": loaded, "rss_before_mb": megabytes(sampler.before), "peak_rss_mb": megabytes(sampler.peak)}
+
+    def commit_swap(self) -> list:
+        """Put the staged models in service and release the old ones; returns the names swapped in."""
+        with self._swap_lock:
+            staged, self._staged = self._staged, {}
+        swapped = []
+        if "tts" in staged:
+            with self.tts_lock:
+                self.tts_model_name, tts_model = staged.pop("tts")
+                self._set_tts_properties(tts_model)
+                self.residency.replace("tts", self.tts_model_name, tts_model)
+                del tts_model
+            swapped.append(self.tts_model_name)
+        if "whisper" in staged:
+            self.whisper_model_name, whisper_model = staged.pop("whisper")
+            self.residency.replace("whisper", self.whisper_model_name, whisper_model)
+            del whisper_model
+            swapped.append(self.whisper_model_name)
+        if swapped:
+            # The old models are no longer referenced
+            release_memory()
+            logging.info(f"Models in service: {', '.join(swapped)} (RSS {megabytes(process_rss())} MB)")
+        return swapped
+
+    def prefetch(self, kind: str) -> None:
+        """Start bringing the "tts" or "whisper" model back if it was offloaded; returns at once."""
+        self.residency.prefetch(kind)
+
+    def close(self) -> None:
+        self.residency.close()
+
+
+# --- Worker process ---
+class AudioRing:
+    """Float32 samples in a shared memory ring, written by the worker and read by the app.
+
+    Positions count bytes since the worker started. The reader publishes how far
+    it has read in the shared consumed counter; the writer waits for room instead
+    of overwriting samples that were not read yet. A chunk never wraps around the
+    end of the buffer, so it can be read as one contiguous slice.
+    """
+
+    def __init__(self, memory: shared_memory.SharedMemory, consumed) -> None:
+        self.memory = memory
+        self.size = memory.size - memory.size % FLOAT_BYTES
+        self.consumed = consumed
+        self.produced = 0
+
+    def write(self, samples: torch.Tensor, stop: threading.Event):
+        """Copy samples into the ring; returns (offset, count, end position), or None if stopped while waiting."""
+        samples = samples.detach().reshape(-1).to("cpu", torch.float32)
+        size = samples.numel() * FLOAT_BYTES
+        if size > self.size:
+            raise ValueError(f"Audio chunk of {size} bytes does not fit into the {self.size} byte buffer")
+        offset = self.produced % self.size
+        start = self.produced + (self.size - offset if offset + size > self.size else 0)
+        while start + size - self.consumed.value > self.size:
+            if stop.is_set():
+                return None
+            time.sleep(0.002)
+        offset = start % self.size
+        torch.frombuffer(self.memory.buf, dtype=torch.float32, count=samples.numel(), offset=offset).copy_(samples)
+        self.produced = start + size
+        return offset, samples.numel(), self.produced
+
+    def read(self, offset: int, count: int, end: int) -> torch.Tensor:
+        samples = torch.frombuffer(self.memory.buf, dtype=torch.float32, count=count, offset=offset).clone()
+        self.consumed.value = end
+        return samples
+
+
+def _serve(conn, memory_name: str, consumed, settings: dict, speaker_wav: str, tts_factory) -> None:
+    """Entry point of the worker process: load the models and answer requests one at a time
+    (model loads for a swap run beside them)."""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - inference - %(levelname)s - %(message)s")
+    memory = shared_memory.SharedMemory(name=memory_name)
+    ring = AudioRing(memory, consumed)
+    try:
+        host = ModelHost(settings, Path(speaker_wav), tts_factory)
+    except Exception:
+        conn.send((None, "error", traceback.format_exc()))
+        return
+    conn.send((None, "ready", {"sample_rate": host.sample_rate, "streaming_supported": host.streaming_supported}))
+
+    send_lock = threading.Lock()
+
+    def send(message: tuple) -> None:
+        with send_lock:
+            conn.send(message)
+
+    def prepare_swap(request_id: int, args: tuple) -> None:
+        # Off the request loop: the models in service keep answering while the new ones load
+        try:
+            send((request_id, "result", host.prepare_swap(*args)))
+        except Exception:
+            send((request_id, "error", traceback.format_exc()))
+
+    requests = queue.Queue()
+    # Cancel flags by request id; a request may be canceled before it starts
+    cancels = {}
+    cancels_lock = threading.Lock()
+
+    def cancel_flag(request_id: int) -> threading.Event:
+        with cancels_lock:
+            return cancels.setdefault(request_id, threading.Event())
+
+    def receive() -> None:
+        while True:
+            try:
+                request_id, method, args = conn.recv()
+            except (EOFError, OSError):
+                requests.put(None)
+                return
+            if method == "cancel":
+                cancel_flag(request_id).set()
+            elif method == "prefetch":
+                # Not queued behind the request that is running
+                host.prefetch(*args)
+            elif method == "shutdown":
+                requests.put(None)
+                return
+            else:
+                requests.put((request_id, method, args))
+
+    threading.Thread(target=receive, name="inference-requests", daemon=True).start()
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        request_id, method, args = request
+        stop = cancel_flag(request_id)
+        try:
+            if method == "synthesize_stream":
+                for chunk in host.synthesize_stream(*args, stop):
+                    if not chunk.numel():
+                        continue
+                    slot = ring.write(chunk, stop)
+                    if slot is None:
+                        break
+                    send((request_id, "chunk", slot))
+                send((request_id, "result", None))
+            elif method == "prepare_swap":
+                threading.Thread(target=prepare_swap, args=(request_id, args), name="model-swap", daemon=True).start()
+            elif method == "commit_swap":
+                send((request_id, "result", {"swapped": host.commit_swap(), "sample_rate": host.sample_rate,
+                                             "streaming_supported": host.streaming_supported}))
+            elif method in ("synthesize_to_file", "transcribe"):
+                send((request_id, "result", getattr(host, method)(*args)))
+            else:
+                send((request_id, "error", f"Unknown inference request {method!r}"))
+        except Exception:
+            send((request_id, "error", traceback.format_exc()))
+        finally:
+            with cancels_lock:
+                cancels.pop(request_id, None)
+    memory.close()
+
+
+class InferenceClient:
+    """ModelHost in a worker process, with the same interface; thread-safe."""
+
+    def __init__(self, settings: dict, speaker_wav: Path, tts_factory=None, audio_buffer_mb: float = 16) -> None:
+        self._context = multiprocessing.get_context("spawn")
+        self._args = (settings, str(speaker_wav), tts_factory)
+        self._memory = shared_memory.SharedMemory(create=True, size=int(audio_buffer_mb * 1024 * 1024))
+        self._consumed = self._context.RawValue("q", 0)
+        self._ring = AudioRing(self._memory, self._consumed)
+        self._ids = itertools.count(1)
+        self._pending = {}  # request id -> queue of (kind, value)
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._restarts = []
+        self._closed = False
+        self._failure = None
+        try:
+            self._start()
+        except Exception:
+            self._memory.close()
+            self._memory.unlink()
+            raise
+
+    def _start(self) -> None:
+        """Start a worker and wait until its models are loaded; raises InferenceWorkerError if it fails."""
+        self._consumed.value = 0
+        self._conn, child_conn = self._context.Pipe()
+        self._process = self._context.Process(
+            target=_serve, args=(child_conn, self._memory.name, self._consumed) + self._args,
+            name="voice-inference", daemon=True)
+        self._process.start()
+        child_conn.close()
+        try:
+            _, kind, value = self._conn.recv()
+        except (EOFError, OSError):
+            kind, value = "error", f"Inference worker exited with code {self._process.exitcode}"
+        if kind != "ready":
+            self._process.join(5)
+            raise InferenceWorkerError(f"Inference worker failed to start:\n{value}")
+        self.sample_rate = value["sample_rate"]
+        self.streaming_supported = value["streaming_supported"]
+        logging.info(f"Inference worker started (pid {self._process.pid})")
+        self._ready.set()
+        threading.Thread(target=self._receive, args=(self._conn,), name="inference-replies", daemon=True).start()
+
+    def _receive(self, conn) -> None:
+        while True:
+            try:
+                request_id, kind, value = conn.recv()
+            except (EOFError, OSError):
+                break
+            if kind == "chunk":
+                # Copy the samples out right away so the worker can reuse the room
+                value = self._ring.read(*value)
+            with self._lock:
+                replies = self._pending.get(request_id)
+            if replies is not None:
+                replies.put((kind, value))
+        self._worker_died()
+
+    def _worker_died(self) -> None:
+        self._ready.clear()
+        self._process.join(5)
+        message = f"Inference worker exited with code {self._process.exitcode}"
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for replies in pending.values():
+            replies.put(("error", message))
+        if self._closed:
+            return
+        logging.error(message)
+        now = time.monotonic()
+        self._restarts = [when for when in self._restarts if now - when < RESTART_WINDOW] + [now]
+        if len(self._restarts) > MAX_RESTARTS:
+            self._failure = f"{message}; not restarted after {MAX_RESTARTS} restarts within {RESTART_WINDOW:.0f} s"
+            logging.error(self._failure)
+            self._ready.set()
+            return
+        try:
+            self._start()
+        except Exception as e:
+            self._failure = str(e)
+            logging.exception("Error restarting inference worker:")
+            self._ready.set()
+
+    def _request(self, method: str, args: tuple) -> tuple:
+        replies = queue.Queue()
+        while True:
+            self._ready.wait()
+            with self._lock:
+                if self._failure is not None:
+                    raise InferenceWorkerError(self._failure)
+                # Registered while the worker is up: if it dies now, the request is failed with the others
+                if self._ready.is_set():
+                    request_id = next(self._ids)
+                    self._pending[request_id] = replies
+                    break
+        self._send((request_id, method, args))
+        return request_id, replies
+
+    def _send(self, message: tuple) -> None:
+        try:
+            with self._send_lock:
+                self._conn.send(message)
+        except (OSError, ValueError):
+            # The worker is gone; its replies thread fails the pending requests
+            pass
+
+    def _finish(self, request_id: int) -> None:
+        with self._lock:
+            self._pending.pop(request_id, None)
+
+    def _call(self, method: str, *args):
+        request_id, replies = self._request(method, args)
+        try:
+            kind, value = replies.get()
+        finally:
+            self._finish(request_id)
+        if kind == "error":
+            raise InferenceWorkerError(value)
+        return value
+
+    def synthesize_to_file(self, text: str, file_path: str, tts_language: str) -> None:
+        self._call("synthesize_to_file", text, file_path, tts_language)
+
+    def transcribe(self, filename: str, asr_language: str = None) -> dict:
+        return self._call("transcribe", filename, asr_language)
+
+    def synthesize_stream(self, text: str, tts_language: str, stop: threading.Event):
+        request_id, replies = self._request("synthesize_stream", (text, tts_language))
+        finished = False
+        try:
+            while not stop.is_set():
+                try:
+                    kind, value = replies.get(timeout=0.05)
+                except queue.Empty:
+                    continue
+                if kind == "chunk":
+                    yield value
+                elif kind == "result":
+                    finished = True
+                    return
+                else:
+                    finished = True
+                    raise InferenceWorkerError(value)
+        finally:
+            self._finish(request_id)
+            if not finished:
+                self._send((request_id, "cancel", None))
+
+    def prefetch(self, kind: str) -> None:
+        if self._ready.is_set():
+            self._send((None, "prefetch", (kind,)))
+
+    def prepare_swap(self, tts_model: str = None, whisper_model: str = None) -> dict:
+        return self._call("prepare_swap", tts_model, whisper_model)
+
+    def commit_swap(self) -> list:
+        result = self._call("commit_swap")
+        self.sample_rate = result["sample_rate"]
+        self.streaming_supported = result["streaming_supported"]
+        return result["swapped"]
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Stop the worker and free the shared memory."""
+        if self._closed:
+            return
+        self._closed = True
+        self._send((None, "shutdown", None))
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join(timeout)
+        self._conn.close()
+        self._memory.close()
+        self._memory.unlink()
@@ -0,0 +1,288 @@
+"""Retrieval-augmented long-term memory over the message archive.
+
+The rolling summary keeps what the LLM chose to keep; this keeps everything.
+Every archived message is embedded with a small multilingual sentence
+embedding model on the CPU (in the background, off the reply path), and the
+vectors go to an on-disk index in the build folder (memory_index/), appended
+to as messages arrive. When a reply is requested, the user's message is
+embedded, the closest past messages are looked up, and those that are not in
+the context already are put into the prompt, up to a token budget.
+
+The index stores unit vectors, so the dot product is the cosine similarity.
+Up to IVF_MIN_VECTORS it is searched exhaustively; above, it is an inverted
+file: k-means cells over the vectors, of which the IVF_PROBES closest to the
+query are searched. The cells are trained again each time the index doubled.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from voice_dialogue.archive import MessageArchive
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+# Rough size of a token of the local LLM, for the prompt budget
+CHARS_PER_TOKEN = 4
+MAX_SNIPPET_CHARS = 600
+# Past messages less similar than this to the query are not recalled
+MIN_SIMILARITY = 0.35
+IVF_MIN_VECTORS = 4096
+IVF_PROBES = 8
+KMEANS_ITERATIONS = 8
+# Training sample per cell
+KMEANS_SAMPLE = 64
+EMBED_BATCH = 32
+
+
+class Embedder:
+    """Mean-pooled, normalized sentence embeddings from a transformers model on the CPU."""
+
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL) -> None:
+        from transformers import AutoModel, AutoTokenizer
+        self.model_name = model_name
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name).eval()
+        self.dim = self.model.config.hidden_size
+        # Queries on the reply path and the background indexing share the model
+        self._lock = threading.Lock()
+
+    def embed(self, texts: list) -> np.ndarray:
+        """(len(texts), dim) float32 unit vectors."""
+        with self._lock, torch.inference_mode():
+            batch = self.tokenizer(texts, padding=True, truncation=True, max_length=256, return_tensors="pt")
+            output = self.model(**batch).last_hidden_state
+            mask = batch["attention_mask"].unsqueeze(-1).to(output.dtype)
+            vectors = (output * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+            vectors = torch.nn.functional.normalize(vectors, dim=1)
+        return vectors.numpy().astype(np.float32)
+
+
+def kmeans(vectors: np.ndarray, cells: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """Spherical k-means; returns (cells, dim) unit centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), cells, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        members = np.zeros((cells, len(vectors)), dtype=np.float32)
+        members[assignments, np.arange(len(vectors))] = 1.0
+        sums = members @ vectors
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        # An empty cell is restarted at a random vector
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        norms[empty] = 1.0
+        centroids = sums / norms
+    return centroids.astype(np.float32)
+
+
+class VectorIndex:
+    """Unit vectors with message ids, kept in memory and appended to files in directory; thread-safe."""
+
+    def __init__(self, directory: Path, dim: int, model_name: str) -> None:
+        self.directory = directory
+        self.dim = dim
+        self._vectors_file = directory / "vectors.f32"
+        self._ids_file = directory / "ids.i64"
+        self._centroids_file = directory / "centroids.npy"
+        self._lock = threading.Lock()
+        directory.mkdir(parents=True, exist_ok=True)
+        info_file = directory / "index.json"
+        info = {"dim": dim, "model": model_name}
+        files_present = self._vectors_file.exists() and self._ids_file.exists()
+        if not files_present or not info_file.exists() or json.loads(info_file.read_text(encoding="utf-8")) != info:
+            # Vectors of another model cannot be compared with the new ones
+            for path in (self._vectors_file, self._ids_file, self._centroids_file):
+                path.unlink(missing_ok=True)
+            info_file.write_text(json.dumps(info), encoding="utf-8")
+        self._load()
+
+    def _load(self) -> None:
+        vectors = np.fromfile(self._vectors_file, dtype=np.float32) if self._vectors_file.exists() else np.empty(0)
+        ids = np.fromfile(self._ids_file, dtype=np.int64) if self._ids_file.exists() else np.empty(0)
+        # A write cut short leaves one file longer than the other
+        count = min(len(vectors) // self.dim, len(ids))
+        if len(vectors) != count * self.dim or len(ids) != count:
+            with self._vectors_file.open("ab") as f:
+                f.truncate(count * self.dim * 4)
+            with self._ids_file.open("ab") as f:
+                f.truncate(count * 8)
+        self.count = count
+        self._vectors = np.empty((max(1024, count * 2), self.dim), dtype=np.float32)
+        self._vectors[:count] = vectors[:count * self.dim].reshape(count, self.dim)
+        self._ids = np.empty(len(self._vectors), dtype=np.int64)
+        self._ids[:count] = ids[:count]
+        self._centroids = None
+        self._cells = np.empty(len(self._vectors), dtype=np.int32)
+        self._trained_count = 0
+        if self._centroids_file.exists() and count:
+            self._centroids = np.load(self._centroids_file)
+            self._cells[:count] = self._assign(self._vectors[:count])
+            self._trained_count = count
+
+    @property
+    def last_id(self) -> int:
+        with self._lock:
+            return int(self._ids[self.count - 1]) if self.count else 0
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray) -> None:
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            end = self.count + len(ids)
+            if end > len(self._vectors):
+                size = max(end, len(self._vectors) * 2)
+                self._vectors = np.resize(self._vectors, (size, self.dim))
+                self._ids = np.resize(self._ids, size)
+                self._cells = np.resize(self._cells, size)
+            self._vectors[self.count:end] = vectors
+            self._ids[self.count:end] = ids
+            if self._centroids is not None:
+                self._cells[self.count:end] = self._assign(vectors)
+            with self._vectors_file.open("ab") as f:
+                f.write(vectors.tobytes())
+            with self._ids_file.open("ab") as f:
+                f.write(ids.tobytes())
+            self.count = end
+            retrain = end >= IVF_MIN_VECTORS and end >= 2 * self._trained_count
+        if retrain:
+            self._train()
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)
+
+    def _train(self) -> None:
+        # The search keeps using the old cells while the new ones are computed
+        with self._lock:
+            count = self.count
+            vectors = self._vectors[:count]
+        start = time.perf_counter()
+        cells = max(16, int(np.sqrt(count)))
+        sample = vectors[np.random.default_rng(count).choice(count, min(count, cells * KMEANS_SAMPLE), replace=False)]
+        centroids = kmeans(sample, cells)
+        assignments = np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+        np.save(self._centroids_file, centroids)
+        with self._lock:
+            self._centroids = centroids
+            self._cells[:count] = assignments
+            # Vectors added during the training
+            if self.count > count:
+                self._cells[count:self.count] = self._assign(self._vectors[count:self.count])
+            self._trained_count = count
+        logging.info(f"Memory index: {cells} cells trained on {len(sample)} of {count} vectors "
+                     f"in {time.perf_counter() - start:.2f} s")
+
+    def search(self, query: np.ndarray, k: int, exhaustive: bool = False) -> list:
+        """[(message id, similarity)] of the k closest vectors, closest first."""
+        with self._lock:
+            count = self.count
+            if not count:
+                return []
+            vectors, ids = self._vectors[:count], self._ids[:count]
+            if self._centroids is not None and not exhaustive:
+                probes = np.argpartition(self._centroids @ query, -IVF_PROBES)[-IVF_PROBES:] \
+                    if len(self._centroids) > IVF_PROBES else np.arange(len(self._centroids))
+                rows = np.flatnonzero(np.isin(self._cells[:count], probes))
+                vectors, ids = vectors[rows], ids[rows]
+            scores = vectors @ query
+        k = min(k, len(scores))
+        if not k:
+            return []
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+
+class LongTermMemory:
+    """Embeds archived messages in the background and recalls the relevant ones for a query."""
+
+    def __init__(self, archive: MessageArchive, directory: Path, model_name: str = DEFAULT_EMBEDDING_MODEL) -> None:
+        self.archive = archive
+        start = time.perf_counter()
+        self.embedder = Embedder(model_name)
+        self.index = VectorIndex(directory, self.embedder.dim, model_name)
+        logging.info(f"Long-term memory: {self.index.count} messages indexed, embedding model loaded in "
+                     f"{time.perf_counter() - start:.2f} s")
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="memory-index", daemon=True)
+        self._thread.start()
+
+    def add(self, message_id: int, text: str) -> None:
+        """Index an archived message (in the background)."""
+        self._queue.put((message_id, text))
+
+    def recall(self, query: str, exclude: set = frozenset(), k: int = 4, token_budget: int = 300) -> list:
+        """Archived messages closest to the query, as dicts, most similar first.
+
+        Messages whose text is in exclude (the context already holds them) are skipped;
+        the snippets together stay within token_budget.
+        """
+        if not query or not self.index.count:
+            return []
+        vector = self.embedder.embed([query])[0]
+        hits = [message_id for message_id, score in self.index.search(vector, k * 3) if score >= MIN_SIMILARITY]
+        recalled, budget = [], token_budget * CHARS_PER_TOKEN
+        for message in self.archive.get(hits):
+            if message["content"] in exclude:
+                continue
+            message["content"] = message["content"][:MAX_SNIPPET_CHARS]
+            if len(message["content"]) > budget:
+                continue
+            budget -= len(message["content"])
+            recalled.append(message)
+            if len(recalled) == k:
+                break
+        return recalled
+
+    def close(self) -> None:
+        self._queue.put(None)
+
+    def _run(self) -> None:
+        # Catch up with messages archived while memory was off or before the index existed
+        try:
+            while True:
+                messages = self.archive.after(self.index.last_id, EMBED_BATCH * 8)
+                if not messages:
+                    break
+                self._index_batch([(message["id"], message["content"]) for message in messages])
+        except Exception:
+            logging.exception("Error indexing the message archive:")
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            # Whatever arrived meanwhile goes into the same batch
+            while len(batch) < EMBED_BATCH:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._index_batch(batch)
+                    return
+                batch.append(item)
+            try:
+                self._index_batch(batch)
+            except Exception:
+                logging.exception("Error indexing messages:")
+
+    def _index_batch(self, batch: list) -> None:
+        # Messages already in the index (caught up before they were queued) are skipped
+        last_id = self.index.last_id
+        batch = [(message_id, text) for message_id, text in batch if message_id > last_id]
+        for offset in range(0, len(batch), EMBED_BATCH):
+            part = batch[offset:offset + EMBED_BATCH]
+            self.index.add([message_id for message_id, _ in part], self.embedder.embed([text for _, text in part]))
+
+
+def format_recalled(messages: list, strings: dict) -> str:
+    """Recalled messages as prompt lines: "[date] User: text"."""
+    return "\n".join(f"[{datetime.fromtimestamp(message['created']):%Y-%m-%d}] "
+                     f"{strings.get(message['role'] + '_label', message['role'])} {message['content']}"
+                     for message in messages)
@@ -0,0 +1,370 @@
+"""Table-driven text normalization for TTS.
+
+normalize() turns a piece of an assistant reply into text the TTS model can
+pronounce: numbers, units, dates, times and currencies are expanded into words,
+symbols are mapped or dropped through str.translate tables, and letters of any
+alphabet are kept. Together with the normalized text it returns an offset map:
+for every character of the result, the index of the character of the original
+text it was produced from, so the displayed text can follow the speech.
+
+All language specifics live in LANGUAGE_RULES; patterns are compiled once per
+language.
+"""
+import re
+from decimal import Decimal, InvalidOperation
+
+from num2words import num2words
+
+
+def _plural_en(value, forms: tuple) -> str:
+    return forms[0] if value == 1 else forms[1]
+
+
+def _plural_ru(value, forms: tuple) -> str:
+    # forms: (один километр, два километра, пять километров)
+    if value != int(value):
+        return forms[1]
+    n = int(value) % 100
+    if 11 <= n <= 14:
+        return forms[2]
+    if n % 10 == 1:
+        return forms[0]
+    if 2 <= n % 10 <= 4:
+        return forms[1]
+    return forms[2]
+
+
+def _date_en(rules: dict, year: int, month: int, day: int) -> str:
+    return (f"{rules['months'][month - 1]} {num2words(day, lang='en', to='ordinal')}, "
+            f"{num2words(year, lang='en', to='year')}")
+
+
+def _date_ru(rules: dict, year: int, month: int, day: int) -> str:
+    return (f"{num2words(day, lang='ru', to='ordinal', gender='n')} {rules['months'][month - 1]} "
+            f"{num2words(year, lang='ru', to='ordinal', case='genitive')} года")
+
+
+LANGUAGE_RULES = {
+    "en": {
+        "num2words": "en",
+        # Group separators inside numbers such as 1,000,000 and the decimal point
+        "number": r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?",
+        "thousands": ",",
+        "decimal": ".",
+        # Slash dates are month/day/year
+        "date": r"(?P<date_a>\d{1,2})/(?P<date_b>\d{1,2})/(?P<date_year>\d{4})",
+        "date_order": ("month", "day"),
+        "format_date": _date_en,
+        "ordinal_suffix": r"st|nd|rd|th",
+        "minus": "minus",
+        "plural": _plural_en,
+        "months": ["January", "February", "March", "April", "May", "June", "July",
+                   "August", "September", "October", "November", "December"],
+        "currencies": {"$": "USD", "€": "EUR", "£": "GBP", "₽": "RUB"},
+        "percent": ("percent", "percent"),
+        # unit: (singular, plural)
+        "units": {
+            "km/h": ("kilometer per hour", "kilometers per hour"),
+            "mph": ("mile per hour", "miles per hour"),
+            "km": ("kilometer", "kilometers"),
+            "cm": ("centimeter", "centimeters"),
+            "mm": ("millimeter", "millimeters"),
+            "m": ("meter", "meters"),
+            "kg": ("kilogram", "kilograms"),
+            "mg": ("milligram", "milligrams"),
+            "g": ("gram", "grams"),
+            "ml": ("milliliter", "milliliters"),
+            "l": ("liter", "liters"),
+            "ms": ("millisecond", "milliseconds"),
+            "sec": ("second", "seconds"),
+            "min": ("minute", "minutes"),
+            "h": ("hour", "hours"),
+            "°C": ("degree Celsius", "degrees Celsius"),
+            "°F": ("degree Fahrenheit", "degrees Fahrenheit"),
+            "°": ("degree", "degrees"),
+            "TB": ("terabyte", "terabytes"),
+            "GB": ("gigabyte", "gigabytes"),
+            "MB": ("megabyte", "megabytes"),
+            "KB": ("kilobyte", "kilobytes"),
+            "GHz": ("gigahertz", "gigahertz"),
+            "MHz": ("megahertz", "megahertz"),
+            "kW": ("kilowatt", "kilowatts"),
+            "W": ("watt", "watts"),
+        },
+        "symbols": {
+            "&": " and ", "+": " plus ", "=": " equals ", "@": " at ", "%": " percent ",
+            "/": " ", "\\": " ", "…": ".", "—": ", ", "–": ", ", "(": ", ", ")": ", ",
+        },
+    },
+    "ru": {
+        "num2words": "ru",
+        # Группы разрядов отделяются пробелом (1 000 000), дробная часть — запятой или точкой
+        "number": r"\d{1,3}(?:[  ]\d{3})+(?:,\d+)?|\d+(?:[.,]\d+)?",
+        "thousands": "  ",
+        "decimal": ",",
+        # Даты с точками записываются как день.месяц.год
+        "date": r"(?P<date_a>\d{1,2})\.(?P<date_b>\d{1,2})\.(?P<date_year>\d{4})",
+        "date_order": ("day", "month"),
+        "format_date": _date_ru,
+        "ordinal_suffix": None,
+        "minus": "минус",
+        "plural": _plural_ru,
+        "months": ["января", "февраля", "марта", "апреля", "мая", "июня", "июля",
+                   "августа", "сентября", "октября", "ноября", "декабря"],
+        "currencies": {"$": "USD", "€": "EUR", "£": "GBP", "₽": "RUB"},
+        "percent": ("процент", "процента", "процентов"),
+        # единица: (одна, две, пять) + род числительного
+        "units": {
+            "км/ч": ("километр в час", "километра в час", "километров в час"),
+            "км": ("километр", "километра", "километров"),
+            "см": ("сантиметр", "сантиметра", "сантиметров"),
+            "мм": ("миллиметр", "миллиметра", "миллиметров"),
+            "м": ("метр", "метра", "метров"),
+            "кг": ("килограмм", "килограмма", "килограммов"),
+            "мг": ("миллиграмм", "миллиграмма", "миллиграммов"),
+            "мл": ("миллилитр", "миллилитра", "миллилитров"),
+            "л": ("литр", "литра", "литров"),
+            "мс": ("миллисекунда", "миллисекунды", "миллисекунд", "f"),
+            "сек": ("секунда", "секунды", "секунд", "f"),
+            "мин": ("минута", "минуты", "минут", "f"),
+            "ч": ("час", "часа", "часов"),
+            "°C": ("градус Цельсия", "градуса Цельсия", "градусов Цельсия"),
+            "°": ("градус", "градуса", "градусов"),
+            "ТБ": ("терабайт", "терабайта", "терабайт"),
+            "ГБ": ("гигабайт", "гигабайта", "гигабайт"),
+            "МБ": ("мегабайт", "мегабайта", "мегабайт"),
+            "КБ": ("килобайт", "килобайта", "килобайт"),
+            "ГГц": ("гигагерц", "гигагерца", "гигагерц"),
+            "МГц": ("мегагерц", "мегагерца", "мегагерц"),
+            "кВт": ("киловатт", "киловатта", "киловатт"),
+            "Вт": ("ватт", "ватта", "ватт"),
+        },
+        "symbols": {
+            "&": " и ", "+": " плюс ", "=": " равно ", "@": " собака ", "%": " процентов ",
+            "/": " ", "\\": " ", "…": ".", "—": ", ", "–": ", ", "(": ", ", ")": ", ",
+        },
+    },
+}
+
+# Punctuation passed to TTS unchanged; any other symbol without a rule is dropped
+KEPT_PUNCTUATION = ".,!?;:'-"
+SENTENCE_PUNCTUATION = ".,!?;:"
+# Characters stripped from the end of the normalized text
+TRAILING_CHARS = " ,!?;:"
+# Longer digit runs (phone numbers, ids) are read digit by digit
+MAX_NUMBER_DIGITS = 15
+# Number of spoken forms of number-like tokens memoized per language
+EXPANSION_CACHE_SIZE = 4096
+
+
+class _SymbolTable(dict):
+    """str.translate table that keeps KEPT_PUNCTUATION and drops unknown symbols."""
+
+    def __init__(self, symbols: dict) -> None:
+        super().__init__({ord(ch): text for ch, text in symbols.items()})
+
+    def __missing__(self, code: int):
+        value = code if chr(code) in KEPT_PUNCTUATION else None
+        self[code] = value
+        return value
+
+
+class _Builder:
+    """Accumulates normalized pieces with their offsets and collapses whitespace."""
+
+    def __init__(self) -> None:
+        self.parts = []
+        self.offsets = []
+        self.after_space = True
+
+    def add(self, text: str, start: int, exact: bool = False) -> None:
+        if not text:
+            return
+        self.parts.append(text)
+        if exact:
+            self.offsets.extend(range(start, start + len(text)))
+        else:
+            self.offsets.extend([start] * len(text))
+        self.after_space = text[-1] == " "
+
+    def space(self, start: int) -> None:
+        if not self.after_space:
+            self.add(" ", start)
+
+    def _trim_tail(self, chars: str) -> None:
+        while self.parts and self.parts[-1][-1] in chars:
+            self.parts[-1] = self.parts[-1][:-1]
+            self.offsets.pop()
+            if not self.parts[-1]:
+                self.parts.pop()
+        self.after_space = not self.parts or self.parts[-1][-1] == " "
+
+    def add_spaced(self, text: str, start: int, end: int) -> None:
+        """Add text that may carry padding spaces (symbol and number expansions)."""
+        core = text.strip()
+        if core[:1] and core[0] in SENTENCE_PUNCTUATION:
+            # Punctuation sticks to the preceding word; a comma never follows other punctuation
+            self._trim_tail(" ," if core[0] != "," else " ")
+            if core[0] == "," and self.parts and self.parts[-1][-1] in SENTENCE_PUNCTUATION:
+                core = core[1:]
+        elif text[:1] == " ":
+            self.space(start)
+        self.add(core, start)
+        if text[-1:] == " ":
+            self.space(end)
+
+    def result(self) -> tuple:
+        text = "".join(self.parts)
+        stripped = text.rstrip(TRAILING_CHARS)
+        return stripped, self.offsets[:len(stripped)]
+
+
+class Normalizer:
+    """Normalizer for one language, built from its LANGUAGE_RULES entry."""
+
+    def __init__(self, language: str) -> None:
+        self.language = language
+        self.rules = LANGUAGE_RULES[language]
+        rules = self.rules
+        number = rules["number"]
+        units = "|".join(re.escape(unit) for unit in sorted(rules["units"], key=len, reverse=True))
+        currencies = "".join(re.escape(symbol) for symbol in rules["currencies"])
+        amounts = [
+            rf"(?P<cur_before>[{currencies}])\s?(?P<cur_amount>{number})",
+            rf"(?P<cur_amount_after>{number})\s?(?P<cur_after>[{currencies}])",
+            rf"(?P<unit_amount>{number})\s?(?P<unit>{units})(?!\w)",
+            rf"(?P<pct_amount>{number})\s?%",
+        ]
+        if rules["ordinal_suffix"]:
+            amounts.append(rf"(?P<ordinal>\d+)(?:{rules['ordinal_suffix']})\b")
+        amounts.append(rf"(?P<number>{number})")
+        alternatives = [
+            r"(?P<iso_year>\d{4})-(?P<iso_month>\d{2})-(?P<iso_day>\d{2})\b",
+            rules["date"] + r"\b",
+            r"(?P<hours>\d{1,2}):(?P<minutes>\d{2})\b",
+            # A minus sign, not a hyphen or a dash inside a word, is spoken before any amount
+            r"(?P<minus>(?<![\w.])-)?(?:" + "|".join(amounts) + ")",
+            # Plain phrases (letters separated by single spaces) are copied in one piece
+            r"(?P<word>[^\W\d_]+(?: [^\W\d_]+)*)",
+            r"(?P<space>\s+)",
+            r"(?P<other>[^\w\s]|_)",
+        ]
+        self.token_re = re.compile("|".join(f"(?:{alt})" for alt in alternatives))
+        self.thousands_re = re.compile(f"[{re.escape(rules['thousands'])}]")
+        self.symbols = _SymbolTable(rules["symbols"])
+        self.plural = rules["plural"]
+        # The spoken form depends only on the matched text, so it can be memoized
+        self.expansions = {}
+
+    def _value(self, number: str):
+        """Parse a number token into int or Decimal."""
+        number = self.thousands_re.sub("", number)
+        if self.language == "ru":
+            number = number.replace(",", ".")
+        if "." in number:
+            try:
+                return Decimal(number)
+            except InvalidOperation:
+                return None
+        return int(number)
+
+    def _cardinal(self, value, **kwargs) -> str:
+        if isinstance(value, int) and len(str(value)) > MAX_NUMBER_DIGITS:
+            return " ".join(num2words(int(digit), lang=self.rules["num2words"]) for digit in str(value))
+        return num2words(value, lang=self.rules["num2words"], **kwargs)
+
+    def _currency(self, amount: str, symbol: str) -> str:
+        value = self._value(amount)
+        text = num2words(Decimal(value), lang=self.rules["num2words"], to="currency",
+                         currency=self.rules["currencies"][symbol])
+        if value == int(value):
+            # Drop the "zero cents" part of whole amounts
+            text = text.rsplit(", ", 1)[0]
+        return text
+
+    def _unit(self, amount: str, unit: str) -> str:
+        value = self._value(amount)
+        forms = self.rules["units"][unit]
+        kwargs = {"gender": forms[3]} if len(forms) > 3 and isinstance(value, int) else {}
+        return f"{self._cardinal(value, **kwargs)} {self.plural(value, forms)}"
+
+    def _expand(self, match) -> str:
+        """Return the spoken form of a number-like token."""
+        groups = match.groupdict()
+        if groups["iso_year"]:
+            year, month, day = int(groups["iso_year"]), int(groups["iso_month"]), int(groups["iso_day"])
+        elif groups["date_year"]:
+            parts = dict(zip(self.rules["date_order"], (int(groups["date_a"]), int(groups["date_b"]))))
+            year, month, day = int(groups["date_year"]), parts["month"], parts["day"]
+        else:
+            year = None
+        if year is not None:
+            if 1 <= month <= 12 and 1 <= day <= 31:
+                return self.rules["format_date"](self.rules, year, month, day)
+            return " ".join(self._cardinal(int(part)) for part in re.findall(r"\d+", match.group()))
+        if groups["hours"]:
+            hours, minutes = int(groups["hours"]), int(groups["minutes"])
+            if minutes == 0:
+                return self._cardinal(hours)
+            if minutes < 10 and self.language == "en":
+                return f"{self._cardinal(hours)} oh {self._cardinal(minutes)}"
+            return f"{self._cardinal(hours)} {self._cardinal(minutes)}"
+        if groups["cur_before"]:
+            text = self._currency(groups["cur_amount"], groups["cur_before"])
+        elif groups["cur_after"]:
+            text = self._currency(groups["cur_amount_after"], groups["cur_after"])
+        elif groups["unit"]:
+            text = self._unit(groups["unit_amount"], groups["unit"])
+        elif groups["pct_amount"]:
+            value = self._value(groups["pct_amount"])
+            text = f"{self._cardinal(value)} {self.plural(value, self.rules['percent'])}"
+        elif groups.get("ordinal"):
+            text = num2words(int(groups["ordinal"]), lang=self.rules["num2words"], to="ordinal")
+        else:
+            value = self._value(groups["number"])
+            if value is None:
+                return match.group()
+            text = self._cardinal(value)
+        return f"{self.rules['minus']} {text}" if groups["minus"] else text
+
+    def normalize(self, text: str) -> tuple:
+        """Return (normalized_text, offsets) where offsets[i] indexes the original text."""
+        builder = _Builder()
+        for match in self.token_re.finditer(text):
+            kind = match.lastgroup
+            start, end = match.span()
+            if kind == "word":
+                builder.add(match.group(), start, exact=True)
+            elif kind == "space":
+                if "\n" in match.group():
+                    # Pause at line breaks, e.g. between list items
+                    builder.add_spaced(", ", start, end)
+                else:
+                    builder.space(start)
+            elif kind == "other":
+                builder.add_spaced(match.group().translate(self.symbols), start, end)
+            else:
+                token = match.group()
+                spoken = self.expansions.get(token)
+                if spoken is None:
+                    spoken = f" {self._expand(match)} "
+                    if len(self.expansions) < EXPANSION_CACHE_SIZE:
+                        self.expansions[token] = spoken
+                builder.add_spaced(spoken, start, end)
+        return builder.result()
+
+
+_normalizers = {}
+
+
+def get_normalizer(language: str) -> Normalizer:
+    """Return the cached Normalizer for a language."""
+    normalizer = _normalizers.get(language)
+    if normalizer is None:
+        normalizer = _normalizers[language] = Normalizer(language)
+    return normalizer
+
+
+def normalize(text: str, language: str) -> tuple:
+    """Normalize text for TTS in the given language; see Normalizer.normalize."""
+    return get_normalizer(language).normalize(text)
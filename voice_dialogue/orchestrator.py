@@ -0,0 +1,263 @@
+"""Asyncio orchestration of dialogue turns.
+
+TurnOrchestrator runs an asyncio event loop on its own thread and drives the
+VoiceEngine stages (capture -> Whisper -> LLM -> TTS) as tasks. Blocking stage
+calls run on a small fixed pool of worker threads instead of a new thread per
+action. The reply is spoken while it is still being generated: complete
+sentences go from the LLM stage to the speech stage through a bounded queue, so
+when synthesis falls behind the text accumulates into longer pieces instead of
+the LLM being throttled. With barge-in enabled the microphone is monitored
+during the reply; when the user starts talking the reply is interrupted and the
+capture continues into the next turn.
+
+The Qt app does not need qasync: it calls the thread-safe methods below from the
+GUI thread and gets everything back as engine events through a queued signal,
+so no widget is touched from the loop or the workers.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import suppress
+
+from voice_dialogue.engine import IDLE, RECORDING, VoiceEngine
+from voice_dialogue.profiles import get_profile
+from voice_dialogue.segmentation import complete_prefix_end
+
+# The LLM stream, the speech stage, the barge-in listener and a capture may run at the same time
+STAGE_WORKERS = 4
+# Pieces of the reply waiting for synthesis; more text waits in the sentence stage
+SPEECH_QUEUE_SIZE = 1
+
+
+class TurnOrchestrator:
+    def __init__(self, engine: VoiceEngine, speech_queue_size: int = SPEECH_QUEUE_SIZE) -> None:
+        self.engine = engine
+        self.speech_queue_size = speech_queue_size
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(ThreadPoolExecutor(STAGE_WORKERS, thread_name_prefix="voice-stage"))
+        # Turns run one at a time
+        self._turn_lock = asyncio.Lock()
+        # Model loads take long; they get their own thread so the stage workers stay free
+        self._swap_executor = ThreadPoolExecutor(1, thread_name_prefix="model-swap")
+        self._thread = threading.Thread(target=self.loop.run_forever, name="voice-orchestrator", daemon=True)
+        self._thread.start()
+
+    # --- Thread-safe API ---
+    def text_turn(self, text: str) -> Future:
+        """Answer typed text; the future resolves to the reply."""
+        return self._submit(self._run_turn(text=text))
+
+    def audio_turn(self, audio_path: str) -> Future:
+        """Answer a recorded WAV file; the future resolves to the reply ("" if nothing was heard)."""
+        return self._submit(self._run_turn(audio_path=audio_path))
+
+    def voice_turn(self, max_duration: int = None) -> Future:
+        """Record from the microphone and answer the recording."""
+        return self._submit(self._run_turn(record=True, max_duration=max_duration))
+
+    def record_voice_sample(self) -> Future:
+        return self._submit(self._record_voice_sample())
+
+    def swap_models(self, tts_model: str = None, whisper_model: str = None) -> Future:
+        """Load the selected models in the background and put them in service between turns."""
+        return self._submit(self._swap_models(tts_model, whisper_model))
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Cancel running turns and stop the event loop."""
+        if not self.loop.is_running():
+            return
+        with suppress(Exception):
+            self._submit(self._cancel_all()).result(timeout)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+
+    def _submit(self, coroutine) -> Future:
+        # Cancelling the returned future cancels the task on the loop
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        future.add_done_callback(self._log_failure)
+        return future
+
+    @staticmethod
+    def _log_failure(future: Future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logging.error("Error during dialogue turn:", exc_info=future.exception())
+
+    async def _cancel_all(self) -> None:
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # --- Turns ---
+    async def _run_turn(self, text: str = None, audio_path: str = None, record: bool = False,
+                        max_duration: int = None) -> str:
+        async with self._turn_lock:
+            engine = self.engine
+            recording = self._blocking(engine.record, max_duration) if record else None
+            kind = "voice" if record else "audio" if audio_path is not None else "text"
+            barge_in_at = None
+            try:
+                # A reply interrupted by the user ends with a recording, which is answered right away
+                while True:
+                    recorded = None
+                    trace = engine.tracer.begin_turn(kind)
+                    engine.profiler.begin_turn(f"turn-{trace.turn_id:04d}-{kind}",
+                                               engine.backend.settings.get("profiling", "off"))
+                    if barge_in_at is not None:
+                        engine.tracer.mark("record_start", barge_in_at)
+                    try:
+                        if recording is not None:
+                            recorded = audio_path = await recording
+                            if not audio_path:
+                                return ""
+                        language = engine.backend.language
+                        if audio_path is not None:
+                            text = await self._blocking(engine.transcribe, audio_path)
+                            language = engine.backend.reply_language
+                        if not text:
+                            return ""
+                        reply, recording, barge_in_at = await self._reply_and_speak(text, language)
+                        if recording is None:
+                            return reply
+                        text = audio_path = None
+                        kind = "barge_in"
+                    finally:
+                        engine.tracer.end_turn()
+                        engine.profiler.end_turn()
+                        if recorded:
+                            with suppress(Exception):
+                                os.remove(recorded)
+            finally:
+                engine.set_state(IDLE)
+
+    async def _record_voice_sample(self) -> None:
+        async with self._turn_lock:
+            self.engine.set_state(RECORDING)
+            try:
+                await self._blocking(self.engine.backend.record_voice_sample)
+            finally:
+                self.engine.set_state(IDLE)
+
+    async def _swap_models(self, tts_model: str, whisper_model: str) -> dict:
+        report = await self.loop.run_in_executor(self._swap_executor, self.engine.prepare_models,
+                                                 tts_model, whisper_model)
+        if report["loaded"]:
+            # Between turns, so a reply is never spoken by two voices
+            async with self._turn_lock:
+                await self.loop.run_in_executor(None, self.engine.commit_models, report)
+        return report
+
+    async def _reply_and_speak(self, text: str, language: str) -> tuple:
+        """Answer text; returns (reply, None, None), or ("", recording task, perf_counter time of the
+        interruption) if the user interrupted the reply."""
+        backend = self.engine.backend
+        backend.stop_event.clear()
+        answer = asyncio.ensure_future(self._reply_pipeline(text, language))
+        if not (self.engine.play_audio and backend.settings.get("barge_in", False)):
+            return await answer, None, None
+
+        stop_listening = threading.Event()
+        listener = asyncio.ensure_future(self._blocking(backend.listen_for_barge_in, stop_listening))
+        tasks = [answer, listener]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            stop_listening.set()
+            capture = await listener
+            if capture is None:
+                return await answer, None, None
+            # Keep capturing on the listener's stream while the interrupted reply winds down
+            interrupted_at = time.perf_counter()
+            self.engine.interrupt()
+            recording = asyncio.ensure_future(self._blocking(self.engine.record, None, capture))
+            tasks.append(recording)
+            await asyncio.gather(answer, return_exceptions=True)
+            self.engine.set_state(RECORDING)
+            return "", recording, interrupted_at
+        except asyncio.CancelledError:
+            stop_listening.set()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def _reply_pipeline(self, text: str, language: str) -> str:
+        """Run the LLM and speech stages concurrently, connected by queues."""
+        tokens = asyncio.Queue()
+        pieces = asyncio.Queue(maxsize=self.speech_queue_size)
+
+        def on_token(token: str) -> None:
+            # Called on the LLM worker thread
+            self.loop.call_soon_threadsafe(tokens.put_nowait, token)
+
+        llm = asyncio.ensure_future(self._blocking(self.engine.reply, text, language, on_token))
+        llm.add_done_callback(lambda _: tokens.put_nowait(None))
+        speech = asyncio.ensure_future(self._speech_stage(pieces, language))
+        try:
+            await self._sentence_stage(tokens, pieces, llm, language)
+            await speech
+            return llm.result()
+        finally:
+            for task in (llm, speech):
+                task.cancel()
+            await asyncio.gather(llm, speech, return_exceptions=True)
+
+    async def _sentence_stage(self, tokens: asyncio.Queue, pieces: asyncio.Queue, llm: asyncio.Future,
+                              language: str) -> None:
+        """Cut the streamed reply into complete sentences for the speech stage.
+
+        A piece is handed over only when the speech stage has room for it, so while
+        synthesis is busy the sentences keep accumulating into one longer piece.
+        """
+        abbreviations = get_profile(language or self.engine.backend.language)["abbreviations"]
+        reply = ""
+        consumed = 0
+        while True:
+            token = await tokens.get()
+            if token is None:
+                break
+            reply += token
+            if pieces.full():
+                continue
+            end = complete_prefix_end(reply, consumed, abbreviations)
+            if end > consumed:
+                piece = reply[consumed:end]
+                pieces.put_nowait(piece if consumed else piece.lstrip())
+                consumed = end
+        if not reply.strip() and llm.done() and not llm.cancelled() and llm.exception() is None:
+            # Nothing was streamed: an error message or an empty reply placeholder
+            reply, consumed = llm.result(), 0
+        rest = reply[consumed:].rstrip()
+        if rest.strip():
+            await pieces.put(rest if consumed else rest.lstrip())
+        await pieces.put(None)
+
+    async def _speech_stage(self, pieces: asyncio.Queue, language: str) -> None:
+        synthesis_times = []
+        started = False
+        try:
+            while True:
+                piece = await pieces.get()
+                if piece is None:
+                    break
+                if not started:
+                    self.engine.begin_speech()
+                    started = True
+                await self._blocking(self.engine.speak_part, piece, language, synthesis_times)
+        finally:
+            if started:
+                self.engine.finish_speech(synthesis_times)
+
+    async def _blocking(self, function, *args):
+        """Run a blocking stage call on the worker pool; cancelling it stops the turn."""
+        future = self.loop.run_in_executor(None, self.engine.profiler.run, function.__name__, function, *args)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # A worker thread cannot be interrupted; raise the stop flags and wait for it to notice
+            self.engine.backend.stop_event.set()
+            self.engine.backend.cancel_record_event.set()
+            await asyncio.gather(future, return_exceptions=True)
+            raise
@@ -0,0 +1,269 @@
+"""Per-language profiles of the voice dialogue.
+
+A profile holds everything that differs between language builds: the Whisper
+(ASR) and XTTS (TTS) language codes, the normalization rules, the enchant
+dictionary, sentence segmentation data, the summary prompt and the UI strings.
+The models themselves are multilingual, so switching profiles never reloads them.
+"""
+
+PROFILES = {
+    "en": {
+        "name": "English",
+        "asr_language": "en",
+        "tts_language": "en",
+        # Key of voice_dialogue.normalization.LANGUAGE_RULES
+        "normalization": "en",
+        "dictionary": "en_US",
+        "icon": "LM Studio Voice Dialogue.ico",
+        "warm_up_text": "Hello, I am ready.",
+        "segment_max_chars": 250,
+        # Abbreviations whose trailing dot does not end a sentence (lowercase, without the final dot)
+        "abbreviations": frozenset({
+            "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e", "cf",
+            "no", "fig", "approx", "inc", "ltd", "co", "jan", "feb", "mar", "apr", "jun", "jul",
+            "aug", "sep", "sept", "oct", "nov", "dec", "a.m", "p.m", "u.s", "u.k"
+        }),
+        "summary_prompt": (
+            "Based on the data from our messages, create a structured summary of all information about me (the User). "
+            "Follow the template below: "
+            "1. About me: name, age, place of residence, profession, interests, hobbies, achievements, goals, key personality traits. "
+            "2. Family and relatives: status, names, age, place of residence, important details, events and memories. "
+            "3. Friends, close ones, important acquaintances: names, ages, place of residence, important events, and key details. "
+            "4. Emotions: significant emotions and feelings related to important events. "
+            "5. Conversations: main topics of discussion, important moments and details, general conclusions. "
+            "6. Instructions and preferences: special instructions, preferences, favorite things. "
+            "7. Values and beliefs: important principles, views, and beliefs. "
+            "8. Special Information: Enter specific details here that do not fit within any templates. "
+            "Important: This resume is for your long-term memory and should not be discussed during our conversations. "
+            "Be especially careful with the information from points 1,2,3,4,6,7, never lose it."
+        ),
+        # Put before the past messages recalled from the archive for a reply
+        "memory_prompt": (
+            "Earlier messages of our conversation that may be relevant to my next message. "
+            "Use them if they help, do not mention that they were recalled:"
+        ),
+        "strings": {
+            "title": "LM Studio Voice Dialogue",
+            "user_label": "User:",
+            "assistant_label": "Assistant:",
+            "system_label": "System:",
+            "placeholder": "Enter text here...",
+            "send": "Send",
+            "record": "Record audio",
+            "stop_recording": "Stop recording",
+            "cancel_recording": "Cancel recording",
+            "voice_sample": "Voice sample",
+            "stop_generation": "Stop voice synthesis",
+            "settings": "Settings",
+            "ready": "Ready to work!",
+            "search_placeholder": "Search the conversation...",
+            "search_no_results": "Nothing found.",
+            "synthesizing": "Synthesizing voice...",
+            "wait_synthesis": "Please wait for voice synthesis to complete!",
+            "wait_recording": "Please wait for voice synthesis to complete or recording is already in progress!",
+            "recording": "Recording in progress, please speak...",
+            "recording_stopped": "Recording stopped.",
+            "recording_canceled": "Recording canceled.",
+            "voice_sample_started": "Voice sample recording started...",
+            "no_synthesis": "No active voice synthesis to stop.",
+            "synthesis_stopped": "Voice synthesis stopped.",
+            "restart_needed": "Some settings changes will be applied after restarting the application.",
+            "models_loading": "Loading the selected model in the background; the current one stays in use until it is ready.",
+            "models_swapped": "Now using {models}.",
+            "models_peak_memory": "Peak memory while loading: {rss:.0f} MB.",
+            "models_swap_failed": "Could not load the selected model: {error}",
+            "empty_reply": "Empty response.",
+            "reply_error": "Error generating reply.",
+            "general_group": "General Settings",
+            "text_size": "Text size:",
+            "tts_model": "Speech synthesis model:",
+            "whisper_model": "Recognition model:",
+            "summary_interval": "Messages before summary:",
+            "auto": "Auto",
+            "cpu_threads": "CPU threads:",
+            "int8": "Int8 synthesis on CPU:",
+            "inference_process": "Run models in a separate process:",
+            "language": "Language:",
+            "auto_detect": "Detect language from speech:",
+            "barge_in": "Interrupt replies by talking:",
+            "profiling": "Profile turns:",
+            "profiling_modes": {"off": "Off", "cprofile": "Python (cProfile)", "torch": "Python + torch"},
+            "colors_group": "Color Settings",
+            "choose_color": "Choose color",
+            "hotkeys_group": "Hotkeys",
+            "color_labels": {
+                "text_input_bg": "Input field background",
+                "text_input_text": "Input field text color",
+                "chat_bg": "Chat area background",
+                "system_log_bg": "System log background",
+                "system_log_text": "System log text color",
+                "button_bg": "Button background",
+                "button_text": "Button text color",
+                "button_hover_color": "Button hover color",
+                "panel_bg": "Panel background",
+                "window_bg": "Main window background",
+                "system_label_color": "'System:' label color",
+                "system_content_color": "'System:' text color",
+                "user_label_color": "'User:' label color",
+                "user_content_color": "'User:' text color",
+                "assistant_label_color": "'Assistant:' label color",
+                "chat_text": "'Assistant:' text color",
+                "scrollbar_handle_color": "Scrollbar handle color",
+                "scrollbar_track_color": "Scrollbar track color",
+            },
+            "hotkey_labels": {
+                "record_audio": "Record audio:",
+                "stop_recording": "Stop recording:",
+                "cancel_recording": "Cancel recording:",
+                "record_voice_sample": "Voice sample:",
+                "stop_generation": "Stop voice synthesis:",
+                "send_text": "Send:",
+            },
+            "latency": "Latency p50/p95",
+            "latency_labels": {
+                "response": "response",
+                "asr": "ASR",
+                "recall": "recall",
+                "first_token": "first token",
+                "first_sentence": "first sentence",
+                "summary": "summary",
+            },
+        },
+    },
+    "ru": {
+        "name": "Русский",
+        "asr_language": "ru",
+        "tts_language": "ru",
+        "normalization": "ru",
+        "dictionary": "ru_RU",
+        "icon": "LM Studio Голосовой диалог.ico",
+        "warm_up_text": "Привет, я готов.",
+        # Russian words are longer, and XTTS degrades sooner on long Russian inputs
+        "segment_max_chars": 180,
+        "abbreviations": frozenset({
+            "т.е", "т.д", "т.п", "т.к", "т.н", "и.о", "н.э", "др", "пр", "г", "гг", "в", "вв", "им",
+            "ул", "д", "кв", "стр", "с", "см", "рис", "табл", "тыс", "млн", "млрд", "руб", "коп",
+            "мин", "сек", "напр", "англ", "проф", "акад", "доц", "св", "янв", "февр", "авг", "сент",
+            "окт", "нояб", "дек", "e.g", "i.e", "etc", "vs"
+        }),
+        "summary_prompt": (
+            "На основе данных из наших сообщений, создай структурированное резюме всей информации обо мне (Пользователе). "
+            "Следуй ниже приведенному шаблону: "
+            "1. Обо мне: имя, возраст, место проживания, профессия, интересы, хобби, достижения, цели, ключевые черты характера. "
+            "2. Семья и родственники: статус, имена, возраст, место проживания, важные детали, события и воспоминания. "
+            "3. Друзья, близкие, важные знакомые: имена, возраст, место проживания, важные события и ключевые детали. "
+            "4. Эмоции: значимые эмоции и чувства, связанные с важными событиями. "
+            "5. Разговоры: основные темы обсуждений, важные моменты и детали, общие выводы. "
+            "6. Указания и предпочтения: особые инструкции, предпочтения, любимые вещи. "
+            "7. Ценности и убеждения: важные принципы, взгляды и убеждения. "
+            "8. Особая информация: вноси сюда особые детали не умещающиеся в рамки каких либо шаблонов. "
+            "Важно: это резюме предназначено для твоей долговременной памяти и не должно обсуждаться в процессе нашего общения. "
+            "Особенно внимательно относись к информации из пунктов 1,2,3,4,6,7, никогда не теряй ее."
+        ),
+        "memory_prompt": (
+            "Более ранние сообщения нашего разговора, которые могут относиться к моему следующему сообщению. "
+            "Используй их, если они помогают, не упоминай, что они были извлечены:"
+        ),
+        "strings": {
+            "title": "LM Studio Голосовой Диалог",
+            "user_label": "Пользователь:",
+            "assistant_label": "Ассистент:",
+            "system_label": "Система:",
+            "placeholder": "Введите текст здесь...",
+            "send": "Отправить",
+            "record": "Запись аудио",
+            "stop_recording": "Остановить запись",
+            "cancel_recording": "Отменить запись",
+            "voice_sample": "Голосовой образец",
+            "stop_generation": "Остановить озвучку",
+            "settings": "Настройки",
+            "ready": "Готов к работе!",
+            "search_placeholder": "Поиск по разговору...",
+            "search_no_results": "Ничего не найдено.",
+            "synthesizing": "Идет озвучка",
+            "wait_synthesis": "Ожидайте окончания озвучки!",
+            "wait_recording": "Ожидайте окончания озвучки или запись уже идет!",
+            "recording": "Идет запись, говорите...",
+            "recording_stopped": "Запись остановлена.",
+            "recording_canceled": "Запись отменена.",
+            "voice_sample_started": "Запись голосового образца началась...",
+            "no_synthesis": "Нет активной озвучки для остановки.",
+            "synthesis_stopped": "Озвучка остановлена.",
+            "restart_needed": "Некоторые изменения настроек будут применены после перезапуска приложения.",
+            "models_loading": "Выбранная модель загружается в фоне; до её готовности работает текущая.",
+            "models_swapped": "Используются модели: {models}.",
+            "models_peak_memory": "Пик памяти при загрузке: {rss:.0f} МБ.",
+            "models_swap_failed": "Не удалось загрузить выбранную модель: {error}",
+            "empty_reply": "Пустой ответ.",
+            "reply_error": "Ошибка генерации ответа.",
+            "general_group": "Общие настройки",
+            "text_size": "Размер текста:",
+            "tts_model": "Модель синтеза речи:",
+            "whisper_model": "Модель распознавания:",
+            "summary_interval": "Сообщений до резюме:",
+            "auto": "Авто",
+            "cpu_threads": "Потоков CPU:",
+            "int8": "Синтез int8 на CPU:",
+            "inference_process": "Модели в отдельном процессе:",
+            "language": "Язык:",
+            "auto_detect": "Определять язык по речи:",
+            "barge_in": "Прерывать ответ голосом:",
+            "profiling": "Профилирование ходов:",
+            "profiling_modes": {"off": "Выкл.", "cprofile": "Python (cProfile)", "torch": "Python + torch"},
+            "colors_group": "Цветовые настройки",
+            "choose_color": "Выберите цвет",
+            "hotkeys_group": "Горячие клавиши",
+            "color_labels": {
+                "text_input_bg": "Фон поля ввода",
+                "text_input_text": "Цвет текста поля ввода",
+                "chat_bg": "Фон области чата",
+                "system_log_bg": "Фон системного лога",
+                "system_log_text": "Цвет текста системного лога",
+                "button_bg": "Фон кнопок",
+                "button_text": "Цвет текста кнопок",
+                "button_hover_color": "Цвет выделения кнопок",
+                "panel_bg": "Фон панелей",
+                "window_bg": "Фон основного окна",
+                "system_label_color": "Цвет метки 'Система:'",
+                "system_content_color": "Цвет текста 'Система:'",
+                "user_label_color": "Цвет метки 'Пользователь:'",
+                "user_content_color": "Цвет текста 'Пользователь:'",
+                "assistant_label_color": "Цвет метки 'Ассистент:'",
+                "chat_text": "Цвет текста 'Ассистент:'",
+                "scrollbar_handle_color": "Цвет ползунка",
+                "scrollbar_track_color": "Цвет трека",
+            },
+            "hotkey_labels": {
+                "record_audio": "Запись аудио:",
+                "stop_recording": "Остановить запись:",
+                "cancel_recording": "Отменить запись:",
+                "record_voice_sample": "Голосовой образец:",
+                "stop_generation": "Остановить озвучку:",
+                "send_text": "Отправить:",
+            },
+            "latency": "Задержка p50/p95",
+            "latency_labels": {
+                "response": "ответ",
+                "asr": "распознавание",
+                "recall": "воспоминание",
+                "first_token": "первый токен",
+                "first_sentence": "первое предложение",
+                "summary": "резюме",
+            },
+        },
+    },
+}
+DEFAULT_LANGUAGE = "en"
+
+
+def get_profile(language: str) -> dict:
+    """Return the profile of a language code, falling back to the default language."""
+    return PROFILES.get(language, PROFILES[DEFAULT_LANGUAGE])
+
+
+def profile_for_asr_language(asr_language: str):
+    """Return the code of the profile whose Whisper language is asr_language, or None."""
+    for code, profile in PROFILES.items():
+        if profile["asr_language"] == asr_language:
+            return code
+    return None
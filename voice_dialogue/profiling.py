@@ -0,0 +1,149 @@
+"""Per-turn profiling of the dialogue stages.
+
+Off by default. With the "profiling" setting (or the VOICE_DIALOGUE_PROFILE
+environment variable, which takes precedence) set to "cprofile", every stage
+call of a turn (recording, transcribe_audio, generate_reply, speech synthesis
+and playback) is recorded with cProfile into one pstats file per turn, e.g.
+profiles/turn-0007-voice.prof (open with snakeviz or `python -m pstats`). From
+Python 3.12 cProfile works through sys.monitoring, which covers every thread
+but allows one profiler at a time, so one profiler runs for the whole turn and
+records the stages that overlap (the LLM and speech stages do); on older
+versions every stage call is profiled on its own thread and the profiles are
+merged. "torch" also records the model calls of the ASR and speech stages with
+torch.profiler, as Chrome traces; with inference_process the models run in the
+worker process, where nothing is recorded. The oldest files are deleted when
+the folder grows over its size cap. When profiling is off a stage call costs
+one attribute check.
+"""
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+PROFILE_ENV = "VOICE_DIALOGUE_PROFILE"
+MODES = ("off", "cprofile", "torch")
+# Stages that run the models; torch.profiler is process-wide, so one of them is recorded at a time
+MODEL_STAGES = frozenset({"transcribe", "speak_part"})
+# cProfile through sys.monitoring: one profiler for all threads
+PROCESS_WIDE = sys.version_info >= (3, 12)
+
+
+class TurnProfiler:
+    def __init__(self, directory: Path, max_megabytes: float = 200, models_in_worker: bool = False) -> None:
+        """models_in_worker: the models run in the inference worker, out of torch.profiler's reach."""
+        self.directory = directory
+        self.models_in_worker = models_in_worker
+        self.max_bytes = int(max_megabytes * 1024 * 1024)
+        # Mode of the running turn, None when it is not profiled
+        self.active = None
+        self._label = None
+        self._profiles = []
+        # The profiler of the running turn when it is process-wide
+        self._turn_profile = None
+        self._torch_traces = 0
+        self._lock = threading.Lock()
+        self._torch_lock = threading.Lock()
+
+    def begin_turn(self, label: str, mode: str = "off") -> None:
+        mode = os.environ.get(PROFILE_ENV) or mode
+        if mode == "1":
+            mode = "cprofile"
+        mode = mode if mode in MODES and mode != "off" else None
+        if mode == "torch" and self.models_in_worker:
+            logging.warning("Torch profiling does not reach the models in the inference worker; "
+                            "only cProfile is recorded (turn off \"Run models in a separate process\")")
+        with self._lock:
+            self._stop_turn_profile()
+            self._label = label
+            self._profiles = []
+            self._torch_traces = 0
+            self.active = mode
+            if mode is not None and PROCESS_WIDE:
+                profile = cProfile.Profile()
+                try:
+                    profile.enable()
+                    self._turn_profile = profile
+                except ValueError:
+                    # Another profiler (e.g. the app started under cProfile) holds sys.monitoring
+                    logging.warning(f"Another profiler is running; {label} is recorded without cProfile")
+
+    def _stop_turn_profile(self) -> None:
+        if self._turn_profile is not None:
+            self._turn_profile.disable()
+            self._profiles.append(self._turn_profile)
+            self._turn_profile = None
+
+    def end_turn(self) -> None:
+        """Write the merged profile of the turn and enforce the size cap."""
+        with self._lock:
+            self._stop_turn_profile()
+            label, profiles = self._label, self._profiles
+            # Stage calls still running now belong to no turn and are dropped
+            self.active, self._profiles = None, []
+        if not profiles:
+            return
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            pstats.Stats(*profiles).dump_stats(str(self.directory / f"{label}.prof"))
+            self._enforce_size_cap()
+        except Exception:
+            logging.exception("Error writing turn profile:")
+
+    def run(self, stage: str, function, *args):
+        """Call function(*args), profiled if a profiled turn is running."""
+        mode = self.active
+        if mode is None:
+            return function(*args)
+        record_torch = mode == "torch" and stage in MODEL_STAGES and not self.models_in_worker
+        torch_profile = self._torch_profile(stage) if record_torch else nullcontext()
+        if PROCESS_WIDE:
+            # Recorded by the profiler of the turn
+            with torch_profile:
+                return function(*args)
+        profile = cProfile.Profile()
+        profiles = self._profiles
+        profile.enable()
+        try:
+            with torch_profile:
+                return function(*args)
+        finally:
+            profile.disable()
+            with self._lock:
+                profiles.append(profile)
+
+    @contextmanager
+    def _torch_profile(self, stage: str):
+        if not self._torch_lock.acquire(blocking=False):
+            yield
+            return
+        try:
+            import torch
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            with torch.profiler.profile(activities=activities) as profile:
+                yield
+            with self._lock:
+                self._torch_traces += 1
+                path = self.directory / f"{self._label}-{stage}-{self._torch_traces}.torch.json"
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                profile.export_chrome_trace(str(path))
+            except Exception:
+                logging.exception("Error writing torch profile:")
+        finally:
+            self._torch_lock.release()
+
+    def _enforce_size_cap(self) -> None:
+        files = sorted((path for path in self.directory.iterdir() if path.is_file()),
+                       key=lambda path: path.stat().st_mtime)
+        total = sum(path.stat().st_size for path in files)
+        for path in files:
+            if total <= self.max_bytes:
+                break
+            total -= path.stat().st_size
+            path.unlink()
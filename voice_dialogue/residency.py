@@ -0,0 +1,263 @@
+"""Idle offloading of the speech models under a memory budget.
+
+ModelResidency keeps track of the models of a ModelHost: when each was last
+used and how much memory it takes on its device. A model that has been idle
+for model_idle_offload_seconds is offloaded, and when bringing a model back
+would take the models over model_memory_budget_mb, the least recently used
+idle ones are offloaded first. How a model is offloaded is set by
+model_offload_mode:
+
+  "unload"  drop the model; it is loaded from disk again when needed
+  "half"    keep the weights at float16, half the memory; they are converted
+            back to float32 when needed (the lost precision stays lost)
+  "cpu"     move the model from the GPU to system memory (GPU only)
+
+An offloaded model is brought back by the next call that uses it, or earlier
+by prefetch(): the engine prefetches Whisper when recording starts and the TTS
+model when transcription starts, so the reload runs while the user talks or
+the LLM answers. Every offload and reload is logged with its reason and time.
+"""
+import gc
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import torch
+
+OFFLOAD_MODES = ("unload", "half", "cpu")
+RESIDENT = "resident"
+# How often idle times and the budget are checked, at most
+CHECK_INTERVAL = 5.0
+RSS_SAMPLE_INTERVAL = 0.05
+
+
+def process_rss() -> int:
+    """Resident set size of this process in bytes, or None where it cannot be read."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def megabytes(size: int) -> float:
+    return None if size is None else round(size / (1024 * 1024), 1)
+
+
+class RssSampler:
+    """Samples the process RSS on a thread while the block runs; peak is in bytes (None if unknown)."""
+
+    def __init__(self) -> None:
+        self.before = self.peak = process_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def __enter__(self):
+        if self.before is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(RSS_SAMPLE_INTERVAL):
+            self.peak = max(self.peak, process_rss() or 0)
+
+
+def release_memory() -> None:
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+def module_bytes(model) -> int:
+    """Bytes of the parameters and buffers of a torch module; 0 for other objects."""
+    if not isinstance(model, torch.nn.Module):
+        return 0
+    tensors = {}
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        # Tied weights are counted once
+        tensors[tensor.data_ptr()] = tensor.numel() * tensor.element_size()
+    return sum(tensors.values())
+
+
+class _Slot:
+    def __init__(self, kind: str, name: str, model, load) -> None:
+        self.kind = kind
+        self.name = name
+        self.model = model
+        self.load = load
+        # RESIDENT or the offload mode the model is in
+        self.state = RESIDENT
+        # Size when resident
+        self.size = module_bytes(model)
+        self.users = 0
+        self.last_used = time.monotonic()
+        # Held while the model is offloaded or brought back
+        self.lock = threading.Lock()
+
+
+class ModelResidency:
+    """Offloads idle models and keeps the resident ones within the memory budget; thread-safe."""
+
+    def __init__(self, device: str, idle_seconds: float = 0, budget_mb: float = 0, mode: str = "unload") -> None:
+        self.device = device
+        self.idle_seconds = idle_seconds
+        self.budget = int(budget_mb * 1024 * 1024)
+        if mode not in OFFLOAD_MODES:
+            logging.warning(f"Unknown model offload mode {mode!r}, using 'unload'")
+            mode = "unload"
+        elif mode == "cpu" and device == "cpu":
+            logging.warning("Model offload mode 'cpu' needs a GPU, using 'unload'")
+            mode = "unload"
+        self.mode = mode
+        self._slots = {}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        if idle_seconds > 0 or self.budget:
+            interval = min(CHECK_INTERVAL, idle_seconds / 2) if idle_seconds > 0 else CHECK_INTERVAL
+            threading.Thread(target=self._watch, args=(interval,), name="model-residency", daemon=True).start()
+            idle = f"after {idle_seconds} s idle" if idle_seconds > 0 else "never when idle"
+            budget = f"memory budget {budget_mb} MB" if self.budget else "no memory budget"
+            logging.info(f"Model residency: offload ({mode}) {idle}, {budget}")
+
+    def add(self, kind: str, name: str, model, load) -> None:
+        """Manage a model; load(name) loads it again after it was unloaded."""
+        with self._lock:
+            self._slots[kind] = _Slot(kind, name, model, load)
+
+    def replace(self, kind: str, name: str, model) -> None:
+        """Put another model in service in place of the one of this kind, which is dropped."""
+        slot = self._slots[kind]
+        with slot.lock:
+            slot.name, slot.model, slot.state = name, model, RESIDENT
+            slot.size = module_bytes(model)
+            slot.last_used = time.monotonic()
+
+    def status(self) -> dict:
+        """{kind: (name, state, resident MB)} of the managed models."""
+        return {kind: (slot.name, slot.state, megabytes(slot.size)) for kind, slot in self._slots.items()}
+
+    @contextmanager
+    def use(self, kind: str):
+        """Yield the model of this kind, brought back first if it was offloaded; it is not offloaded while in use."""
+        slot = self._slots[kind]
+        with self._lock:
+            slot.users += 1
+        try:
+            self._restore(slot, "needed")
+            yield slot.model
+        finally:
+            with self._lock:
+                slot.users -= 1
+                slot.last_used = time.monotonic()
+
+    def prefetch(self, kind: str) -> None:
+        """Bring the model back in the background if it was offloaded, ahead of its use."""
+        slot = self._slots.get(kind)
+        if slot is None:
+            return
+        # Not offloaded again before the use it is fetched for
+        slot.last_used = time.monotonic()
+        if slot.state != RESIDENT:
+            threading.Thread(target=self._prefetch, args=(slot,), name="model-prefetch", daemon=True).start()
+
+    def close(self) -> None:
+        self._closed.set()
+
+    def _prefetch(self, slot: _Slot) -> None:
+        try:
+            self._restore(slot, "prefetch")
+        except Exception:
+            logging.exception(f"Error reloading {slot.kind} model:")
+
+    def _footprint(self, slot: _Slot) -> int:
+        """Memory the model takes on its device now."""
+        if slot.state == RESIDENT:
+            return slot.size
+        return slot.size // 2 if slot.state == "half" else 0
+
+    def _restore(self, slot: _Slot, reason: str) -> None:
+        if slot.state == RESIDENT:
+            return
+        with slot.lock:
+            if slot.state == RESIDENT:
+                return
+            self._make_room(slot)
+            start = time.perf_counter()
+            if slot.state == "unload":
+                slot.model = slot.load(slot.name)
+            elif slot.state == "half":
+                slot.model.float()
+            else:
+                slot.model.to(self.device)
+            offloaded, slot.state = slot.state, RESIDENT
+            slot.size = module_bytes(slot.model)
+            logging.info(f"Reloaded {slot.kind} model {slot.name} from {offloaded} in "
+                         f"{time.perf_counter() - start:.2f} s ({reason}, RSS {megabytes(process_rss())} MB)")
+
+    def _make_room(self, incoming: _Slot) -> None:
+        """Offload idle models, least recently used first, until the incoming one fits into the budget."""
+        if not self.budget:
+            return
+        others = sorted((slot for slot in self._slots.values() if slot is not incoming),
+                        key=lambda slot: slot.last_used)
+        for other in others:
+            if self._total() - self._footprint(incoming) + incoming.size <= self.budget:
+                return
+            self._try_offload(other, f"memory budget, making room for {incoming.kind}")
+        if self._total() - self._footprint(incoming) + incoming.size > self.budget:
+            logging.warning(f"Loading the {incoming.kind} model exceeds the memory budget of "
+                            f"{megabytes(self.budget)} MB")
+
+    def _total(self) -> int:
+        return sum(self._footprint(slot) for slot in self._slots.values())
+
+    def _try_offload(self, slot: _Slot, reason: str) -> bool:
+        # Never waits: a model being brought back or offloaded elsewhere is skipped
+        if not slot.lock.acquire(blocking=False):
+            return False
+        try:
+            with self._lock:
+                if slot.users or slot.state != RESIDENT:
+                    return False
+                # Users arriving from now on wait for slot.lock and bring the model back
+                slot.state = self.mode
+            start = time.perf_counter()
+            rss_before = process_rss()
+            if self.mode == "unload":
+                slot.model = None
+            elif self.mode == "half":
+                slot.model.half()
+            else:
+                slot.model.to("cpu")
+            release_memory()
+            logging.info(f"Offloaded {slot.kind} model {slot.name} ({self.mode}, {reason}) in "
+                         f"{time.perf_counter() - start:.2f} s: {megabytes(slot.size - self._footprint(slot))} MB "
+                         f"freed, RSS {megabytes(rss_before)} -> {megabytes(process_rss())} MB")
+            return True
+        finally:
+            slot.lock.release()
+
+    def _watch(self, interval: float) -> None:
+        while not self._closed.wait(interval):
+            now = time.monotonic()
+            for slot in list(self._slots.values()):
+                idle = now - slot.last_used
+                if self.idle_seconds > 0 and slot.state == RESIDENT and not slot.users and idle >= self.idle_seconds:
+                    self._try_offload(slot, f"idle for {idle:.0f} s")
+            if self.budget:
+                for slot in sorted(self._slots.values(), key=lambda slot: slot.last_used):
+                    if self._total() <= self.budget:
+                        break
+                    self._try_offload(slot, "over the memory budget")
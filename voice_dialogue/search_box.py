@@ -0,0 +1,106 @@
+"""Search box over the message archive.
+
+The query runs on a background thread once typing pauses (the archive may hold
+100k+ messages, and even a fast query should not take a frame from the GUI
+thread); results of a query that was superseded meanwhile are dropped. Picking
+a result emits messageChosen, which the window uses to jump to the message in
+the chat panel.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
+from PyQt6.QtWidgets import QLineEdit, QListWidget, QListWidgetItem, QVBoxLayout, QWidget
+
+# Pause in typing before the query runs
+DEBOUNCE_MS = 150
+RESULT_LIMIT = 50
+
+
+class SearchBox(QWidget):
+    resultsReady = pyqtSignal(int, str, list, float)
+    # (message dict, query)
+    messageChosen = pyqtSignal(dict, str)
+
+    def __init__(self, search, labels: dict, strings: dict, parent=None) -> None:
+        """search(query, limit) returns message dicts with a "snippet"; it is called off the GUI thread."""
+        super().__init__(parent)
+        self.search = search
+        self.labels = labels
+        self.strings = strings
+        self._generation = 0
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(4)
+        self.line_edit = QLineEdit()
+        self.line_edit.setClearButtonEnabled(True)
+        layout.addWidget(self.line_edit)
+        self.results = QListWidget()
+        self.results.setMaximumHeight(180)
+        self.results.hide()
+        layout.addWidget(self.results)
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(DEBOUNCE_MS)
+        self._timer.timeout.connect(self._start_search)
+        self.line_edit.textChanged.connect(self._timer.start)
+        self.line_edit.returnPressed.connect(self._start_search)
+        self.results.itemActivated.connect(self._on_item_activated)
+        self.results.itemClicked.connect(self._on_item_activated)
+        self.resultsReady.connect(self._on_results)
+        self.set_strings(labels, strings)
+
+    def set_strings(self, labels: dict, strings: dict) -> None:
+        """Change the role labels and the placeholder, e.g. after switching the UI language."""
+        self.labels = labels
+        self.strings = strings
+        self.line_edit.setPlaceholderText(strings["search_placeholder"])
+
+    def keyPressEvent(self, event) -> None:
+        if event.key() == Qt.Key.Key_Escape:
+            self.line_edit.clear()
+            return
+        super().keyPressEvent(event)
+
+    def _start_search(self) -> None:
+        self._timer.stop()
+        self._generation += 1
+        query = self.line_edit.text().lstrip()
+        if not query.strip():
+            self.results.clear()
+            self.results.hide()
+            return
+        threading.Thread(target=self._run_search, args=(self._generation, query), daemon=True).start()
+
+    def _run_search(self, generation: int, query: str) -> None:
+        start = time.perf_counter()
+        try:
+            hits = self.search(query, RESULT_LIMIT)
+        except Exception:
+            logging.exception("Error searching the message archive:")
+            hits = []
+        self.resultsReady.emit(generation, query, hits, time.perf_counter() - start)
+
+    def _on_results(self, generation: int, query: str, hits: list, seconds: float) -> None:
+        if generation != self._generation:
+            return
+        logging.debug(f"Search for {query!r}: {len(hits)} results in {seconds * 1000:.1f} ms")
+        self.results.clear()
+        if not hits:
+            item = QListWidgetItem(self.strings["search_no_results"])
+            item.setFlags(Qt.ItemFlag.NoItemFlags)
+            self.results.addItem(item)
+        for hit in hits:
+            label = self.labels.get(hit["role"], hit["role"])
+            item = QListWidgetItem(f"[{datetime.fromtimestamp(hit['created']):%Y-%m-%d}] {label} "
+                                   f"{' '.join(hit['snippet'].split())}")
+            item.setData(Qt.ItemDataRole.UserRole, (hit, query))
+            self.results.addItem(item)
+        self.results.show()
+
+    def _on_item_activated(self, item: QListWidgetItem) -> None:
+        data = item.data(Qt.ItemDataRole.UserRole)
+        if data is not None:
+            self.messageChosen.emit(*data)
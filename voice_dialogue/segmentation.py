@@ -0,0 +1,136 @@
+"""Sentence segmentation of assistant replies for TTS.
+
+segment_text() splits a reply into spans that index into the original text and
+groups sentences into synthesis calls with a simple cost model.
+"""
+import re
+
+SENTENCE_END_RE = re.compile(r"[.!?…]+[\"')\]]*(?=\s)")
+CLAUSE_BREAK_RE = re.compile(r"[,;:]\s|\s[—–-]\s")
+CODE_BLOCK_RE = re.compile(r"```.*?(?:```|$)", re.DOTALL)
+
+
+def _sentence_units(text: str, start: int, end: int, abbreviations: frozenset) -> list:
+    """Split text[start:end] into (start, end) spans of sentences; lines are never joined here."""
+    units = []
+    for line in re.finditer(r"[^\n]+", text[start:end]):
+        line_start = start + line.start()
+        line_text = line.group()
+        unit_start = 0
+        for match in SENTENCE_END_RE.finditer(line_text):
+            if match.group().startswith("."):
+                token = (line_text[unit_start:match.start()].split() or [""])[-1]
+                # Abbreviations, initials ("J. Smith") and list markers ("1. item") are not sentence ends
+                if token.lower() in abbreviations or (len(token) == 1 and token.isupper() and token != "I"):
+                    continue
+                if token.isdigit() and not line_text[:match.start() - len(token)].strip():
+                    continue
+            units.append((line_start + unit_start, line_start + match.end()))
+            unit_start = match.end()
+        if line_text[unit_start:].strip():
+            units.append((line_start + unit_start, line_start + len(line_text)))
+    # Trim surrounding whitespace from every unit
+    trimmed = []
+    for unit_start, unit_end in units:
+        chunk = text[unit_start:unit_end]
+        if chunk.strip():
+            unit_start += len(chunk) - len(chunk.lstrip())
+            unit_end -= len(chunk) - len(chunk.rstrip())
+            trimmed.append((unit_start, unit_end))
+    return trimmed
+
+
+def _split_long_unit(text: str, start: int, end: int, max_chars: int) -> list:
+    """Split a span longer than max_chars at clause boundaries, then at spaces."""
+    pieces = []
+    while end - start > max_chars:
+        window = text[start:start + max_chars]
+        cut = None
+        for match in CLAUSE_BREAK_RE.finditer(window):
+            # Do not produce tiny leading fragments
+            if match.start() >= max_chars // 3:
+                cut = match.start() + 1
+        if cut is None:
+            cut = window.rfind(" ")
+            if cut <= 0:
+                cut = max_chars
+        piece = text[start:start + cut].rstrip()
+        if piece:
+            pieces.append((start, start + len(piece)))
+        start += cut
+        while start < end and text[start].isspace():
+            start += 1
+    if start < end:
+        pieces.append((start, end))
+    return pieces
+
+
+def _merge_units(units: list, max_chars: int, call_overhead: float, quadratic_chars: float) -> list:
+    """Group consecutive units into synthesis calls with minimal total cost.
+
+    The cost of one synthesis call over a span of L characters is modelled as
+    call_overhead + L + L * L / quadratic_chars: every call pays a fixed overhead,
+    and very long inputs get disproportionately slower. Dynamic programming finds
+    the grouping with the lowest total cost where no group exceeds max_chars.
+    """
+    count = len(units)
+    best = [0.0] + [float("inf")] * count
+    previous = [0] * (count + 1)
+    for i in range(1, count + 1):
+        for j in range(i - 1, -1, -1):
+            length = units[i - 1][1] - units[j][0]
+            if length > max_chars and j < i - 1:
+                break
+            cost = best[j] + call_overhead + length + length * length / quadratic_chars
+            if cost < best[i]:
+                best[i] = cost
+                previous[i] = j
+    groups = []
+    i = count
+    while i > 0:
+        j = previous[i]
+        groups.append((units[j][0], units[i - 1][1]))
+        i = j
+    return groups[::-1]
+
+
+def segment_text(text: str, abbreviations: frozenset = frozenset(), max_chars: int = 250,
+                 call_overhead: float = 80.0, quadratic_chars: float = 400.0) -> list:
+    """Split text into (start, end, speakable) spans sized for TTS synthesis calls.
+
+    Spans index into the original text, so the displayed text and the text sent to
+    TTS always stay aligned. Code blocks are returned as non-speakable spans.
+    abbreviations come from the language profile.
+    """
+    segments = []
+    position = 0
+    blocks = [(m.start(), m.end()) for m in CODE_BLOCK_RE.finditer(text)] + [(len(text), len(text))]
+    for block_start, block_end in blocks:
+        units = []
+        for unit_start, unit_end in _sentence_units(text, position, block_start, abbreviations):
+            units.extend(_split_long_unit(text, unit_start, unit_end, max_chars))
+        if units:
+            segments.extend((s, e, True) for s, e in _merge_units(units, max_chars, call_overhead, quadratic_chars))
+        if block_end > block_start:
+            segments.append((block_start, block_end, False))
+        position = block_end
+    return segments
+
+
+def complete_prefix_end(text: str, start: int = 0, abbreviations: frozenset = frozenset()) -> int:
+    """Return where the complete sentences of a still growing text[start:] end, or start if there are none.
+
+    Used while a reply is streamed: the last sentence may still change until the
+    next one begins, and nothing is cut inside an unfinished code block.
+    """
+    limit = len(text)
+    fences = [m.start() for m in re.finditer("```", text)]
+    if len(fences) % 2:
+        limit = fences[-1]
+    if limit < len(text):
+        units = _sentence_units(text, start, limit, abbreviations)
+        return units[-1][1] if units else start
+    # Append a letter: the last sentence is complete only if it stays a separate unit
+    probe = text + "x"
+    units = _sentence_units(probe, start, len(probe), abbreviations)
+    return units[-2][1] if len(units) > 1 else start
@@ -0,0 +1,226 @@
+"""Spell-check highlighting for the message input.
+
+Word check results are kept in a bounded LRU cache, so re-highlighting text that
+was already seen costs a dictionary lookup per new word only. Each block stores
+its text and misspelled spans in its user data; when Qt asks to highlight a block
+whose text has not changed since the last pass with the same dictionary, the
+stored spans are re-applied without tokenizing or checking anything.
+
+Spelling suggestions never run on the GUI thread; see SpellCheckTextEdit.
+"""
+import itertools
+import logging
+import queue
+import re
+import threading
+from collections import OrderedDict
+
+import enchant
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
+from PyQt6.QtGui import QColor, QSyntaxHighlighter, QTextBlockUserData, QTextCharFormat, QTextCursor
+from PyQt6.QtWidgets import QMenu, QPlainTextEdit
+
+WORD_RE = re.compile(r"\b\w+\b")
+CHECK_CACHE_SIZE = 20000
+SUGGESTION_CACHE_SIZE = 2000
+MAX_SUGGESTIONS = 5
+# Prefetching waits until scrolling/typing pauses and is capped per pass
+PREFETCH_DELAY_MS = 200
+MAX_PREFETCH = 50
+
+
+def open_dictionary(tag: str):
+    """Open the enchant dictionary for a language tag such as en_US, or return None."""
+    try:
+        return enchant.Dict(tag)
+    except enchant.errors.DictNotFoundError:
+        logging.error(f"Dictionary for {tag} not found. Check the pyenchant installation and dictionary availability.")
+        return None
+
+
+class _BlockSpelling(QTextBlockUserData):
+    """Misspelled spans of a block, valid for its text and a dictionary generation."""
+
+    def __init__(self, text: str, generation: int, spans: list) -> None:
+        super().__init__()
+        self.text = text
+        self.generation = generation
+        self.spans = spans
+
+
+class SpellCheckHighlighter(QSyntaxHighlighter):
+    def __init__(self, document, dictionary=None, cache_size: int = CHECK_CACHE_SIZE) -> None:
+        super().__init__(document)
+        self.dictionary = dictionary
+        self.cache_size = cache_size
+        self.checked = OrderedDict()
+        # Bumped whenever the dictionary changes, so spans stored in blocks go stale
+        self.generation = 0
+        self.error_format = QTextCharFormat()
+        self.error_format.setUnderlineStyle(QTextCharFormat.UnderlineStyle.SingleUnderline)
+        self.error_format.setUnderlineColor(QColor("red"))
+
+    def set_dictionary(self, dictionary) -> None:
+        """Replace the dictionary, drop cached results and re-highlight the document."""
+        self.dictionary = dictionary
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """Forget cached results, e.g. after words were added to the dictionary."""
+        self.checked.clear()
+        self.generation += 1
+        self.rehighlight()
+
+    def is_misspelled(self, word: str) -> bool:
+        if not self.dictionary:
+            return False
+        correct = self.checked.get(word)
+        if correct is None:
+            correct = self.dictionary.check(word)
+            self.checked[word] = correct
+            if len(self.checked) > self.cache_size:
+                self.checked.popitem(last=False)
+        else:
+            self.checked.move_to_end(word)
+        return not correct
+
+    def highlightBlock(self, text):
+        if not self.dictionary:
+            return
+        data = self.currentBlockUserData()
+        if isinstance(data, _BlockSpelling) and data.generation == self.generation and data.text == text:
+            spans = data.spans
+        else:
+            spans = [(match.start(), match.end() - match.start())
+                     for match in WORD_RE.finditer(text) if self.is_misspelled(match.group())]
+            self.setCurrentBlockUserData(_BlockSpelling(text, self.generation, spans))
+        for start, length in spans:
+            self.setFormat(start, length, self.error_format)
+
+
+class SpellCheckTextEdit(QPlainTextEdit):
+    """Plain text input with spell-check highlighting and a suggestion menu on click.
+
+    Suggestions are computed on a worker thread with its own dictionary instance,
+    because enchant dictionaries must not be used from two threads at once. They
+    are cached per word and prefetched for misspellings in the visible area, so
+    the menu usually opens at once; otherwise it opens when the worker is done.
+    """
+    suggestionsReady = pyqtSignal(int, str, list)
+
+    def __init__(self, dictionary_factory=None, parent=None) -> None:
+        super().__init__(parent)
+        self.dictionary_factory = dictionary_factory
+        self.highlighter = SpellCheckHighlighter(self.document(), dictionary_factory() if dictionary_factory else None)
+        self.suggestions = OrderedDict()
+        self.requested = set()
+        self.requests = queue.PriorityQueue()
+        self.request_counter = itertools.count()
+        self.pending_click = None
+        self.suggestionsReady.connect(self._on_suggestions_ready)
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.setInterval(PREFETCH_DELAY_MS)
+        self.prefetch_timer.timeout.connect(self._prefetch_visible)
+        self.updateRequest.connect(lambda *_: self.prefetch_timer.start())
+        threading.Thread(target=self._suggestion_worker, daemon=True).start()
+
+    def set_dictionary_factory(self, dictionary_factory) -> None:
+        """Switch dictionaries; cached suggestions and queued requests are dropped."""
+        self.dictionary_factory = dictionary_factory
+        self.suggestions.clear()
+        self.requested.clear()
+        self.pending_click = None
+        self.highlighter.set_dictionary(dictionary_factory() if dictionary_factory else None)
+
+    # --- Suggestion worker ---
+    def _suggestion_worker(self) -> None:
+        dictionary = None
+        generation = None
+        while True:
+            _, _, request_generation, word = self.requests.get()
+            if request_generation != self.highlighter.generation:
+                continue
+            try:
+                if generation != request_generation:
+                    # Open a dictionary of our own whenever the GUI switched to a new one
+                    dictionary = self.dictionary_factory() if self.dictionary_factory else None
+                    generation = request_generation
+                suggestions = dictionary.suggest(word) if dictionary else []
+            except Exception:
+                logging.exception(f"Error computing spelling suggestions for '{word}':")
+                suggestions = []
+            self.suggestionsReady.emit(request_generation, word, suggestions[:MAX_SUGGESTIONS])
+
+    def request_suggestions(self, word: str, urgent: bool = False) -> None:
+        """Queue a word for the worker; urgent requests go ahead of prefetching."""
+        if word in self.suggestions or (word in self.requested and not urgent):
+            return
+        self.requested.add(word)
+        priority = 0 if urgent else 1
+        self.requests.put((priority, next(self.request_counter), self.highlighter.generation, word))
+
+    def _on_suggestions_ready(self, generation: int, word: str, suggestions: list) -> None:
+        if generation != self.highlighter.generation:
+            return
+        self.requested.discard(word)
+        self.suggestions[word] = suggestions
+        if len(self.suggestions) > SUGGESTION_CACHE_SIZE:
+            self.suggestions.popitem(last=False)
+        if self.pending_click and self.pending_click[0] == word:
+            _, cursor, position = self.pending_click
+            self.pending_click = None
+            self._show_suggestions(cursor, suggestions, position)
+
+    def _prefetch_visible(self) -> None:
+        """Request suggestions for misspelled words in the blocks on screen."""
+        block = self.firstVisibleBlock()
+        offset = self.contentOffset()
+        bottom = self.viewport().height()
+        requested = 0
+        while block.isValid() and requested < MAX_PREFETCH:
+            if self.blockBoundingGeometry(block).translated(offset).top() > bottom:
+                break
+            data = block.userData()
+            if isinstance(data, _BlockSpelling) and data.generation == self.highlighter.generation:
+                for start, length in data.spans:
+                    word = data.text[start:start + length]
+                    if word not in self.suggestions and word not in self.requested:
+                        self.request_suggestions(word)
+                        requested += 1
+            block = block.next()
+
+    # --- Menu ---
+    def _show_suggestions(self, cursor: QTextCursor, suggestions: list, position) -> None:
+        if not suggestions:
+            return
+        word = cursor.selectedText()
+        menu = QMenu(self)
+        menu.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        for suggestion in suggestions:
+            menu.addAction(suggestion)
+
+        def replace(action) -> None:
+            # The text may have changed while the menu was open
+            if cursor.selectedText() == word:
+                cursor.insertText(action.text())
+
+        menu.triggered.connect(replace)
+        menu.popup(position)
+
+    def mousePressEvent(self, event):
+        super().mousePressEvent(event)
+        self.pending_click = None
+        cursor = self.cursorForPosition(event.position().toPoint())
+        cursor.select(QTextCursor.SelectionType.WordUnderCursor)
+        word = cursor.selectedText()
+        if not word or not self.highlighter.is_misspelled(word):
+            return
+        position = event.globalPosition().toPoint()
+        suggestions = self.suggestions.get(word)
+        if suggestions is not None:
+            self.suggestions.move_to_end(word)
+            self._show_suggestions(cursor, suggestions, position)
+        else:
+            self.pending_click = (word, cursor, position)
+            self.request_suggestions(word, urgent=True)
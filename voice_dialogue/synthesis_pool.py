@@ -0,0 +1,257 @@
+"""Parallel sentence synthesis on the CPU.
+
+One XTTS call decodes a single sequence token by token: small matrix-vector
+products that stop getting faster beyond a few threads, so on a CPU-only
+machine with many cores most of them idle during a long reply. SynthesisPool
+runs several TTS-only worker processes, each with its own capped number of
+torch threads, and synthesizes the upcoming sentences of a reply at the same
+time; the engine plays the results in order. The workers load the model through
+the weight cache, so they share its pages instead of holding a copy each.
+
+Whole sentences are synthesized (no streaming), which trades the time to the
+first audio for throughput; that is why the mode is optional.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+
+import torch
+
+from voice_dialogue.inference import MAX_RESTARTS, RESTART_WINDOW, InferenceWorkerError, ModelHost
+from voice_dialogue.profiles import get_profile
+
+# Threads at which one XTTS call stops scaling well; the worker count is planned from it
+THREADS_PER_WORKER = 4
+
+
+def physical_cores() -> int:
+    try:
+        import psutil
+        cores = psutil.cpu_count(logical=False)
+    except ImportError:
+        cores = None
+    return cores or os.cpu_count() or 1
+
+
+def plan_workers(requested: int = 0, cores: int = None) -> tuple:
+    """(workers, torch threads per worker) for the cores; requested 0 derives the worker count from them."""
+    cores = cores or physical_cores()
+    workers = min(requested or max(1, cores // THREADS_PER_WORKER), cores)
+    return workers, max(1, cores // workers)
+
+
+def _serve(conn, settings: dict, speaker_wav: str, tts_factory, threads: int) -> None:
+    """Entry point of a worker process: load the TTS model and synthesize one sentence at a time."""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - synthesis - %(levelname)s - %(message)s")
+    torch.set_num_interop_threads(1)
+    # The pool offloads nothing: its workers exist to be busy
+    settings = dict(settings, tts_num_threads=threads, model_idle_offload_seconds=0, model_memory_budget_mb=0)
+    try:
+        host = ModelHost(settings, Path(speaker_wav), tts_factory, with_whisper=False)
+        # Warm up before taking requests, like the backend does with its own model
+        profile = get_profile(settings.get("language"))
+        host.synthesize(profile["warm_up_text"], profile["tts_language"])
+    except Exception:
+        conn.send(("error", traceback.format_exc()))
+        return
+    conn.send(("ready", host.sample_rate))
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            return
+        if request is None:
+            return
+        try:
+            conn.send(("result", host.synthesize(*request)))
+        except Exception:
+            conn.send(("error", traceback.format_exc()))
+
+
+class _Worker:
+    def __init__(self, process, conn) -> None:
+        self.process = process
+        self.conn = conn
+        self.future = None
+
+
+class SynthesisPool:
+    """Worker processes that synthesize whole sentences; submit() returns a Future of the samples.
+
+    Requests are handed out in the order they were submitted, each to the next idle
+    worker, so the sentences of a reply finish roughly in order. Workers start in
+    the background; ready is False until the first one has loaded its model, and
+    again while none is running. A worker that dies fails its request and is
+    restarted.
+    """
+
+    def __init__(self, settings: dict, speaker_wav: Path, tts_factory=None, workers: int = 0) -> None:
+        self.workers, self.threads = plan_workers(workers)
+        self._context = multiprocessing.get_context("spawn")
+        self._args = (settings, str(speaker_wav), tts_factory, self.threads)
+        self._queue = deque()
+        self._idle = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._ready = threading.Event()
+        # Output rate of the TTS model, known once a worker is ready
+        self.sample_rate = None
+        # Workers that have loaded the model and not exited
+        self._alive = 0
+        self._starting = self.workers
+        self._started = threading.Event()
+        self._processes = []
+        logging.info(f"Starting {self.workers} synthesis workers with {self.threads} threads each")
+        for index in range(self.workers):
+            threading.Thread(target=self._run_worker, args=(index,), name=f"synthesis-{index}", daemon=True).start()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait_started(self, timeout: float = None) -> bool:
+        """Wait until every worker has loaded its model or failed to."""
+        return self._started.wait(timeout)
+
+    def submit(self, text: str, tts_language: str) -> Future:
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise InferenceWorkerError("Synthesis pool is closed")
+            if not self._alive and self._started.is_set():
+                raise InferenceWorkerError("No synthesis worker is running")
+            self._queue.append((future, (text, tts_language)))
+        self._dispatch()
+        return future
+
+    def _dispatch(self) -> None:
+        failed = []
+        with self._lock:
+            while self._idle and self._queue:
+                future, request = self._queue.popleft()
+                # Requests canceled while they waited are dropped
+                if not future.set_running_or_notify_cancel():
+                    continue
+                worker = self._idle.pop()
+                try:
+                    worker.conn.send(request)
+                except (OSError, ValueError):
+                    # The worker died while idle; its thread notices and restarts it, the request fails here
+                    failed.append(future)
+                    continue
+                worker.future = future
+        for future in failed:
+            future.set_exception(InferenceWorkerError("Synthesis worker is not running"))
+
+    def _start_worker(self, index: int):
+        """Start a worker process and wait for it to load the model; None if it failed to."""
+        conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_serve, args=(child_conn,) + self._args,
+                                        name=f"voice-synthesis-{index}", daemon=True)
+        with self._lock:
+            if self._closed:
+                return None
+            process.start()
+            self._processes.append(process)
+        child_conn.close()
+        try:
+            kind, value = conn.recv()
+        except (EOFError, OSError):
+            kind, value = "error", f"exited with code {process.exitcode}"
+        if kind != "ready":
+            logging.error(f"Synthesis worker {index} failed to start: {value}")
+            return None
+        logging.info(f"Synthesis worker {index} ready (pid {process.pid})")
+        self.sample_rate = value
+        return _Worker(process, conn)
+
+    def _run_worker(self, index: int) -> None:
+        """Run worker index for the life of the pool, restarting it when it dies (as InferenceClient does)."""
+        try:
+            worker = self._start_worker(index)
+        finally:
+            with self._lock:
+                self._starting -= 1
+                if not self._starting:
+                    self._started.set()
+        restarts = []
+        while worker is not None:
+            self._serve_worker(worker)
+            if self._closed:
+                return
+            now = time.monotonic()
+            restarts = [when for when in restarts if now - when < RESTART_WINDOW] + [now]
+            if len(restarts) > MAX_RESTARTS:
+                logging.error(f"Synthesis worker {index} not restarted after {MAX_RESTARTS} restarts "
+                              f"within {RESTART_WINDOW:.0f} s")
+                return
+            logging.info(f"Restarting synthesis worker {index}")
+            worker = self._start_worker(index)
+
+    def _serve_worker(self, worker: _Worker) -> None:
+        """Hand requests to a ready worker and resolve their futures until the worker exits."""
+        with self._lock:
+            self._alive += 1
+            self._idle.append(worker)
+        self._ready.set()
+        self._dispatch()
+        while True:
+            try:
+                kind, value = worker.conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future, worker.future = worker.future, None
+                self._idle.append(worker)
+            self._dispatch()
+            if future is None:
+                continue
+            if kind == "result":
+                future.set_result(value)
+            else:
+                future.set_exception(InferenceWorkerError(value))
+
+        worker.process.join(5)
+        message = f"Synthesis worker exited with code {worker.process.exitcode}"
+        queued = deque()
+        with self._lock:
+            if worker in self._idle:
+                self._idle.remove(worker)
+            future, worker.future = worker.future, None
+            self._alive -= 1
+            if not self._alive:
+                # Nothing left to run the queue: callers fall back to synthesis without the pool
+                self._ready.clear()
+                queued, self._queue = self._queue, deque()
+        if future is not None:
+            future.set_exception(InferenceWorkerError(message))
+        for queued_future, _ in queued:
+            if queued_future.set_running_or_notify_cancel():
+                queued_future.set_exception(InferenceWorkerError(message))
+        if not self._closed:
+            logging.error(message)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Stop the workers; requests that were not started are canceled."""
+        with self._lock:
+            self._closed = True
+            queued, self._queue = self._queue, deque()
+            idle, self._idle = self._idle, []
+            processes = list(self._processes)
+        for future, _ in queued:
+            future.cancel()
+        for worker in idle:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for process in processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
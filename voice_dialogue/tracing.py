@@ -0,0 +1,141 @@
+"""Per-turn latency tracing.
+
+Every dialogue turn gets a TurnTrace with monotonic timestamps (perf_counter)
+of its milestones: recording, ASR, the LLM request and its first and last
+token, the first synthesized sentence, the first and last audio played and the
+conversation summary. Marks keep their first occurrence and cost a dict
+insert, so they can be set from any thread on the hot path. Finished turns go
+to a fixed-size ring buffer, which provides the p50/p95 readout and can be
+exported as JSONL or in the Chrome trace format (chrome://tracing, Perfetto).
+"""
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# Spans shown in the Chrome trace, one lane each
+SPANS = {
+    "turn": ("turn_start", "turn_end"),
+    "record": ("record_start", "record_stop"),
+    "asr": ("asr_start", "asr_end"),
+    "recall": ("recall_start", "recall_end"),
+    "llm": ("llm_request", "llm_last_token"),
+    "summary": ("summary_start", "summary_end"),
+    "speech": ("first_audio_played", "last_audio_played"),
+}
+# Latency metrics: (start marks, first present wins; end mark)
+METRICS = {
+    # From the end of the user's input to the first audio of the reply
+    "response": (("record_stop", "turn_start"), "first_audio_played"),
+    "asr": (("asr_start",), "asr_end"),
+    "recall": (("recall_start",), "recall_end"),
+    "first_token": (("llm_request",), "llm_first_token"),
+    "llm": (("llm_request",), "llm_last_token"),
+    "first_sentence": (("llm_request",), "first_sentence_synthesized"),
+    "summary": (("summary_start",), "summary_end"),
+}
+
+
+class TurnTrace:
+    def __init__(self, turn_id: int, kind: str) -> None:
+        self.turn_id = turn_id
+        self.kind = kind
+        self.wall_start = time.time()
+        self.marks = {"turn_start": time.perf_counter()}
+
+    def mark(self, name: str, timestamp: float = None) -> None:
+        self.marks.setdefault(name, time.perf_counter() if timestamp is None else timestamp)
+
+    def metrics(self) -> dict:
+        """Durations in seconds of the METRICS that this turn has marks for."""
+        result = {}
+        for metric, (starts, end) in METRICS.items():
+            start = next((self.marks[name] for name in starts if name in self.marks), None)
+            if start is not None and end in self.marks:
+                result[metric] = self.marks[end] - start
+        return result
+
+    def to_dict(self) -> dict:
+        start = self.marks["turn_start"]
+        return {
+            "turn": self.turn_id,
+            "kind": self.kind,
+            "start": datetime.fromtimestamp(self.wall_start).isoformat(timespec="milliseconds"),
+            "marks_ms": {name: round((value - start) * 1000, 1) for name, value in self.marks.items()},
+            "metrics_ms": {name: round(value * 1000, 1) for name, value in self.metrics().items()},
+        }
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Percentile with linear interpolation between the closest ranks."""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class Tracer:
+    def __init__(self, capacity: int = 200) -> None:
+        self.turns = deque(maxlen=capacity)
+        self.current = None
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def begin_turn(self, kind: str) -> TurnTrace:
+        with self._lock:
+            self.current = TurnTrace(self._next_id, kind)
+            self._next_id += 1
+            return self.current
+
+    def end_turn(self) -> None:
+        with self._lock:
+            trace, self.current = self.current, None
+        if trace is not None:
+            trace.mark("turn_end")
+            self.turns.append(trace)
+
+    def mark(self, name: str, timestamp: float = None) -> None:
+        """Mark a milestone of the current turn (now or at a perf_counter timestamp); a no-op between turns."""
+        trace = self.current
+        if trace is not None:
+            trace.mark(name, timestamp)
+
+    def stats(self) -> dict:
+        """{metric: (p50, p95, count)} in seconds over the turns in the ring buffer."""
+        samples = {}
+        for trace in list(self.turns):
+            for metric, value in trace.metrics().items():
+                samples.setdefault(metric, []).append(value)
+        return {metric: (percentile(values, 0.5), percentile(values, 0.95), len(values))
+                for metric, values in samples.items()}
+
+    def export_jsonl(self, path) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            for trace in list(self.turns):
+                f.write(json.dumps(trace.to_dict(), ensure_ascii=False) + "\n")
+
+    def export_chrome(self, path) -> None:
+        """Write the turns as Chrome trace events, one lane per span."""
+        traces = list(self.turns)
+        origin = min((trace.marks["turn_start"] for trace in traces), default=0.0)
+        lanes = {name: index for index, name in enumerate(SPANS)}
+        events = [{"name": "thread_name", "ph": "M", "pid": 1, "tid": lane, "args": {"name": name}}
+                  for name, lane in lanes.items()]
+        for trace in traces:
+            args = {"turn": trace.turn_id, "kind": trace.kind}
+            for span, (start, end) in SPANS.items():
+                if start in trace.marks and end in trace.marks:
+                    events.append({
+                        "name": f"{span} #{trace.turn_id}", "ph": "X", "pid": 1, "tid": lanes[span],
+                        "ts": (trace.marks[start] - origin) * 1e6,
+                        "dur": (trace.marks[end] - trace.marks[start]) * 1e6,
+                        "args": args,
+                    })
+            for name in ("llm_first_token", "first_sentence_synthesized"):
+                if name in trace.marks:
+                    events.append({"name": name, "ph": "i", "s": "t", "pid": 1, "tid": lanes["llm"],
+                                   "ts": (trace.marks[name] - origin) * 1e6, "args": args})
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
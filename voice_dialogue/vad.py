@@ -0,0 +1,151 @@
+"""Voice activity detection with echo gating for barge-in.
+
+SpeechDetector decides from 16-bit mono microphone frames whether the user is
+talking. It tracks the background level, and while the assistant speaks it
+gates out the echo of its own voice: played audio is registered with an
+EchoReference, and a frame only counts as speech when it is clearly louder than
+the echo expected from what the speakers are playing at that moment. The
+acoustic coupling between speakers and microphone is learned from frames that
+are not speech, and during the first moments of playback, before barge-in is
+allowed.
+
+Pure Python on purpose: a 1024-sample frame takes well under a millisecond, and
+the module can be exercised without the audio stack (see tests/test_vad.py and
+benchmarks/barge_in_benchmark.py).
+"""
+import array
+import math
+import threading
+import time
+from collections import deque
+
+# Frames quieter than this are never speech (normalized RMS, about -54 dBFS)
+MIN_SPEECH_LEVEL = 0.002
+# Speaker output and microphone input are not aligned in time; compare each
+# microphone frame with the loudest played audio of this window
+ECHO_WINDOW = 0.4
+ECHO_FRAME_SECONDS = 0.02
+MAX_COUPLING = 4.0
+
+
+def frame_rms(data: bytes) -> float:
+    """RMS level of 16-bit PCM, normalized to 0..1."""
+    samples = array.array("h", data[:len(data) - len(data) % 2])
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(sample * sample for sample in samples) / len(samples)) / 32768
+
+
+class EchoReference:
+    """Loudness timeline of the audio sent to the speakers."""
+
+    def __init__(self, clock=time.monotonic) -> None:
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._frames = deque()  # (start time, rms)
+        self._end = 0.0
+
+    def add(self, pcm: bytes, sample_rate: int, queued: bool = False) -> None:
+        """Register 16-bit mono audio that starts playing now, or after the current audio if queued."""
+        step = max(1, int(sample_rate * ECHO_FRAME_SECONDS)) * 2
+        with self._lock:
+            now = self._clock()
+            position = max(now, self._end) if queued else now
+            while self._frames and self._frames[0][0] < now - 2 * ECHO_WINDOW:
+                self._frames.popleft()
+            for offset in range(0, len(pcm), step):
+                self._frames.append((position, frame_rms(pcm[offset:offset + step])))
+                position += ECHO_FRAME_SECONDS
+            self._end = position
+
+    def clear(self) -> None:
+        """Playback was stopped."""
+        with self._lock:
+            self._frames.clear()
+            self._end = 0.0
+
+    def level(self) -> float:
+        """Loudest level played within the echo window before now."""
+        with self._lock:
+            now = self._clock()
+            return max((rms for start, rms in self._frames if now - ECHO_WINDOW <= start <= now), default=0.0)
+
+
+class SpeechDetector:
+    """Energy VAD over fixed-size frames with an adaptive noise floor and echo gate.
+
+    feed() returns True once speech has lasted min_speech seconds (the barge-in
+    trigger); silence_duration is used to end the utterance afterwards. Pass the
+    coupling learned by the previous detector to skip most of the calibration.
+    """
+
+    def __init__(self, frame_seconds: float, echo: EchoReference = None, threshold_ratio: float = 3.0,
+                 echo_margin: float = 2.0, coupling: float = None, min_speech: float = 0.25,
+                 calibration: float = 0.5) -> None:
+        self.frame_seconds = frame_seconds
+        self.echo = echo
+        self.threshold_ratio = threshold_ratio
+        self.echo_margin = echo_margin
+        self.coupling = coupling or 0.0
+        self.min_speech = min_speech
+        # Seconds of playback to learn the coupling from before speech can be detected over it
+        self.calibration = calibration if coupling is None else calibration / 5
+        self.echo_duration = 0.0
+        self.noise_floor = MIN_SPEECH_LEVEL / threshold_ratio
+        self.speech_duration = 0.0
+        self.silence_duration = 0.0
+
+    def is_speech(self, data: bytes) -> bool:
+        """Classify one frame and update the background estimates from non-speech frames."""
+        level = frame_rms(data)
+        echo = self.echo.level() if self.echo is not None else 0.0
+        threshold = max(self.noise_floor * self.threshold_ratio, MIN_SPEECH_LEVEL)
+        if echo > MIN_SPEECH_LEVEL:
+            self.echo_duration += self.frame_seconds
+            if self.echo_duration <= self.calibration:
+                self._learn_coupling(level / echo, 0.5)
+                return False
+            threshold = max(threshold, echo * self.coupling * self.echo_margin)
+        if level > threshold:
+            return True
+        if echo > MIN_SPEECH_LEVEL:
+            # Slowly, so that the soft start of the user's speech does not raise the gate
+            self._learn_coupling(level / echo, 0.05)
+        else:
+            # Fast to follow a quieter room, slow to follow a louder one
+            rate = 0.3 if level < self.noise_floor else 0.02
+            self.noise_floor += rate * (level - self.noise_floor)
+        return False
+
+    def _learn_coupling(self, ratio: float, rise: float) -> None:
+        # Track the peaks of the echo, not its average: syllable gaps must not lower the gate
+        rate = rise if ratio > self.coupling else 0.01
+        self.coupling = min(MAX_COUPLING, self.coupling + rate * (ratio - self.coupling))
+
+    def feed(self, data: bytes) -> bool:
+        if self.is_speech(data):
+            self.speech_duration += self.frame_seconds
+            self.silence_duration = 0.0
+        else:
+            self.silence_duration += self.frame_seconds
+            # Short gaps between syllables do not reset the onset
+            if self.silence_duration > 2 * self.frame_seconds:
+                self.speech_duration = 0.0
+        return self.speech_duration >= self.min_speech
+
+
+def wait_for_speech(stream, detector: SpeechDetector, chunk: int, stop: threading.Event,
+                    preroll: float = 0.3) -> list:
+    """Read frames from stream until the user starts talking.
+
+    Returns the frames from preroll seconds before the detected onset, so the
+    capture that follows does not miss the first syllable, or [] if stop was set.
+    """
+    onset_frames = int(round((detector.min_speech + preroll) / detector.frame_seconds)) + 1
+    frames = deque(maxlen=onset_frames)
+    while not stop.is_set():
+        data = stream.read(chunk, exception_on_overflow=False)
+        frames.append(data)
+        if detector.feed(data):
+            return list(frames)
+    return []
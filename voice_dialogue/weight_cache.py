@@ -0,0 +1,221 @@
+"""Memory-mapped cache of the Whisper and XTTS weights.
+
+Loading a checkpoint with torch.load deserializes all of it into memory and
+then copies it into a freshly initialized model, so the weights are briefly
+held twice, and the random initialization alone takes seconds. The first time
+a model is loaded the normal way, its tensors are written once to a
+safetensors file in the cache folder, keyed by model name and checkpoint
+version. Later loads build the model on the meta device (no memory, no
+initialization) and attach the tensors memory-mapped from that file: nothing
+is copied on the CPU, the file pages are shared by every process that maps
+them (the app and its inference worker, or two builds running at once), and
+the kernel can drop them under memory pressure instead of swapping.
+
+Needs the safetensors package (installed with transformers); without it, or
+when a cached file cannot be used, models are loaded the normal way. Only
+XTTS is cached among the TTS models.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import asdict
+from pathlib import Path
+
+import torch
+import whisper
+from TTS.api import TTS
+from TTS.utils.manage import ModelManager
+
+# Bumped when the layout of the cached files changes
+CACHE_FORMAT = "1"
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "voice_dialogue" / "weights"
+# Stands in for the XTTS checkpoint while the model is built without weights
+EMPTY_CHECKPOINT = "empty-checkpoint.pth"
+
+
+def _stat_version(path: Path) -> str:
+    stat = path.stat()
+    return hashlib.sha1(f"{stat.st_size}-{stat.st_mtime_ns}".encode()).hexdigest()[:16]
+
+
+def _set_tensor(root: torch.nn.Module, name: str, tensor: torch.Tensor) -> None:
+    owner_name, _, leaf = name.rpartition(".")
+    owner = root.get_submodule(owner_name) if owner_name else root
+    if leaf in owner._parameters:
+        owner._parameters[leaf] = torch.nn.Parameter(tensor, requires_grad=False)
+    elif leaf in owner._buffers:
+        owner._buffers[leaf] = tensor
+    else:
+        raise KeyError(f"No parameter or buffer {name}")
+
+
+def _named_tensors(model: torch.nn.Module):
+    # Every name, including those of tied weights, which are the same tensor under several names
+    yield from model.named_parameters(remove_duplicate=False)
+    yield from ((name, buffer) for name, buffer in model.named_buffers(remove_duplicate=False) if buffer is not None)
+
+
+class WeightCache:
+    def __init__(self, directory: Path = None) -> None:
+        self.directory = Path(directory) if directory else DEFAULT_CACHE_DIR
+
+    def path(self, kind: str, name: str, version: str) -> Path:
+        slug = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+        return self.directory / f"{kind}-{slug}-{version}.safetensors"
+
+    def save(self, model: torch.nn.Module, path: Path, extra: dict = None) -> None:
+        """Write the dense tensors of the model; tied tensors are stored once."""
+        from safetensors.torch import save_file
+        tensors, aliases, by_identity, storages = {}, {}, {}, set()
+        for name, tensor in _named_tensors(model):
+            if tensor.is_sparse or tensor.is_quantized:
+                continue
+            identity = (tensor.data_ptr(), tensor.dtype, tuple(tensor.shape), tuple(tensor.stride()))
+            if identity in by_identity:
+                aliases[name] = by_identity[identity]
+                continue
+            by_identity[identity] = name
+            tensor = tensor.detach().to("cpu").contiguous()
+            storage = tensor.untyped_storage().data_ptr()
+            # safetensors refuses tensors that share memory (views of one another)
+            tensors[name] = tensor.clone() if storage in storages else tensor
+            storages.add(storage)
+        metadata = {"format": CACHE_FORMAT, "aliases": json.dumps(aliases), "extra": json.dumps(extra or {})}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_suffix(".partial")
+        save_file(tensors, str(partial), metadata=metadata)
+        os.replace(partial, path)
+        logging.info(f"Cached model weights in {path} ({path.stat().st_size / (1024 * 1024):.0f} MB)")
+
+    def open(self, path: Path) -> tuple:
+        """Memory-map a cached file; returns ({name: tensor}, {alias: name}, extra)."""
+        from safetensors import safe_open
+        with safe_open(str(path), framework="pt") as f:
+            metadata = f.metadata() or {}
+            if metadata.get("format") != CACHE_FORMAT:
+                raise ValueError(f"Cache format {metadata.get('format')} instead of {CACHE_FORMAT}")
+            tensors = {name: f.get_tensor(name) for name in f.keys()}
+        return tensors, json.loads(metadata.get("aliases", "{}")), json.loads(metadata.get("extra", "{}"))
+
+    @staticmethod
+    def attach(model: torch.nn.Module, tensors: dict, aliases: dict) -> None:
+        """Put the cached tensors into a model built on the meta device."""
+        for name, tensor in tensors.items():
+            _set_tensor(model, name, tensor)
+        for alias, name in aliases.items():
+            _set_tensor(model, alias, tensors[name])
+
+    @staticmethod
+    def check_complete(model: torch.nn.Module) -> None:
+        missing = [name for name, tensor in _named_tensors(model) if tensor.is_meta]
+        if missing:
+            raise ValueError(f"{len(missing)} tensors missing from the cache, e.g. {', '.join(missing[:3])}")
+
+    def load(self, kind: str, name: str, version: str, build, load_full):
+        """The model from the cache if it is there, else from load_full() (and then cached).
+
+        build(extra) returns (model, module with the cached tensors) built on the meta device;
+        load_full() returns (model, module to cache, extra) loaded the normal way.
+        """
+        path = self.path(kind, name, version)
+        cached = None
+        if path.exists():
+            try:
+                cached = self.open(path)
+            except ImportError:
+                logging.info("safetensors is not installed; model weights are not cached")
+            except Exception:
+                logging.exception(f"Error reading {path}, loading the checkpoint:")
+                path.unlink(missing_ok=True)
+        if cached is not None:
+            start = time.perf_counter()
+            tensors, aliases, extra = cached
+            try:
+                model, module = build(extra)
+                self.attach(module, tensors, aliases)
+                self.check_complete(module)
+                logging.info(f"Loaded {kind} model {name} from the weight cache in {time.perf_counter() - start:.2f} s")
+                return model
+            except Exception:
+                # The file is fine, the model cannot be built from it; it is kept
+                logging.exception(f"Error building {kind} model {name} from the weight cache, loading the checkpoint:")
+        model, module, extra = load_full()
+        if not path.exists():
+            try:
+                self.save(module, path, extra)
+            except ImportError:
+                logging.info("safetensors is not installed; model weights are not cached")
+            except Exception:
+                logging.exception("Error caching model weights:")
+                path.with_suffix(".partial").unlink(missing_ok=True)
+        return model
+
+
+def load_whisper(cache: WeightCache, name: str, device: str):
+    """whisper.load_model() through the cache."""
+    url = whisper._MODELS.get(name)
+    if url is not None:
+        # The download URL contains the SHA256 of the checkpoint
+        version = url.split("/")[-2][:16]
+    elif os.path.isfile(name):
+        version = _stat_version(Path(name))
+    else:
+        return whisper.load_model(name, device=device)
+
+    def build(extra: dict) -> tuple:
+        from whisper.model import ModelDimensions, Whisper
+        with torch.device("meta"):
+            model = Whisper(ModelDimensions(**extra["dims"]))
+        # A sparse buffer, which is not cached; what load_model sets
+        dims = model.dims
+        heads = torch.zeros(dims.n_text_layer, dims.n_text_head, dtype=torch.bool)
+        heads[dims.n_text_layer // 2:] = True
+        model.register_buffer("alignment_heads", heads.to_sparse(), persistent=False)
+        if name in whisper._ALIGNMENT_HEADS:
+            model.set_alignment_heads(whisper._ALIGNMENT_HEADS[name])
+        return model, model
+
+    def load_full() -> tuple:
+        model = whisper.load_model(name, device="cpu")
+        return model, model, {"dims": asdict(model.dims)}
+
+    return cache.load("whisper", name, version, build, load_full).to(device)
+
+
+def load_xtts(cache: WeightCache, model_name: str):
+    """TTS(model_name) through the cache, on the CPU; models other than XTTS are loaded the normal way."""
+    manager = ModelManager(models_file=TTS.get_models_file_path(), progress_bar=False, verbose=False)
+    model_dir = Path(manager.download_model(model_name)[0])
+    checkpoint = model_dir / "model.pth"
+    if "xtts" not in model_name or not checkpoint.is_file():
+        return TTS(model_name=model_name)
+
+    def build(extra: dict) -> tuple:
+        from TTS.config import load_config
+        from TTS.tts.models import setup_model
+        from TTS.utils.synthesizer import Synthesizer
+        empty = cache.directory / EMPTY_CHECKPOINT
+        if not empty.exists():
+            cache.directory.mkdir(parents=True, exist_ok=True)
+            torch.save({"model": {}}, empty)
+        config = load_config(str(model_dir / "config.json"))
+        with torch.device("meta"):
+            xtts = setup_model(config)
+            # Everything Synthesizer does to load the model, except reading the weights
+            xtts.load_checkpoint(config, checkpoint_dir=str(model_dir), checkpoint_path=str(empty),
+                                 strict=False, eval=True)
+        synthesizer = Synthesizer()
+        synthesizer.tts_config, synthesizer.tts_model = config, xtts
+        synthesizer.output_sample_rate = config.audio["output_sample_rate"]
+        tts = TTS()
+        tts.model_name = model_name
+        tts.synthesizer = synthesizer
+        return tts, xtts
+
+    def load_full() -> tuple:
+        tts = TTS(model_name=model_name)
+        return tts, tts.synthesizer.tts_model, {}
+
+    return cache.load("tts", model_name, _stat_version(checkpoint), build, load_full)